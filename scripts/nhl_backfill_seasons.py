@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+nhl_backfill_seasons.py
+
+Historical backfill of the nhl_dw warehouse over a range of seasons.
+
+    python nhl_backfill_seasons.py --from 20102011 --to 20242025 --processes 4
+
+The work is split into tasks that run in a process pool:
+
+  schedule  one task per season, always run first: dim_season,
+            dim_date, missing historic teams (relocated / renamed
+            franchises) into dim_team, the season's regular season +
+            playoff games into fact_game and its event_play partition
+  facts     per chunk of GAMES_PER_TASK games: fact_skater_game +
+            fact_goalie_game from boxscores (nhl_fact_player_game)
+  events    per chunk of games: event_play from play-by-play (nhl_events)
+
+A season's game tasks are queued as soon as its schedule task finishes,
+so seasons overlap. Every finished (season, game, stage) is recorded in
+nhl_dw.etl_backfill_checkpoint, in the same transaction as the data
+where the stage allows it. A restarted run skips everything already
+checkpointed, so a crash at season 12 of 20 resumes at season 12.
+"""
+
+import argparse
+import importlib
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List
+from zoneinfo import ZoneInfo
+
+import nhl_events
+from nhl_batch import BatchUpserter, flush_all
+from nhl_db import get_conn, put_conn
+from nhl_dimcache import dim_cache
+from nhl_fact_player_game import (
+    FETCH_WORKERS,
+    add_facts_for_game,
+    ensure_teams,
+    fetch_boxscore,
+    flush_fact_batches,
+    new_fact_batches,
+)
+from nhl_parallel import fetch_in_order
+
+# Hyphen in the file name, so a plain import won't do
+loader = importlib.import_module("nhl_loader_2025-26")
+
+# ---------------------------------------------------------------------------
+# CONFIG
+# ---------------------------------------------------------------------------
+
+DEFAULT_PROCESSES = 4
+GAMES_PER_TASK = 100
+GAME_STAGES = ("facts", "events")
+
+# Regular season and playoffs; preseason and all-star games are skipped
+GAME_TYPES = (2, 3)
+
+# The NHL schedule day follows US Eastern time
+NHL_TIMEZONE = ZoneInfo("America/New_York")
+
+# Schedule window per season. Generous on both ends (lockouts, the 2020
+# bubble playoffs in August / September); games of neighbouring seasons
+# are filtered out by their game_id.
+SEASON_WINDOW_START = (9, 1)      # month, day in the start year
+SEASON_WINDOW_END = (10, 31)      # month, day in the end year
+
+# game_id 0 marks a season-level stage in the checkpoint table
+SEASON_LEVEL = 0
+
+
+# ---------------------------------------------------------------------------
+# SEASONS
+# ---------------------------------------------------------------------------
+
+def season_range(first: str, last: str) -> List[str]:
+    """
+    "20102011", "20122013" -> ["20102011", "20112012", "20122013"]
+    """
+    start, end = int(first[:4]), int(last[:4])
+    if start > end:
+        raise ValueError(f"Season range {first}..{last} is empty")
+    return [f"{y}{y + 1}" for y in range(start, end + 1)]
+
+
+def season_window(season_id: str) -> tuple[date, date]:
+    start_year, end_year = int(season_id[:4]), int(season_id[4:])
+    return date(start_year, *SEASON_WINDOW_START), date(end_year, *SEASON_WINDOW_END)
+
+
+# ---------------------------------------------------------------------------
+# CHECKPOINTS
+# ---------------------------------------------------------------------------
+
+CHECKPOINT_UPSERT_SQL = """
+    INSERT INTO nhl_dw.etl_backfill_checkpoint (season_id, game_id, stage)
+    VALUES %s
+    ON CONFLICT (season_id, game_id, stage) DO UPDATE
+    SET done_at = now()
+    RETURNING (xmax = 0);
+"""
+
+
+def new_checkpoint_batch(conn) -> BatchUpserter:
+    return BatchUpserter(conn, CHECKPOINT_UPSERT_SQL, key=lambda r: r)
+
+
+def load_checkpoints(conn, season_id: str, stage: str) -> set[int]:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT game_id
+            FROM nhl_dw.etl_backfill_checkpoint
+            WHERE season_id = %s AND stage = %s
+            """,
+            (season_id, stage),
+        )
+        return {r[0] for r in cur.fetchall()}
+
+
+# ---------------------------------------------------------------------------
+# WORKER PROCESS STATE
+# ---------------------------------------------------------------------------
+
+# One connection per worker process, opened on first use
+_conn = None
+
+
+def _worker_conn():
+    global _conn
+    if _conn is None or _conn.closed:
+        _conn = get_conn()
+    return _conn
+
+
+# ---------------------------------------------------------------------------
+# SCHEDULE STAGE
+# ---------------------------------------------------------------------------
+
+FACT_GAME_UPSERT_SQL = """
+    INSERT INTO nhl_dw.fact_game (
+        game_id, season_key, date_key, home_team_key, away_team_key,
+        home_score, away_score, game_type, start_time_utc, game_state,
+        went_overtime, went_shootout
+    )
+    VALUES %s
+    ON CONFLICT (game_id) DO UPDATE
+    SET season_key     = EXCLUDED.season_key,
+        date_key       = EXCLUDED.date_key,
+        home_team_key  = EXCLUDED.home_team_key,
+        away_team_key  = EXCLUDED.away_team_key,
+        home_score     = EXCLUDED.home_score,
+        away_score     = EXCLUDED.away_score,
+        game_type      = EXCLUDED.game_type,
+        start_time_utc = EXCLUDED.start_time_utc,
+        game_state     = EXCLUDED.game_state,
+        went_overtime  = EXCLUDED.went_overtime,
+        went_shootout  = EXCLUDED.went_shootout,
+        updated_at     = now()
+    WHERE (fact_game.season_key, fact_game.date_key,
+           fact_game.home_team_key, fact_game.away_team_key,
+           fact_game.home_score, fact_game.away_score, fact_game.game_type,
+           fact_game.start_time_utc, fact_game.game_state,
+           fact_game.went_overtime, fact_game.went_shootout)
+          IS DISTINCT FROM
+          (EXCLUDED.season_key, EXCLUDED.date_key, EXCLUDED.home_team_key,
+           EXCLUDED.away_team_key, EXCLUDED.home_score, EXCLUDED.away_score,
+           EXCLUDED.game_type, EXCLUDED.start_time_utc, EXCLUDED.game_state,
+           EXCLUDED.went_overtime, EXCLUDED.went_shootout)
+    RETURNING (xmax = 0);
+"""
+
+DIM_DATE_UPSERT_SQL = """
+    INSERT INTO nhl_dw.dim_date (
+        date_key, "year", "month", "day", day_of_week,
+        week_of_year, month_name, is_weekend
+    )
+    VALUES %s
+    ON CONFLICT (date_key) DO NOTHING
+    RETURNING (xmax = 0);
+"""
+
+
+def ensure_season(conn, season_id: str) -> int:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO nhl_dw.dim_season (season_id, start_year, end_year, is_current)
+            VALUES (%s, %s, %s, false)
+            ON CONFLICT (season_id) DO UPDATE SET season_id = EXCLUDED.season_id
+            RETURNING season_key;
+            """,
+            (season_id, int(season_id[:4]), int(season_id[4:])),
+        )
+        season_key = cur.fetchone()[0]
+    dim_cache.put("season_key", season_id, season_key)
+    return season_key
+
+
+def _game_date(g: Dict[str, Any]) -> date:
+    if g.get("gameDate"):
+        return date.fromisoformat(g["gameDate"])
+    start = datetime.fromisoformat(g["startTimeUTC"].replace("Z", "+00:00"))
+    return start.astimezone(NHL_TIMEZONE).date()
+
+
+def _date_row(d: date) -> tuple:
+    iso = d.isocalendar()
+    return (d, d.year, d.month, d.day, iso.weekday, iso.week, d.strftime("%B"), iso.weekday >= 6)
+
+
+def fact_game_row(conn, season_key: int, g: Dict[str, Any]) -> tuple:
+    last_period = (g.get("gameOutcome") or {}).get("lastPeriodType")
+    return (
+        int(g["id"]),
+        season_key,
+        _game_date(g),
+        dim_cache.team_key(conn, g["homeTeam"]["id"]),
+        dim_cache.team_key(conn, g["awayTeam"]["id"]),
+        g["homeTeam"].get("score"),
+        g["awayTeam"].get("score"),
+        str(g.get("gameType")),
+        g.get("startTimeUTC"),
+        g.get("gameState"),
+        None if last_period is None else last_period in ("OT", "SO"),
+        None if last_period is None else last_period == "SO",
+    )
+
+
+def run_schedule_task(season_id: str) -> List[int]:
+    """
+    Load one season's schedule into the dimensions and fact_game. Returns
+    the season's game_ids (also when the stage was already checkpointed).
+    """
+    conn = _worker_conn()
+    season_key = ensure_season(conn, season_id)
+    # Created here once, not by the season's concurrent events tasks
+    nhl_events.ensure_event_partition(conn, season_key)
+    conn.commit()
+
+    if SEASON_LEVEL in load_checkpoints(conn, season_id, "schedule"):
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT game_id FROM nhl_dw.fact_game WHERE season_key = %s ORDER BY game_id;",
+                (season_key,),
+            )
+            return [r[0] for r in cur.fetchall()]
+
+    start_year = int(season_id[:4])
+    games = [
+        g for g in loader.fetch_season_schedule(*season_window(season_id))
+        if int(str(g["id"])[:4]) == start_year and g.get("gameType") in GAME_TYPES
+    ]
+
+    try:
+        ensure_teams(conn, [t for g in games for t in (g["homeTeam"], g["awayTeam"])])
+
+        dates = BatchUpserter(conn, DIM_DATE_UPSERT_SQL, key=lambda r: r[0])
+        facts = BatchUpserter(conn, FACT_GAME_UPSERT_SQL, key=lambda r: r[0])
+        for g in games:
+            dates.add(_date_row(_game_date(g)))
+            facts.add(fact_game_row(conn, season_key, g))
+
+        checkpoint = new_checkpoint_batch(conn)
+        checkpoint.add((season_id, SEASON_LEVEL, "schedule"))
+        flush_all(conn, dates, facts, checkpoint)
+    except Exception:
+        conn.rollback()
+        dim_cache.invalidate("team_key")
+        raise
+
+    print(f"[{season_id}] schedule: {len(games)} games")
+    return sorted(int(g["id"]) for g in games)
+
+
+# ---------------------------------------------------------------------------
+# GAME STAGES
+# ---------------------------------------------------------------------------
+
+def _game_keys(conn, game_ids: Iterable[int]) -> Dict[int, int]:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT game_id, game_key FROM nhl_dw.fact_game WHERE game_id = ANY(%s);",
+            (list(game_ids),),
+        )
+        return dict(cur.fetchall())
+
+
+def run_facts_task(season_id: str, game_ids: List[int]) -> int:
+    """
+    fact_skater_game + fact_goalie_game for a chunk of games. The
+    checkpoint rows are written in the same transaction as the facts.
+    """
+    conn = _worker_conn()
+    keys = _game_keys(conn, game_ids)
+    games = [(keys[g], g) for g in game_ids if g in keys]
+
+    skaters, goalies = new_fact_batches(conn)
+    checkpoint = new_checkpoint_batch(conn)
+    try:
+        for (game_key, game_id), boxscore in fetch_in_order(
+            games, lambda g: fetch_boxscore(g[1]), workers=FETCH_WORKERS
+        ):
+            add_facts_for_game(conn, skaters, goalies, game_key, boxscore)
+            checkpoint.add((season_id, game_id, "facts"))
+            if skaters.is_full or goalies.is_full:
+                flush_fact_batches(conn, skaters, goalies, checkpoint)
+        flush_fact_batches(conn, skaters, goalies, checkpoint)
+    except Exception:
+        conn.rollback()
+        dim_cache.invalidate("team_key", "player_key")
+        raise
+    return len(games)
+
+
+def run_events_task(season_id: str, game_ids: List[int]) -> int:
+    """
+    event_play for a chunk of games. nhl_events commits per COPY batch, so
+    checkpoints follow right after; a crash in between only means a game
+    is merged again, which leaves event_play unchanged. Games whose
+    play-by-play couldn't be fetched are not checkpointed, so the next
+    run retries them.
+    """
+    conn = _worker_conn()
+    season_key = dim_cache.season_key(conn, season_id)
+    keys = _game_keys(conn, game_ids)
+    games = [(keys[g], g) for g in game_ids if g in keys]
+
+    failed: Dict[int, str] = {}
+    try:
+        for start in range(0, len(games), nhl_events.COPY_BATCH_GAMES):
+            batch = games[start:start + nhl_events.COPY_BATCH_GAMES]
+            nhl_events.copy_events_for_games(conn, season_key, batch, failed=failed)
+            checkpoint = new_checkpoint_batch(conn)
+            for _, game_id in batch:
+                if game_id not in failed:
+                    checkpoint.add((season_id, game_id, "events"))
+            flush_all(conn, checkpoint)
+    except Exception:
+        conn.rollback()
+        dim_cache.invalidate("season_key")
+        nhl_events._partitions_ready.discard(season_key)
+        raise
+    if failed:
+        print(f"[{season_id}] events: {len(failed)} games not fetched, left for the next run: {sorted(failed)}")
+    return len(games) - len(failed)
+
+
+GAME_TASKS = {
+    "facts": run_facts_task,
+    "events": run_events_task,
+}
+
+
+# ---------------------------------------------------------------------------
+# DRIVER
+# ---------------------------------------------------------------------------
+
+def backfill_seasons(
+    seasons: List[str],
+    stages: Iterable[str] = GAME_STAGES,
+    processes: int = DEFAULT_PROCESSES,
+    games_per_task: int = GAMES_PER_TASK,
+) -> None:
+    game_stages = [s for s in GAME_STAGES if s in set(stages)]
+
+    conn = get_conn()
+    try:
+        done = {
+            (season_id, stage): load_checkpoints(conn, season_id, stage)
+            for season_id in seasons
+            for stage in game_stages
+        }
+    finally:
+        put_conn(conn)
+
+    # spawn: every worker starts clean, without API sessions or DB
+    # connections inherited from the parent.
+    ctx = multiprocessing.get_context("spawn")
+    failed = 0
+    with ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as pool:
+        pending = {
+            pool.submit(run_schedule_task, season_id): ("schedule", season_id, None)
+            for season_id in seasons
+        }
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, season_id, chunk = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"[{season_id}] {stage} failed: {e}")
+                    continue
+
+                if stage != "schedule":
+                    print(f"[{season_id}] {stage}: {result} games ({chunk[0]}..{chunk[-1]})")
+                    continue
+
+                for game_stage in game_stages:
+                    todo = [g for g in result if g not in done[(season_id, game_stage)]]
+                    print(f"[{season_id}] {game_stage}: {len(todo)}/{len(result)} games to load")
+                    for i in range(0, len(todo), games_per_task):
+                        chunk = todo[i:i + games_per_task]
+                        future = pool.submit(GAME_TASKS[game_stage], season_id, chunk)
+                        pending[future] = (game_stage, season_id, chunk)
+
+    if failed:
+        print(f"Backfill finished with {failed} failed tasks; re-run to retry them.")
+    else:
+        print(f"Backfill finished for {len(seasons)} seasons.")
+
+
+# ---------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill nhl_dw over a range of seasons")
+    parser.add_argument("--from", dest="first", required=True, help="first season, e.g. 20102011")
+    parser.add_argument("--to", dest="last", required=True, help="last season, e.g. 20242025")
+    parser.add_argument("--stages", default=",".join(GAME_STAGES),
+                        help=f"comma separated subset of {','.join(GAME_STAGES)} (schedule always runs)")
+    parser.add_argument("--processes", type=int, default=DEFAULT_PROCESSES)
+    parser.add_argument("--games-per-task", type=int, default=GAMES_PER_TASK)
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(GAME_STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    backfill_seasons(
+        season_range(args.first, args.last),
+        stages=stages,
+        processes=args.processes,
+        games_per_task=args.games_per_task,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+nhl_batch.py
+
+Batched multi-row writes for the loaders.
+
+Instead of one INSERT ... ON CONFLICT (or UPDATE) per player, rows are
+collected in a BatchUpserter and written with a single multi-row
+statement through psycopg2.extras.execute_values:
+
+    players = BatchUpserter(conn, PLAYERS_UPSERT_SQL, key=lambda r: r[0])
+    for row in rows:
+        players.add(row)
+    flush_all(conn, players)
+
+A loader that flushes many batches can pass a CommitPolicy to flush_all,
+which then commits every N rows / games / seconds instead of per flush
+(see nhl_db).
+
+The statement must contain a single `VALUES %s` placeholder (or
+`FROM (VALUES %s)` for updates) and return one row per affected row, so
+that the counts can be reported across all pages:
+
+  - upserts end with `RETURNING (xmax = 0)`, which is true for inserted
+    and false for updated rows
+  - updates end with `RETURNING 1`
+
+Statements are expected to skip rows that wouldn't change, i.e. guard the
+DO UPDATE (or UPDATE) with `WHERE (stored columns) IS DISTINCT FROM
+(new columns)`. Such rows return nothing and are counted as unchanged, so
+a rerun on the same data writes no new row versions and updated_at only
+moves when something really changed.
+"""
+
+import re
+from typing import Any, Callable, Dict, Hashable, Sequence
+
+from psycopg2.extras import execute_values
+
+DEFAULT_BATCH_SIZE = 500
+
+_TARGET_TABLE = re.compile(r"^\s*(?:INSERT\s+INTO|UPDATE)\s+([\w.]+)", re.IGNORECASE)
+
+Row = Sequence[Any]
+
+
+class BatchUpserter:
+    """
+    Collects rows for one table and writes them with one multi-row statement.
+
+    key:   natural key of a row. Rows with the same key are merged inside
+           the batch, because a single INSERT ... ON CONFLICT DO UPDATE
+           can't touch the same target row twice.
+    merge: merge(old_row, new_row) -> row. Defaults to "last row wins",
+           which is what a sequence of single-row upserts would produce.
+
+    inserted / updated / unchanged count the rows of all flushes so far.
+    """
+
+    def __init__(
+        self,
+        conn,
+        sql: str,
+        key: Callable[[Row], Hashable] | None = None,
+        merge: Callable[[Row, Row], Row] | None = None,
+        template: str | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        self.conn = conn
+        self.sql = sql
+        self.key = key
+        self.merge = merge
+        self.template = template
+        self.batch_size = batch_size
+        self._rows: Dict[Hashable, Row] = {}
+        self._seq = 0
+
+        m = _TARGET_TABLE.match(sql)
+        self.table = m.group(1) if m else "?"
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def is_full(self) -> bool:
+        return len(self._rows) >= self.batch_size
+
+    def add(self, row: Row) -> None:
+        if self.key is None:
+            # No natural key: every row is distinct.
+            self._seq += 1
+            self._rows[self._seq] = row
+            return
+
+        k = self.key(row)
+        old = self._rows.pop(k, None)
+        if old is not None and self.merge is not None:
+            row = self.merge(old, row)
+        # pop + re-insert keeps the dict in "last written" order
+        self._rows[k] = row
+
+    def clear(self) -> None:
+        """
+        Drop pending rows, e.g. after the transaction they belonged to was
+        rolled back.
+        """
+        self._rows.clear()
+
+    def flush(self) -> int:
+        """
+        Write all pending rows. Returns the number of rows the statement
+        inserted or updated. Does not commit.
+        """
+        if not self._rows:
+            return 0
+
+        rows = list(self._rows.values())
+        self._rows.clear()
+
+        with self.conn.cursor() as cur:
+            result = execute_values(
+                cur,
+                self.sql,
+                rows,
+                template=self.template,
+                page_size=max(self.batch_size, 1),
+                fetch=True,
+            )
+
+        inserted = sum(1 for r in result if r[0] is True)
+        self.inserted += inserted
+        self.updated += len(result) - inserted
+        self.unchanged += len(rows) - len(result)
+        return len(result)
+
+    def summary(self) -> str:
+        return (
+            f"{self.table}: {self.inserted} inserted, {self.updated} updated, "
+            f"{self.unchanged} unchanged"
+        )
+
+
+def flush_all(conn, *batches: BatchUpserter, policy=None) -> list[int]:
+    """
+    Flush the given batches in order (parents before children, e.g. players
+    before player_game_stats) and commit once.
+
+    With a policy (nhl_db.CommitPolicy) the written rows are added to it
+    and the commit only happens when the policy says so; the caller
+    commits the rest with policy.commit() at the end.
+    """
+    counts = [b.flush() for b in batches]
+    if policy is None:
+        conn.commit()
+    else:
+        policy.add(rows=sum(counts))
+        policy.maybe_commit(conn)
+    return counts
+
+
+def print_summaries(*batches: BatchUpserter) -> None:
+    """
+    One line per table: inserted / updated / unchanged rows of the run.
+    """
+    for b in batches:
+        print(b.summary())
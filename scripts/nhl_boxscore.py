@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+nhl_boxscore.py
+
+One boxscore pass for everything that is loaded from boxscores.
+
+Each game's boxscore is fetched and hashed once, then handed to a list
+of sinks. A sink turns the boxscore into rows for its own tables:
+
+  players       players                          (update_players2.py)
+  player_stats  players + player_game_stats      (nhl_loader_2025-26.py)
+  stat_fields   player_game_stats extra fields   (update_game_stats.py)
+  facts         nhl_dw.fact_skater_game / fact_goalie_game
+                                                 (nhl_fact_player_game.py)
+
+Every sink keeps its own payload hash stage, so a sink skips games it
+has already loaded from the same boxscore, independently of the others.
+All sinks' batches are flushed together with the hashes; commits follow
+the CommitPolicy (see nhl_db), so a transaction spans as many games as
+the policy allows and never leaves a sink half written.
+
+Refresh a season with a single fetch per game:
+
+    python nhl_boxscore.py --season 20252026 --sinks player_stats,stat_fields,facts
+"""
+
+import argparse
+import importlib
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from nhl_batch import DEFAULT_BATCH_SIZE, BatchUpserter, flush_all, print_summaries
+from nhl_db import CommitPolicy, get_conn, put_conn
+from nhl_game_state import STARTED_STATES
+from nhl_governor import RetriesExhausted
+from nhl_load_state import PayloadHashes, payload_hash
+from nhl_pipeline import DEFAULT_FETCH_WORKERS, run_pipeline
+
+PLAYER_GROUPS = ("forwards", "defensemen", "defense", "goalies")
+
+# (game_id, home_team_id, away_team_id). game_id always comes first; the
+# facts sink needs nothing else, the legacy sinks read the team ids too.
+Game = Sequence[Any]
+
+
+# ---------------------------------------------------------------------------
+# PARSING
+# ---------------------------------------------------------------------------
+
+def iter_boxscore_players(team_block: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Every player in one team's playerByGameStats block (forwards,
+    defensemen/defense, goalies).
+    """
+    if not team_block:
+        return
+    for key in PLAYER_GROUPS:
+        for player in team_block.get(key) or []:
+            yield player
+
+
+def iter_game_players(
+    boxscore: Dict[str, Any],
+    home_team_id: int,
+    away_team_id: int,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    (team_id, player) for both teams, home team first.
+    """
+    pbs = boxscore.get("playerByGameStats") or {}
+    for team_id, side in ((home_team_id, "homeTeam"), (away_team_id, "awayTeam")):
+        for player in iter_boxscore_players(pbs.get(side) or {}):
+            yield team_id, player
+
+
+# ---------------------------------------------------------------------------
+# SINKS
+# ---------------------------------------------------------------------------
+
+class BoxscoreSink(ABC):
+    """
+    Base class for the consumers of a boxscore pass.
+
+    stage:     payload hash stage of the sink, e.g. "player_stats"
+    batches:   BatchUpserters in flush order (parents before children)
+    accepts(): False for games the sink can't load (yet); no hash is
+               recorded for them, so a later pass picks them up
+    rows():    boxscore -> whatever add() needs; runs in a pipeline worker
+               thread, so it must not touch the database
+    add():     queue the rows into the batches; runs in the writer thread
+    report():  print the counts of a flush, one per batch
+    """
+
+    stage: str = ""
+
+    def __init__(self, batches: List[BatchUpserter]):
+        self.batches = batches
+
+    @property
+    def is_full(self) -> bool:
+        return any(b.is_full for b in self.batches)
+
+    def accepts(self, game: Game) -> bool:
+        return True
+
+    def rows(self, game: Game, boxscore: Dict[str, Any]) -> Any:
+        return boxscore
+
+    @abstractmethod
+    def add(self, game: Game, rows: Any) -> None:
+        ...
+
+    def report(self, counts: List[int]) -> None:
+        print(f"Boxscore {self.stage}: wrote {sum(counts)} rows.")
+
+    def rollback(self) -> None:
+        """
+        The transaction was rolled back: drop pending rows.
+        """
+        for b in self.batches:
+            b.clear()
+
+
+# ---------------------------------------------------------------------------
+# THE PASS
+# ---------------------------------------------------------------------------
+
+def fetch_or_skip(fetch: Callable[[int], Dict[str, Any]], game_id: int) -> Dict[str, Any] | None:
+    """
+    None when the API kept failing; the game is skipped and, since no
+    payload hash is stored for it, picked up by the next run.
+    """
+    try:
+        return fetch(game_id)
+    except RetriesExhausted as e:
+        print(f"Boxscore: skipping game {game_id}, no boxscore: {e.__cause__ or e}")
+        return None
+
+
+def flush_sinks(
+    conn,
+    sinks: Sequence[BoxscoreSink],
+    hashes: Sequence[PayloadHashes],
+    policy: CommitPolicy | None = None,
+) -> None:
+    counts = flush_all(conn, *(b for s in sinks for b in s.batches), *(h.batch for h in hashes), policy=policy)
+    for sink in sinks:
+        n = len(sink.batches)
+        sink.report(counts[:n])
+        counts = counts[n:]
+
+
+def process_boxscores(
+    conn,
+    games: Iterable[Game],
+    sinks: Sequence[BoxscoreSink],
+    fetch: Callable[[int], Dict[str, Any]],
+    workers: int = DEFAULT_FETCH_WORKERS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    policy: CommitPolicy | None = None,
+) -> list[int]:
+    """
+    Fetch each game's boxscore once and feed it to every sink. Fetching
+    and row building overlap with the writes (see nhl_pipeline).
+
+    Batches are flushed when one of them is full, commits happen when the
+    policy (default: CommitPolicy.from_config()) is due and at the end.
+
+    Returns the game_ids whose boxscore could not be fetched.
+    """
+    games = list(games)
+    game_ids = [g[0] for g in games]
+    hashes = [PayloadHashes(conn, "boxscore", s.stage, game_ids, batch_size) for s in sinks]
+    policy = policy or CommitPolicy.from_config()
+
+    fetched = run_pipeline(
+        games,
+        fetch=lambda g: fetch_or_skip(fetch, g[0]),
+        normalize=lambda g, boxscore: None if boxscore is None else (
+            payload_hash(boxscore),
+            [s.rows(g, boxscore) for s in sinks],
+        ),
+        fetch_workers=workers,
+    )
+
+    skipped = []
+    try:
+        for game, result in fetched:
+            if result is None:
+                skipped.append(game[0])
+                continue
+            digest, rows = result
+            for sink, h, sink_rows in zip(sinks, hashes, rows):
+                if sink.accepts(game) and h.changed(game[0], None, digest):
+                    sink.add(game, sink_rows)
+            policy.add(games=1)
+            if policy.due or any(s.is_full for s in sinks):
+                flush_sinks(conn, sinks, hashes, policy)
+
+        flush_sinks(conn, sinks, hashes, policy)
+        policy.commit(conn)
+    except Exception:
+        conn.rollback()
+        policy.reset()
+        for sink in sinks:
+            sink.rollback()
+        for h in hashes:
+            h.batch.clear()
+        raise
+
+    for h in hashes:
+        print(f"Boxscore {h.stage}: skipped {h.skipped}/{len(games)} games with unchanged boxscores.")
+    print_summaries(*(b for s in sinks for b in s.batches))
+    if skipped:
+        print(f"Boxscore: {len(skipped)} games could not be fetched: {skipped}")
+    return skipped
+
+
+# ---------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------
+
+SINK_NAMES = ("players", "player_stats", "stat_fields", "facts")
+
+
+def get_started_games(conn, season_code: str) -> list[tuple]:
+    """
+    (game_id, home_team_id, away_team_id) of the season's started games.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT game_id, home_team_id, away_team_id
+            FROM games
+            WHERE season = %s
+              AND (game_state = ANY(%s)
+                   OR (game_state IS NULL AND game_date <= now()))
+            ORDER BY game_date NULLS LAST, game_id;
+            """,
+            (season_code, sorted(STARTED_STATES)),
+        )
+        return cur.fetchall()
+
+
+def build_sinks(conn, names: Iterable[str], game_ids: Iterable[int], batch_size: int) -> list[BoxscoreSink]:
+    """
+    Sinks in the order given. player_stats should come before stat_fields
+    so the rows stat_fields updates exist in the same transaction.
+    """
+    loader = importlib.import_module("nhl_loader_2025-26")
+    sinks = []
+    for name in names:
+        if name == "players":
+            sinks.append(loader.PlayersSink(conn, batch_size))
+        elif name == "player_stats":
+            sinks.append(loader.PlayerStatsSink(conn, batch_size))
+        elif name == "stat_fields":
+            from update_game_stats import StatFieldsSink
+            sinks.append(StatFieldsSink(conn, batch_size))
+        elif name == "facts":
+            from nhl_fact_player_game import PlayerFactsSink, fact_game_keys
+            sinks.append(PlayerFactsSink(conn, fact_game_keys(conn, game_ids), batch_size))
+        else:
+            raise ValueError(f"unknown sink {name!r}, expected one of {', '.join(SINK_NAMES)}")
+    return sinks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load everything boxscore-based with one fetch per game")
+    parser.add_argument("--season", default="20252026", help="season code, e.g. 20252026")
+    parser.add_argument("--sinks", default="player_stats,stat_fields,facts",
+                        help=f"comma separated, any of {', '.join(SINK_NAMES)}")
+    parser.add_argument("--workers", type=int, default=DEFAULT_FETCH_WORKERS,
+                        help="concurrent boxscore fetches")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    from nhl_governor import governor
+    loader = importlib.import_module("nhl_loader_2025-26")
+
+    conn = get_conn()
+    try:
+        games = get_started_games(conn, args.season)
+        print(f"Found {len(games)} started games for season {args.season}")
+        sinks = build_sinks(
+            conn,
+            [s.strip() for s in args.sinks.split(",") if s.strip()],
+            [g[0] for g in games],
+            args.batch_size,
+        )
+        process_boxscores(conn, games, sinks, loader.fetch_boxscore, args.workers, args.batch_size)
+    finally:
+        put_conn(conn)
+        print(loader.payload_cache.summary())
+        print(governor.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+nhl_cache.py
+
+Local, content-addressed cache for NHL API payloads.
+
+Every payload is stored as a gzip-compressed JSON file whose name is the
+SHA-256 of (endpoint, params). The expiry of an entry is decided from the
+payload itself:
+
+  - official games (OFF) never expire
+  - games just gone FINAL expire after FINAL_TTL seconds, since their
+    stats may still be corrected before they turn OFF
+  - live games expire after LIVE_TTL seconds
+  - pre-game / future games expire after FUTURE_TTL seconds
+  - schedule payloads use the shortest TTL of the games they contain
+
+So re-running a season backfill only goes to the network for games that
+can still change.
+
+Usage:
+
+    payload_cache = PayloadCache()
+    boxscore = payload_cache.fetch(
+        "boxscore", {"game_id": game_id},
+        lambda: client.game_center.boxscore(game_id=str(game_id)),
+    )
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable
+
+from nhl_game_state import FINAL_STATES, LIVE_STATES, OFFICIAL_STATES
+
+# ---------------------------------------------------------------------------
+# CONFIG
+# ---------------------------------------------------------------------------
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "NHL_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "nhl_db"),
+)
+
+LIVE_TTL = 60                  # seconds
+FUTURE_TTL = 6 * 60 * 60       # seconds
+FINAL_TTL = FUTURE_TTL
+EMPTY_SCHEDULE_TTL = 24 * 60 * 60
+
+
+# ---------------------------------------------------------------------------
+# TTL RULES
+# ---------------------------------------------------------------------------
+
+def state_ttl(state: str | None) -> int | None:
+    """
+    TTL in seconds for a single game state. None = never expires.
+    """
+    if state in OFFICIAL_STATES:
+        return None
+    if state in FINAL_STATES:
+        return FINAL_TTL
+    if state in LIVE_STATES:
+        return LIVE_TTL
+    return FUTURE_TTL
+
+
+def _iter_schedule_games(payload: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    yield from payload.get("games") or []
+    for day in payload.get("gameWeek") or []:
+        yield from day.get("games") or []
+
+
+def payload_ttl(payload: Any) -> int | None:
+    """
+    Decide how long a payload may be served from the cache.
+
+    Boxscore and play-by-play payloads carry their own gameState.
+    Schedule payloads (daily / weekly / team season) carry a list of
+    games; the entry lives as long as the least settled game in it.
+    """
+    if not isinstance(payload, dict):
+        return FUTURE_TTL
+
+    if "gameState" in payload:
+        return state_ttl(payload.get("gameState"))
+
+    games = list(_iter_schedule_games(payload))
+    if not games:
+        return EMPTY_SCHEDULE_TTL
+
+    ttls = [state_ttl(g.get("gameState")) for g in games]
+    finite = [t for t in ttls if t is not None]
+    return min(finite) if finite else None
+
+
+# ---------------------------------------------------------------------------
+# CACHE
+# ---------------------------------------------------------------------------
+
+class PayloadCache:
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, enabled: bool = True):
+        self.root = root
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(endpoint: str, params: Dict[str, Any]) -> str:
+        raw = json.dumps(
+            {"endpoint": endpoint, "params": params},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json.gz")
+
+    def get(self, endpoint: str, params: Dict[str, Any]) -> Any | None:
+        """
+        Return the cached payload, or None if missing or expired.
+        """
+        if not self.enabled:
+            return None
+
+        path = self._path(self.key(endpoint, params))
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return entry["payload"]
+
+    def put(self, endpoint: str, params: Dict[str, Any], payload: Any, ttl: int | None):
+        if not self.enabled:
+            return
+
+        key = self.key(endpoint, params)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        now = time.time()
+        entry = {
+            "endpoint": endpoint,
+            "params": params,
+            "fetched_at": now,
+            "expires_at": None if ttl is None else now + ttl,
+            "payload": payload,
+        }
+
+        # Write to a temp file and rename, so concurrent readers never see
+        # a half-written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                json.dump(entry, f, default=str)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def fetch(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        fetch_fn: Callable[[], Any],
+        ttl: int | None | Callable[[Any], int | None] = payload_ttl,
+    ) -> Any:
+        """
+        Return the cached payload for (endpoint, params), or call fetch_fn(),
+        store its result and return it.
+
+        ttl may be a fixed number of seconds, None (never expire) or a
+        function of the payload. The default derives it from gameState.
+        """
+        payload = self.get(endpoint, params)
+        if payload is not None:
+            with self._lock:
+                self.hits += 1
+            return payload
+
+        with self._lock:
+            self.misses += 1
+
+        payload = fetch_fn()
+        self.put(endpoint, params, payload, ttl(payload) if callable(ttl) else ttl)
+        return payload
+
+    def summary(self) -> str:
+        return f"payload cache: {self.hits} hits, {self.misses} misses"
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+nhl_db.py
+
+Database connections and transaction sizing shared by all loaders.
+
+Connection settings come from, later ones winning:
+
+  1) the defaults below
+  2) a config file: $NHL_DB_CONFIG, or nhl_db.ini next to the scripts
+  3) environment variables
+
+    [database]              NHL_DB_HOST, NHL_DB_PORT, NHL_DB_NAME,
+    host = localhost        NHL_DB_USER, NHL_DB_PASSWORD,
+    port = 5432             NHL_DB_POOL_MIN, NHL_DB_POOL_MAX
+    dbname = nhl_db
+    user = nhl_user
+    password = ...
+    pool_min = 1
+    pool_max = 8
+
+    [commit]                NHL_COMMIT_ROWS, NHL_COMMIT_GAMES,
+    rows = 5000             NHL_COMMIT_SECONDS
+    games = 0
+    seconds = 30
+
+Connections come from one thread-safe pool per process, so parallel
+writer threads can each hold their own connection:
+
+    conn = get_conn()
+    try:
+        ...
+    finally:
+        put_conn(conn)
+
+A CommitPolicy decides when a long-running loader commits: after every
+N written rows, after every N games, or when the open transaction is T
+seconds old, whichever comes first (0 switches a limit off). Loaders
+flush their batches as before and leave the commit to the policy, so a
+transaction never grows past the configured size however the input is
+shaped:
+
+    policy = CommitPolicy.from_config()
+    for game in games:
+        ...
+        policy.add(rows=written, games=1)
+        policy.maybe_commit(conn)
+    policy.commit(conn)
+"""
+
+import atexit
+import configparser
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+from psycopg2.pool import ThreadedConnectionPool
+
+# ---------------------------------------------------------------------------
+# CONFIG
+# ---------------------------------------------------------------------------
+
+DEFAULT_CONFIG_FILE = Path(__file__).with_name("nhl_db.ini")
+
+DEFAULTS: Dict[str, Dict[str, str]] = {
+    "database": {
+        "host": "localhost",
+        "port": "5432",
+        "dbname": "nhl_db",
+        "user": "nhl_user",
+        "password": "strongpassword",   # override in nhl_db.ini or NHL_DB_PASSWORD
+        "pool_min": "1",
+        "pool_max": "8",
+    },
+    "commit": {
+        "rows": "5000",
+        "games": "0",
+        "seconds": "30",
+    },
+}
+
+ENV_VARS = {
+    ("database", "host"): "NHL_DB_HOST",
+    ("database", "port"): "NHL_DB_PORT",
+    ("database", "dbname"): "NHL_DB_NAME",
+    ("database", "user"): "NHL_DB_USER",
+    ("database", "password"): "NHL_DB_PASSWORD",
+    ("database", "pool_min"): "NHL_DB_POOL_MIN",
+    ("database", "pool_max"): "NHL_DB_POOL_MAX",
+    ("commit", "rows"): "NHL_COMMIT_ROWS",
+    ("commit", "games"): "NHL_COMMIT_GAMES",
+    ("commit", "seconds"): "NHL_COMMIT_SECONDS",
+}
+
+_config: configparser.ConfigParser | None = None
+
+
+def load_config(path: str | os.PathLike | None = None) -> configparser.ConfigParser:
+    """
+    Defaults, overridden by the config file (if it exists), overridden by
+    the environment. The result of the first call is reused.
+    """
+    global _config
+    if _config is not None and path is None:
+        return _config
+
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_dict(DEFAULTS)
+    config.read(path or os.environ.get("NHL_DB_CONFIG") or DEFAULT_CONFIG_FILE, encoding="utf-8")
+    for (section, option), var in ENV_VARS.items():
+        value = os.environ.get(var)
+        if value is not None:
+            config.set(section, option, value)
+
+    _config = config
+    return config
+
+
+def connect_params() -> Dict[str, Any]:
+    """
+    Keyword arguments for psycopg2.connect.
+    """
+    db = load_config()["database"]
+    return {
+        "host": db["host"],
+        "port": db.getint("port"),
+        "dbname": db["dbname"],
+        "user": db["user"],
+        "password": db["password"],
+    }
+
+
+# ---------------------------------------------------------------------------
+# CONNECTION POOL
+# ---------------------------------------------------------------------------
+
+_pool: ThreadedConnectionPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """
+    The process's pool, created on first use. A child process (e.g. a
+    multiprocessing worker) gets a pool of its own instead of sharing the
+    parent's sockets.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            db = load_config()["database"]
+            _pool = ThreadedConnectionPool(
+                db.getint("pool_min"),
+                max(db.getint("pool_max"), 1),
+                **connect_params(),
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def get_conn():
+    """
+    Borrow a connection from the pool. Hand it back with put_conn().
+    """
+    return get_pool().getconn()
+
+
+def put_conn(conn) -> None:
+    """
+    Return a connection to the pool. An open transaction is rolled back,
+    so commit first; a closed connection is dropped from the pool.
+    """
+    with _pool_lock:
+        pool = _pool if _pool_pid == os.getpid() else None
+    if pool is None or pool.closed:
+        conn.close()
+        return
+    pool.putconn(conn, close=bool(conn.closed))
+
+
+@contextmanager
+def connection() -> Iterator[Any]:
+    conn = get_conn()
+    try:
+        yield conn
+    finally:
+        put_conn(conn)
+
+
+@atexit.register
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid() and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+
+# ---------------------------------------------------------------------------
+# COMMIT POLICY
+# ---------------------------------------------------------------------------
+
+class CommitPolicy:
+    """
+    Counts the work written since the last commit and says when to commit.
+
+    rows:    commit after this many written rows
+    games:   commit after this many games
+    seconds: commit when the first uncommitted write is this old
+
+    0 or None switches a limit off; with all three off, only commit()
+    commits. Call reset() after a rollback.
+    """
+
+    def __init__(self, rows: int | None = None, games: int | None = None, seconds: float | None = None):
+        self.rows = rows or 0
+        self.games = games or 0
+        self.seconds = seconds or 0
+        self.commits = 0
+        self.reset()
+
+    @classmethod
+    def from_config(cls) -> "CommitPolicy":
+        c = load_config()["commit"]
+        return cls(c.getint("rows"), c.getint("games"), c.getfloat("seconds"))
+
+    def reset(self) -> None:
+        self.pending_rows = 0
+        self.pending_games = 0
+        self._since: float | None = None
+
+    def add(self, rows: int = 0, games: int = 0) -> None:
+        if self._since is None:
+            self._since = time.monotonic()
+        self.pending_rows += rows
+        self.pending_games += games
+
+    @property
+    def due(self) -> bool:
+        if self._since is None:
+            return False
+        return (
+            (self.rows > 0 and self.pending_rows >= self.rows)
+            or (self.games > 0 and self.pending_games >= self.games)
+            or (self.seconds > 0 and time.monotonic() - self._since >= self.seconds)
+        )
+
+    def commit(self, conn) -> None:
+        conn.commit()
+        if self._since is not None:
+            self.commits += 1
+        self.reset()
+
+    def maybe_commit(self, conn) -> bool:
+        """
+        Commit if a limit is reached. Returns True if it committed.
+        """
+        if not self.due:
+            return False
+        self.commit(conn)
+        return True
@@ -179,6 +179,7 @@ CREATE TABLE nhl_dw.fact_game (
     end_time_utc timestamptz NULL,
     went_overtime bool NULL,
     went_shootout bool NULL,
+    game_state text NULL,
     created_at timestamptz DEFAULT now() NULL,
     updated_at timestamptz DEFAULT now() NULL,
     CONSTRAINT fact_game_game_id_key UNIQUE (game_id),
@@ -278,9 +279,10 @@ CREATE TABLE nhl_dw.fact_team_game (
 -- DROP TABLE nhl_dw.event_play;
 
 CREATE TABLE nhl_dw.event_play (
-    event_key bigserial NOT NULL,
+    event_key int8 DEFAULT nextval('nhl_dw.event_play_event_key_seq'::regclass) NOT NULL,
+    season_key int4 NOT NULL,
     game_key int4 NOT NULL,
-    event_index int4 NULL,
+    event_index int4 NOT NULL,
     "period" int4 NULL,
     time_in_period text NULL,
     type_code text NULL,
@@ -292,6 +294,101 @@ CREATE TABLE nhl_dw.event_play (
     team_id int4 NULL,
     raw_json jsonb NULL,
     created_at timestamptz DEFAULT now() NULL,
-    CONSTRAINT event_play_pkey PRIMARY KEY (event_key),
-    CONSTRAINT event_play_game_key_fkey FOREIGN KEY (game_key) REFERENCES nhl_dw.fact_game(game_key)
-);
\ No newline at end of file
+    CONSTRAINT event_play_pkey PRIMARY KEY (season_key, event_key),
+    CONSTRAINT event_play_game_event_key UNIQUE (season_key, game_key, event_index),
+    CONSTRAINT event_play_game_key_fkey FOREIGN KEY (game_key) REFERENCES nhl_dw.fact_game(game_key),
+    CONSTRAINT event_play_season_key_fkey FOREIGN KEY (season_key) REFERENCES nhl_dw.dim_season(season_key)
+) PARTITION BY LIST (season_key);
+CREATE INDEX event_play_game_key_idx ON nhl_dw.event_play USING btree (game_key);
+CREATE INDEX event_play_type_code_idx ON nhl_dw.event_play USING btree (type_code);
+
+-- One partition per season, named event_play_<season_id>. nhl_events.py
+-- creates missing partitions on load, e.g.:
+--
+-- CREATE TABLE nhl_dw.event_play_20252026
+--     PARTITION OF nhl_dw.event_play FOR VALUES IN (<season_key>);
+
+-- nhl_dw.etl_watermark definition
+
+-- Drop table
+
+-- DROP TABLE nhl_dw.etl_watermark;
+
+CREATE TABLE nhl_dw.etl_watermark (
+    stage text NOT NULL,
+    watermark timestamptz NULL,
+    updated_at timestamptz DEFAULT now() NULL,
+    CONSTRAINT etl_watermark_pkey PRIMARY KEY (stage)
+);
+
+
+-- nhl_dw.etl_payload_hash definition
+
+-- Drop table
+
+-- DROP TABLE nhl_dw.etl_payload_hash;
+
+CREATE TABLE nhl_dw.etl_payload_hash (
+    game_id int8 NOT NULL,
+    endpoint text NOT NULL,
+    stage text NOT NULL,
+    payload_hash text NOT NULL,
+    loaded_at timestamptz DEFAULT now() NULL,
+    CONSTRAINT etl_payload_hash_pkey PRIMARY KEY (game_id, endpoint, stage)
+);
+
+
+-- nhl_dw.stg_boxscore definition
+
+-- Drop table
+
+-- DROP TABLE nhl_dw.stg_boxscore;
+
+CREATE TABLE nhl_dw.stg_boxscore (
+    game_id int8 NOT NULL,
+    payload jsonb NOT NULL,
+    loaded_at timestamptz DEFAULT now() NULL,
+    CONSTRAINT stg_boxscore_pkey PRIMARY KEY (game_id)
+);
+
+
+-- nhl_dw.etl_backfill_checkpoint definition
+
+-- Drop table
+
+-- DROP TABLE nhl_dw.etl_backfill_checkpoint;
+
+CREATE TABLE nhl_dw.etl_backfill_checkpoint (
+    season_id text NOT NULL,
+    game_id int8 NOT NULL,
+    stage text NOT NULL,
+    done_at timestamptz DEFAULT now() NULL,
+    CONSTRAINT etl_backfill_checkpoint_pkey PRIMARY KEY (season_id, game_id, stage)
+);
+
+
+-- nhl_dw.etl_job definition
+
+-- Drop table
+
+-- DROP TABLE nhl_dw.etl_job;
+
+CREATE TABLE nhl_dw.etl_job (
+    job_id bigserial NOT NULL,
+    game_id int8 NOT NULL,
+    stage text NOT NULL,
+    season_id text NOT NULL,
+    status text DEFAULT 'pending'::text NOT NULL,
+    attempts int4 DEFAULT 0 NOT NULL,
+    max_attempts int4 DEFAULT 5 NOT NULL,
+    run_after timestamptz DEFAULT now() NOT NULL,
+    lease_until timestamptz NULL,
+    worker text NULL,
+    last_error text NULL,
+    created_at timestamptz DEFAULT now() NULL,
+    updated_at timestamptz DEFAULT now() NULL,
+    CONSTRAINT etl_job_pkey PRIMARY KEY (job_id),
+    CONSTRAINT etl_job_game_stage_key UNIQUE (game_id, stage),
+    CONSTRAINT etl_job_status_check CHECK (status IN ('pending', 'running', 'done', 'dead'))
+);
+CREATE INDEX etl_job_ready_idx ON nhl_dw.etl_job USING btree (stage, season_id, game_id) WHERE status IN ('pending', 'running');
@@ -0,0 +1,214 @@
+-- Schema changes for databases created before the corresponding change
+-- in nhl_db_ddl.sql. Every statement is safe to re-run.
+
+
+-- games.game_state / fact_game.game_state
+--
+-- NHL API gameState of the game (FUT, PRE, LIVE, CRIT, FINAL, OFF), taken
+-- from the schedule payload. Boxscore and play-by-play stages only pick
+-- games that have started.
+
+ALTER TABLE games ADD COLUMN IF NOT EXISTS game_state text NULL;
+ALTER TABLE nhl_dw.fact_game ADD COLUMN IF NOT EXISTS game_state text NULL;
+
+
+-- nhl_dw.etl_watermark
+--
+-- Persisted load watermark per incremental stage (schedule, boxscores,
+-- events, dim_player), see nhl_loader_2025_26_incremental.py.
+
+CREATE TABLE IF NOT EXISTS nhl_dw.etl_watermark (
+    stage text NOT NULL,
+    watermark timestamptz NULL,
+    updated_at timestamptz DEFAULT now() NULL,
+    CONSTRAINT etl_watermark_pkey PRIMARY KEY (stage)
+);
+
+
+-- nhl_dw.etl_payload_hash
+--
+-- Hash of the last payload each stage loaded per game, used to skip
+-- games whose payload hasn't changed.
+
+CREATE TABLE IF NOT EXISTS nhl_dw.etl_payload_hash (
+    game_id int8 NOT NULL,
+    endpoint text NOT NULL,
+    stage text NOT NULL,
+    payload_hash text NOT NULL,
+    loaded_at timestamptz DEFAULT now() NULL,
+    CONSTRAINT etl_payload_hash_pkey PRIMARY KEY (game_id, endpoint, stage)
+);
+
+
+-- nhl_dw.event_play: one row per (game_key, event_index)
+--
+-- Earlier loads appended a full copy of each game's events on every run.
+-- Keep the newest copy of each event, then enforce uniqueness so that
+-- nhl_events.py can upsert instead of append. Run VACUUM FULL (or
+-- pg_repack) on the table afterwards to give the space back.
+
+DELETE FROM nhl_dw.event_play a
+USING nhl_dw.event_play b
+WHERE a.game_key = b.game_key
+  AND a.event_index = b.event_index
+  AND a.event_key < b.event_key;
+
+DELETE FROM nhl_dw.event_play WHERE event_index IS NULL;
+
+ALTER TABLE nhl_dw.event_play ALTER COLUMN event_index SET NOT NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'event_play_game_event_key'
+    ) THEN
+        ALTER TABLE nhl_dw.event_play
+            ADD CONSTRAINT event_play_game_event_key UNIQUE (game_key, event_index);
+    END IF;
+END $$;
+
+
+-- nhl_dw.event_play: LIST-partitioned by season_key
+--
+-- Queries filter on a season almost always, and a season reload can then
+-- swap a whole partition instead of deleting millions of rows (see
+-- nhl_events.py --reload-season). Converts the existing table once:
+-- rows are copied into one partition per season and the old table is
+-- dropped. Skipped when event_play is already partitioned.
+
+DO $$
+DECLARE
+    s record;
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'nhl_dw' AND c.relname = 'event_play' AND c.relkind = 'r'
+    ) THEN
+        ALTER TABLE nhl_dw.event_play RENAME TO event_play_old;
+        ALTER TABLE nhl_dw.event_play_old RENAME CONSTRAINT event_play_pkey TO event_play_old_pkey;
+        ALTER TABLE nhl_dw.event_play_old RENAME CONSTRAINT event_play_game_event_key TO event_play_old_game_event_key;
+        ALTER TABLE nhl_dw.event_play_old RENAME CONSTRAINT event_play_game_key_fkey TO event_play_old_game_key_fkey;
+
+        CREATE TABLE nhl_dw.event_play (
+            event_key int8 DEFAULT nextval('nhl_dw.event_play_event_key_seq'::regclass) NOT NULL,
+            season_key int4 NOT NULL,
+            game_key int4 NOT NULL,
+            event_index int4 NOT NULL,
+            "period" int4 NULL,
+            time_in_period text NULL,
+            type_code text NULL,
+            type_desc text NULL,
+            x int4 NULL,
+            y int4 NULL,
+            shooter_id int4 NULL,
+            goalie_id int4 NULL,
+            team_id int4 NULL,
+            raw_json jsonb NULL,
+            created_at timestamptz DEFAULT now() NULL,
+            CONSTRAINT event_play_pkey PRIMARY KEY (season_key, event_key),
+            CONSTRAINT event_play_game_event_key UNIQUE (season_key, game_key, event_index),
+            CONSTRAINT event_play_game_key_fkey FOREIGN KEY (game_key) REFERENCES nhl_dw.fact_game(game_key),
+            CONSTRAINT event_play_season_key_fkey FOREIGN KEY (season_key) REFERENCES nhl_dw.dim_season(season_key)
+        ) PARTITION BY LIST (season_key);
+        CREATE INDEX event_play_game_key_idx ON nhl_dw.event_play USING btree (game_key);
+        CREATE INDEX event_play_type_code_idx ON nhl_dw.event_play USING btree (type_code);
+
+        -- the sequence was owned by the old bigserial column
+        ALTER SEQUENCE nhl_dw.event_play_event_key_seq OWNED BY nhl_dw.event_play.event_key;
+
+        FOR s IN
+            SELECT DISTINCT d.season_key, d.season_id
+            FROM nhl_dw.event_play_old e
+            JOIN nhl_dw.fact_game g ON g.game_key = e.game_key
+            JOIN nhl_dw.dim_season d ON d.season_key = g.season_key
+        LOOP
+            EXECUTE format(
+                'CREATE TABLE nhl_dw.%I PARTITION OF nhl_dw.event_play FOR VALUES IN (%s)',
+                'event_play_' || s.season_id, s.season_key
+            );
+        END LOOP;
+
+        INSERT INTO nhl_dw.event_play (
+            event_key, season_key, game_key, event_index, "period", time_in_period,
+            type_code, type_desc, x, y, shooter_id, goalie_id, team_id, raw_json, created_at
+        )
+        SELECT e.event_key, g.season_key, e.game_key, e.event_index, e."period", e.time_in_period,
+               e.type_code, e.type_desc, e.x, e.y, e.shooter_id, e.goalie_id, e.team_id, e.raw_json, e.created_at
+        FROM nhl_dw.event_play_old e
+        JOIN nhl_dw.fact_game g ON g.game_key = e.game_key;
+
+        DROP TABLE nhl_dw.event_play_old;
+    END IF;
+END $$;
+
+
+-- nhl_dw.stg_boxscore
+--
+-- Raw boxscore payloads for the set-based fact transforms in
+-- nhl_fact_elt.py. One row per game, replaced when the payload changes.
+
+CREATE TABLE IF NOT EXISTS nhl_dw.stg_boxscore (
+    game_id int8 NOT NULL,
+    payload jsonb NOT NULL,
+    loaded_at timestamptz DEFAULT now() NULL,
+    CONSTRAINT stg_boxscore_pkey PRIMARY KEY (game_id)
+);
+
+
+-- nhl_dw.etl_backfill_checkpoint
+--
+-- Finished work of nhl_backfill_seasons.py per (season, game, stage);
+-- game_id 0 marks a season-level stage (schedule).
+
+CREATE TABLE IF NOT EXISTS nhl_dw.etl_backfill_checkpoint (
+    season_id text NOT NULL,
+    game_id int8 NOT NULL,
+    stage text NOT NULL,
+    done_at timestamptz DEFAULT now() NULL,
+    CONSTRAINT etl_backfill_checkpoint_pkey PRIMARY KEY (season_id, game_id, stage)
+);
+
+
+-- updated_at on the legacy tables
+--
+-- The loaders only rewrite a row when one of its columns changes
+-- (ON CONFLICT ... DO UPDATE ... WHERE ... IS DISTINCT FROM ...) and set
+-- updated_at when they do, so it tells when the row last changed.
+
+ALTER TABLE teams ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now() NULL;
+ALTER TABLE games ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now() NULL;
+ALTER TABLE players ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now() NULL;
+ALTER TABLE player_game_stats ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now() NULL;
+
+
+-- nhl_dw.etl_job
+--
+-- Work queue of per-game (game_id, stage) loads for nhl_jobs.py. Workers
+-- on any number of machines claim jobs with FOR UPDATE SKIP LOCKED and
+-- hold them on a lease; failed jobs are retried with a backoff and end
+-- up 'dead' after max_attempts tries.
+
+CREATE TABLE IF NOT EXISTS nhl_dw.etl_job (
+    job_id bigserial NOT NULL,
+    game_id int8 NOT NULL,
+    stage text NOT NULL,
+    season_id text NOT NULL,
+    status text DEFAULT 'pending'::text NOT NULL,
+    attempts int4 DEFAULT 0 NOT NULL,
+    max_attempts int4 DEFAULT 5 NOT NULL,
+    run_after timestamptz DEFAULT now() NOT NULL,
+    lease_until timestamptz NULL,
+    worker text NULL,
+    last_error text NULL,
+    created_at timestamptz DEFAULT now() NULL,
+    updated_at timestamptz DEFAULT now() NULL,
+    CONSTRAINT etl_job_pkey PRIMARY KEY (job_id),
+    CONSTRAINT etl_job_game_stage_key UNIQUE (game_id, stage),
+    CONSTRAINT etl_job_status_check CHECK (status IN ('pending', 'running', 'done', 'dead'))
+);
+
+CREATE INDEX IF NOT EXISTS etl_job_ready_idx
+    ON nhl_dw.etl_job USING btree (stage, season_id, game_id)
+    WHERE status IN ('pending', 'running');
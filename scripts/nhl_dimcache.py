@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+nhl_dimcache.py
+
+Process-wide in-memory cache for dimension key lookups.
+
+The dimension tables are tiny (32 teams, a few thousand players, a
+handful of seasons), so instead of one SELECT per lookup each mapping is
+loaded in bulk on first use and kept for the lifetime of the process:
+
+  team_abbr   teams.abbreviation      -> teams.team_id
+  team_key    nhl_dw.dim_team.team_id -> team_key
+  player_key  nhl_dw.dim_player.player_id -> player_key
+  season_key  nhl_dw.dim_season.season_id -> season_key
+
+A miss falls back to a single-row SELECT (someone else may have inserted
+the row after the bulk load). Loaders that insert dimension rows
+themselves should call put() with the returned key, or invalidate().
+
+    from nhl_dimcache import dim_cache
+    team_id = dim_cache.team_id_by_abbr(conn, "EDM")
+"""
+
+import threading
+from typing import Any, Dict, Hashable, Iterable
+
+# name -> (table, natural key column, surrogate key column)
+DIMENSIONS: Dict[str, tuple[str, str, str]] = {
+    "team_abbr": ("teams", "abbreviation", "team_id"),
+    "team_key": ("nhl_dw.dim_team", "team_id", "team_key"),
+    "player_key": ("nhl_dw.dim_player", "player_id", "player_key"),
+    "season_key": ("nhl_dw.dim_season", "season_id", "season_key"),
+}
+
+
+class DimensionCache:
+    def __init__(self):
+        self._maps: Dict[str, Dict[Hashable, Any]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, conn, *names: str) -> None:
+        """
+        (Re)load the given mappings (all of them by default) in bulk.
+        """
+        for name in names or tuple(DIMENSIONS):
+            table, natural_col, key_col = DIMENSIONS[name]
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {natural_col}, {key_col} FROM {table}")
+                mapping = dict(cur.fetchall())
+            with self._lock:
+                self._maps[name] = mapping
+
+    def get(self, conn, name: str, natural_key: Hashable) -> Any | None:
+        """
+        Surrogate key for natural_key, or None if the row doesn't exist.
+        """
+        with self._lock:
+            mapping = self._maps.get(name)
+        if mapping is None:
+            self.load(conn, name)
+            with self._lock:
+                mapping = self._maps[name]
+
+        value = mapping.get(natural_key)
+        if value is not None:
+            return value
+
+        table, natural_col, key_col = DIMENSIONS[name]
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT {key_col} FROM {table} WHERE {natural_col} = %s",
+                (natural_key,),
+            )
+            row = cur.fetchone()
+        if row is None:
+            return None
+
+        self.put(name, natural_key, row[0])
+        return row[0]
+
+    def missing(self, conn, name: str, natural_keys: Iterable[Hashable]) -> list:
+        """
+        The natural keys that have no row in the dimension, without a
+        SELECT per key: the bulk-loaded mapping is reloaded once if any key
+        is missing from it. Lets a loader insert its new dimension rows in
+        one statement.
+        """
+        natural_keys = list(dict.fromkeys(natural_keys))
+        with self._lock:
+            mapping = self._maps.get(name)
+        if mapping is None or any(k not in mapping for k in natural_keys):
+            self.load(conn, name)
+            with self._lock:
+                mapping = self._maps[name]
+        return [k for k in natural_keys if k not in mapping]
+
+    def put(self, name: str, natural_key: Hashable, value: Any) -> None:
+        """
+        Record a key the caller just inserted or looked up. Ignored if the
+        mapping hasn't been loaded yet (the bulk load will pick it up).
+        """
+        with self._lock:
+            mapping = self._maps.get(name)
+            if mapping is not None:
+                mapping[natural_key] = value
+
+    def invalidate(self, *names: str) -> None:
+        """
+        Drop the given mappings (all by default); the next lookup reloads.
+        """
+        with self._lock:
+            for name in names or tuple(self._maps):
+                self._maps.pop(name, None)
+
+    # -- convenience wrappers -------------------------------------------
+
+    def team_id_by_abbr(self, conn, abbr: str) -> int:
+        team_id = self.get(conn, "team_abbr", abbr)
+        if team_id is None:
+            raise ValueError(f"Team-ID puuttuu abbreviationille {abbr}")
+        return team_id
+
+    def team_key(self, conn, team_id: int) -> int | None:
+        return self.get(conn, "team_key", int(team_id))
+
+    def player_key(self, conn, player_id: int) -> int | None:
+        return self.get(conn, "player_key", int(player_id))
+
+    def season_key(self, conn, season_id: str) -> int | None:
+        return self.get(conn, "season_key", str(season_id))
+
+
+dim_cache = DimensionCache()
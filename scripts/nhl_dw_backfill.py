@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+nhl_dw_backfill.py
+
+Backfill the nhl_dw star schema from the legacy tables that
+nhl_loader_2025-26.py fills (teams, games, players, player_game_stats),
+without going back to the API.
+
+Everything is INSERT ... SELECT inside the database:
+
+  dim_season        distinct games.season
+  dim_date          distinct game dates (NHL schedule day, US Eastern)
+  dim_team          legacy teams matched on abbreviation
+  dim_player        legacy players (only fills gaps in existing rows)
+  fact_game         games
+  fact_skater_game  player_game_stats, position_code <> 'G'
+  fact_goalie_game  player_game_stats, position_code  = 'G'
+
+The game-level steps run in batches of BACKFILL_BATCH_GAMES consecutive
+game_ids, one statement per batch, so a full season is a few dozen
+statements. Commits follow the CommitPolicy (nhl_db), so a failure only
+loses the work since the last commit. All steps are upserts and can be
+re-run.
+
+legacy teams.team_id is a local identity, not the NHL team id that
+dim_team.team_id holds, so teams are matched on team_abbrev. Teams that
+have no dim_team row are reported and their games skipped.
+
+    python nhl_dw_backfill.py                    # every legacy season
+    python nhl_dw_backfill.py --season 20252026
+"""
+
+import argparse
+
+from nhl_db import CommitPolicy, get_conn, put_conn
+from nhl_dimcache import dim_cache
+from nhl_fact_elt import TOI_SECONDS_SQL
+
+# ---------------------------------------------------------------------------
+# CONFIG
+# ---------------------------------------------------------------------------
+
+BACKFILL_BATCH_GAMES = 1000
+
+# The NHL schedule day follows US Eastern time
+NHL_TIMEZONE = "America/New_York"
+
+
+# ---------------------------------------------------------------------------
+# DIMENSIONS
+# ---------------------------------------------------------------------------
+
+# %(seasons)s: list of season ids, or NULL for all
+_SEASON_FILTER = "(%(seasons)s::text[] IS NULL OR g.season = ANY(%(seasons)s::text[]))"
+
+DIM_SEASON_SQL = f"""
+    INSERT INTO nhl_dw.dim_season (season_id, start_year, end_year, is_current)
+    SELECT s.season,
+           left(s.season, 4)::int2,
+           right(s.season, 4)::int2,
+           s.season = (SELECT max(season) FROM games)
+    FROM (SELECT DISTINCT g.season FROM games g WHERE {_SEASON_FILTER}) s
+    WHERE s.season ~ '^[0-9]{{8}}$'
+    ON CONFLICT (season_id) DO UPDATE
+    SET start_year = EXCLUDED.start_year,
+        end_year   = EXCLUDED.end_year,
+        is_current = EXCLUDED.is_current
+    WHERE (dim_season.start_year, dim_season.end_year, dim_season.is_current)
+          IS DISTINCT FROM
+          (EXCLUDED.start_year, EXCLUDED.end_year, EXCLUDED.is_current)
+    RETURNING 1;
+"""
+
+DIM_DATE_SQL = f"""
+    INSERT INTO nhl_dw.dim_date (
+        date_key, "year", "month", "day", day_of_week,
+        week_of_year, month_name, is_weekend
+    )
+    SELECT d,
+           extract(year FROM d)::int2,
+           extract(month FROM d)::int2,
+           extract(day FROM d)::int2,
+           extract(isodow FROM d)::int2,
+           extract(week FROM d)::int2,
+           trim(to_char(d, 'Month')),
+           extract(isodow FROM d) >= 6
+    FROM (
+        SELECT DISTINCT (g.game_date AT TIME ZONE '{NHL_TIMEZONE}')::date AS d
+        FROM games g
+        WHERE g.game_date IS NOT NULL AND {_SEASON_FILTER}
+    ) dates
+    ON CONFLICT (date_key) DO NOTHING
+    RETURNING 1;
+"""
+
+# dim_team is keyed by the NHL team id, which the legacy table doesn't
+# have; only the descriptive columns of matching rows are filled in.
+DIM_TEAM_SQL = """
+    UPDATE nhl_dw.dim_team dt
+    SET conference = COALESCE(dt.conference, t.conference),
+        division   = COALESCE(dt.division, t.division),
+        city       = COALESCE(dt.city, t.city),
+        updated_at = now()
+    FROM teams t
+    WHERE t.abbreviation = dt.team_abbrev
+      AND (dt.conference, dt.division, dt.city) IS DISTINCT FROM (
+          COALESCE(dt.conference, t.conference),
+          COALESCE(dt.division, t.division),
+          COALESCE(dt.city, t.city)
+      )
+    RETURNING 1;
+"""
+
+MISSING_TEAMS_SQL = """
+    SELECT t.abbreviation
+    FROM teams t
+    LEFT JOIN nhl_dw.dim_team dt ON dt.team_abbrev = t.abbreviation
+    WHERE dt.team_key IS NULL
+    ORDER BY t.abbreviation;
+"""
+
+DIM_PLAYER_SQL = """
+    INSERT INTO nhl_dw.dim_player (
+        player_id, full_name, first_name, last_name,
+        shoots_catches, primary_position, sweater_number, birth_date
+    )
+    SELECT p.player_id,
+           COALESCE(p.full_name, p.player_id::text),
+           p.first_name, p.last_name,
+           p.shoots_catches, p.primary_position, p.sweater_number,
+           p.birth_date::date
+    FROM players p
+    ON CONFLICT (player_id) DO UPDATE
+    SET first_name       = COALESCE(dim_player.first_name, EXCLUDED.first_name),
+        last_name        = COALESCE(dim_player.last_name, EXCLUDED.last_name),
+        shoots_catches   = COALESCE(dim_player.shoots_catches, EXCLUDED.shoots_catches),
+        primary_position = COALESCE(dim_player.primary_position, EXCLUDED.primary_position),
+        sweater_number   = COALESCE(dim_player.sweater_number, EXCLUDED.sweater_number),
+        birth_date       = COALESCE(dim_player.birth_date, EXCLUDED.birth_date),
+        updated_at       = now()
+    WHERE (dim_player.first_name, dim_player.last_name,
+           dim_player.shoots_catches, dim_player.primary_position,
+           dim_player.sweater_number, dim_player.birth_date)
+          IS DISTINCT FROM
+          (COALESCE(dim_player.first_name, EXCLUDED.first_name),
+           COALESCE(dim_player.last_name, EXCLUDED.last_name),
+           COALESCE(dim_player.shoots_catches, EXCLUDED.shoots_catches),
+           COALESCE(dim_player.primary_position, EXCLUDED.primary_position),
+           COALESCE(dim_player.sweater_number, EXCLUDED.sweater_number),
+           COALESCE(dim_player.birth_date, EXCLUDED.birth_date))
+    RETURNING 1;
+"""
+
+
+# ---------------------------------------------------------------------------
+# FACTS (one batch of game_ids: %(first)s .. %(last)s)
+# ---------------------------------------------------------------------------
+
+FACT_GAME_SQL = f"""
+    INSERT INTO nhl_dw.fact_game (
+        game_id, season_key, date_key, home_team_key, away_team_key,
+        home_score, away_score, game_type, start_time_utc, game_state
+    )
+    SELECT g.game_id, s.season_key,
+           (g.game_date AT TIME ZONE '{NHL_TIMEZONE}')::date,
+           h.team_key, a.team_key,
+           g.home_score, g.away_score, g.game_type::text,
+           g.game_date, g.game_state
+    FROM games g
+    JOIN nhl_dw.dim_season s ON s.season_id = g.season
+    JOIN teams ht ON ht.team_id = g.home_team_id
+    JOIN teams awt ON awt.team_id = g.away_team_id
+    JOIN nhl_dw.dim_team h ON h.team_abbrev = ht.abbreviation
+    JOIN nhl_dw.dim_team a ON a.team_abbrev = awt.abbreviation
+    WHERE g.game_id BETWEEN %(first)s AND %(last)s
+      AND g.game_date IS NOT NULL
+      AND {_SEASON_FILTER}
+    ON CONFLICT (game_id) DO UPDATE
+    SET season_key     = EXCLUDED.season_key,
+        date_key       = EXCLUDED.date_key,
+        home_team_key  = EXCLUDED.home_team_key,
+        away_team_key  = EXCLUDED.away_team_key,
+        home_score     = EXCLUDED.home_score,
+        away_score     = EXCLUDED.away_score,
+        game_type      = EXCLUDED.game_type,
+        start_time_utc = EXCLUDED.start_time_utc,
+        game_state     = COALESCE(EXCLUDED.game_state, fact_game.game_state),
+        updated_at     = now()
+    WHERE (fact_game.season_key, fact_game.date_key,
+           fact_game.home_team_key, fact_game.away_team_key,
+           fact_game.home_score, fact_game.away_score, fact_game.game_type,
+           fact_game.start_time_utc, fact_game.game_state)
+          IS DISTINCT FROM
+          (EXCLUDED.season_key, EXCLUDED.date_key, EXCLUDED.home_team_key,
+           EXCLUDED.away_team_key, EXCLUDED.home_score, EXCLUDED.away_score,
+           EXCLUDED.game_type, EXCLUDED.start_time_utc,
+           COALESCE(EXCLUDED.game_state, fact_game.game_state))
+    RETURNING 1;
+"""
+
+# player_game_stats rows of the batch with their warehouse keys
+_STATS_CTE = f"""
+    stats AS (
+        SELECT fg.game_key, dp.player_key, dt.team_key, pgs.*,
+               {TOI_SECONDS_SQL.format(col='pgs.time_on_ice::text')} AS toi_seconds
+        FROM player_game_stats pgs
+        JOIN games g ON g.game_id = pgs.game_id
+        JOIN nhl_dw.fact_game fg ON fg.game_id = pgs.game_id
+        JOIN nhl_dw.dim_player dp ON dp.player_id = pgs.player_id
+        JOIN teams t ON t.team_id = pgs.team_id
+        JOIN nhl_dw.dim_team dt ON dt.team_abbrev = t.abbreviation
+        WHERE pgs.game_id BETWEEN %(first)s AND %(last)s
+          AND {_SEASON_FILTER}
+    )
+"""
+
+FACT_SKATER_SQL = f"""
+    WITH {_STATS_CTE}
+    INSERT INTO nhl_dw.fact_skater_game (
+        game_key, player_key, team_key, toi_seconds,
+        goals, assists, points, shots, hits, blocks,
+        plus_minus, penalty_minutes
+    )
+    SELECT game_key, player_key, team_key, toi_seconds,
+           goals, assists, points, shots, hits, blocks,
+           plus_minus, penalty_minutes
+    FROM stats
+    WHERE position_code IS DISTINCT FROM 'G'
+    ON CONFLICT (game_key, player_key) DO UPDATE
+    SET team_key        = EXCLUDED.team_key,
+        toi_seconds     = EXCLUDED.toi_seconds,
+        goals           = EXCLUDED.goals,
+        assists         = EXCLUDED.assists,
+        points          = EXCLUDED.points,
+        shots           = EXCLUDED.shots,
+        hits            = EXCLUDED.hits,
+        blocks          = EXCLUDED.blocks,
+        plus_minus      = EXCLUDED.plus_minus,
+        penalty_minutes = EXCLUDED.penalty_minutes,
+        updated_at      = now()
+    WHERE (fact_skater_game.team_key, fact_skater_game.toi_seconds,
+           fact_skater_game.goals, fact_skater_game.assists,
+           fact_skater_game.points, fact_skater_game.shots,
+           fact_skater_game.hits, fact_skater_game.blocks,
+           fact_skater_game.plus_minus, fact_skater_game.penalty_minutes)
+          IS DISTINCT FROM
+          (EXCLUDED.team_key, EXCLUDED.toi_seconds, EXCLUDED.goals,
+           EXCLUDED.assists, EXCLUDED.points, EXCLUDED.shots, EXCLUDED.hits,
+           EXCLUDED.blocks, EXCLUDED.plus_minus, EXCLUDED.penalty_minutes)
+    RETURNING 1;
+"""
+
+# shutout: no goals against and the only goalie of the team with ice time
+FACT_GOALIE_SQL = f"""
+    WITH {_STATS_CTE},
+    goalies AS (
+        SELECT stats.*,
+               count(*) FILTER (WHERE toi_seconds > 0)
+                   OVER (PARTITION BY game_key, team_key) AS n_played
+        FROM stats
+        WHERE position_code = 'G'
+    )
+    INSERT INTO nhl_dw.fact_goalie_game (
+        game_key, player_key, team_key, toi_seconds,
+        shots_against, saves, goals_against, save_pct, shutout
+    )
+    SELECT game_key, player_key, team_key, toi_seconds,
+           shots_against, saves, goals_against,
+           round(COALESCE(save_pct::numeric, saves::numeric / NULLIF(shots_against, 0)), 3),
+           CASE WHEN goals_against IS NOT NULL AND toi_seconds IS NOT NULL
+                THEN goals_against = 0 AND toi_seconds > 0 AND n_played = 1
+           END
+    FROM goalies
+    ON CONFLICT (game_key, player_key) DO UPDATE
+    SET team_key      = EXCLUDED.team_key,
+        toi_seconds   = EXCLUDED.toi_seconds,
+        shots_against = EXCLUDED.shots_against,
+        saves         = EXCLUDED.saves,
+        goals_against = EXCLUDED.goals_against,
+        save_pct      = EXCLUDED.save_pct,
+        shutout       = EXCLUDED.shutout,
+        updated_at    = now()
+    WHERE (fact_goalie_game.team_key, fact_goalie_game.toi_seconds,
+           fact_goalie_game.shots_against, fact_goalie_game.saves,
+           fact_goalie_game.goals_against, fact_goalie_game.save_pct,
+           fact_goalie_game.shutout)
+          IS DISTINCT FROM
+          (EXCLUDED.team_key, EXCLUDED.toi_seconds, EXCLUDED.shots_against,
+           EXCLUDED.saves, EXCLUDED.goals_against, EXCLUDED.save_pct,
+           EXCLUDED.shutout)
+    RETURNING 1;
+"""
+
+
+# ---------------------------------------------------------------------------
+# RUNNER
+# ---------------------------------------------------------------------------
+
+def _execute(conn, sql: str, params: dict) -> int:
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.rowcount
+
+
+def game_id_batches(conn, seasons: list[str] | None, batch_games: int = BACKFILL_BATCH_GAMES):
+    """
+    (first, last) game_id ranges covering batch_games legacy games each.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT g.game_id FROM games g WHERE {_SEASON_FILTER} ORDER BY g.game_id;",
+            {"seasons": seasons},
+        )
+        ids = [r[0] for r in cur.fetchall()]
+    return [
+        (ids[i], ids[min(i + batch_games, len(ids)) - 1])
+        for i in range(0, len(ids), batch_games)
+    ]
+
+
+def backfill(
+    conn,
+    seasons: list[str] | None = None,
+    batch_games: int = BACKFILL_BATCH_GAMES,
+    policy: CommitPolicy | None = None,
+) -> None:
+    params = {"seasons": seasons}
+    policy = policy or CommitPolicy.from_config()
+
+    for label, sql in (
+        ("dim_season", DIM_SEASON_SQL),
+        ("dim_date", DIM_DATE_SQL),
+        ("dim_team", DIM_TEAM_SQL),
+        ("dim_player", DIM_PLAYER_SQL),
+    ):
+        count = _execute(conn, sql, params)
+        conn.commit()
+        print(f"Backfill: {label} {count} rows")
+
+    with conn.cursor() as cur:
+        cur.execute(MISSING_TEAMS_SQL)
+        missing = [r[0] for r in cur.fetchall()]
+    if missing:
+        print(f"Backfill: no dim_team row for {', '.join(missing)}; their games are skipped")
+
+    # The key caches may predate the rows inserted above
+    dim_cache.invalidate()
+
+    batches = game_id_batches(conn, seasons, batch_games)
+    for label, sql in (
+        ("fact_game", FACT_GAME_SQL),
+        ("fact_skater_game", FACT_SKATER_SQL),
+        ("fact_goalie_game", FACT_GOALIE_SQL),
+    ):
+        total = 0
+        for first, last in batches:
+            count = _execute(conn, sql, {**params, "first": first, "last": last})
+            total += count
+            policy.add(rows=count, games=batch_games)
+            policy.maybe_commit(conn)
+        policy.commit(conn)
+        print(f"Backfill: {label} {total} rows in {len(batches)} batches")
+
+
+# ---------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill nhl_dw from the legacy tables")
+    parser.add_argument("--season", action="append", dest="seasons",
+                        help="season id to backfill, e.g. 20252026 (repeatable; default all)")
+    parser.add_argument("--batch-games", type=int, default=BACKFILL_BATCH_GAMES,
+                        help="games per INSERT ... SELECT")
+    args = parser.parse_args()
+
+    conn = get_conn()
+    try:
+        backfill(conn, args.seasons, args.batch_games)
+    finally:
+        put_conn(conn)
+
+
+if __name__ == "__main__":
+    main()
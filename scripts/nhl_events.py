@@ -1,34 +1,115 @@
 #!/usr/bin/env python3
 
-from nhlpy import NHLClient
-import psycopg2
-from datetime import date, timedelta
+import argparse
+import io
+import json
+import time
+from zoneinfo import ZoneInfo
 
-DB_HOST = "localhost"
-DB_PORT = 5432
-DB_NAME = "nhl_db"
-DB_USER = "nhl_user"
-DB_PASSWORD = "strongpassword"
+from nhl_http import NHLApiClient
+from psycopg2.extras import Json
+from datetime import date, datetime, timedelta
+from typing import Dict
+
+from nhl_cache import PayloadCache
+from nhl_db import CommitPolicy, get_conn, put_conn
+from nhl_dimcache import dim_cache
+from nhl_game_state import FINAL_STATES, FUTURE_STATES, LIVE_STATES, STARTED_STATES
+from nhl_governor import GovernedClient, governor
+from nhl_load_state import PayloadHashes, payload_hash
+from nhl_parallel import fetch_in_order
+from nhl_pipeline import run_pipeline
 
 SEASON_ID = "20252026"
 
-client = NHLClient(debug=True, timeout=30)
+# Bulk path: plays of this many games are streamed into event_play with a
+# single COPY. Set USE_COPY = False to fall back to one INSERT per play.
+USE_COPY = True
+COPY_BATCH_GAMES = 25
+
+# Play-by-play payloads fetched concurrently while a batch is written
+FETCH_WORKERS = 8
+
+# Live tailing: every TAIL_POLL_INTERVAL seconds the play-by-play of all
+# live games is fetched (TAIL_WORKERS at a time) and new plays appended.
+TAIL_POLL_INTERVAL = 15
+TAIL_WORKERS = 8
+
+# The NHL schedule day follows US Eastern time
+NHL_TIMEZONE = ZoneInfo("America/New_York")
+
+EVENT_COLUMNS = (
+    "season_key",
+    "game_key",
+    "event_index",
+    "period",
+    "time_in_period",
+    "type_code",
+    "type_desc",
+    "x",
+    "y",
+    "shooter_id",
+    "goalie_id",
+    "team_id",
+    "raw_json",
+)
 
-def get_conn():
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
+# Columns rewritten when a stored event differs from the fetched one
+EVENT_VALUE_COLUMNS = EVENT_COLUMNS[3:]
+
+client = GovernedClient(NHLApiClient(pool_size=FETCH_WORKERS, timeout=30))
+payload_cache = PayloadCache()
+
+def get_pbp(game_id: str, use_cache: bool = True):
+    if not use_cache:
+        return client.game_center.play_by_play(game_id=game_id)
+    return payload_cache.fetch(
+        "play-by-play",
+        {"game_id": int(game_id)},
+        lambda: client.game_center.play_by_play(game_id=game_id),
     )
 
-def get_pbp(game_id: str):
-    endpoint = f"/v1/gamecenter/{game_id}/play-by-play"
-    return client._http_client.get(endpoint=endpoint)
+
+def event_values(season_key, game_key, idx, play):
+    """
+    One play from the play-by-play payload -> values in EVENT_COLUMNS order.
+    raw_json is returned as the play dict itself.
+    """
+    details = play.get("details", {})
+    return (
+        season_key,
+        game_key,
+        idx,
+        play.get("period"),
+        play.get("timeInPeriod"),
+        play.get("typeCode"),
+        play.get("typeDescKey"),
+        details.get("xCoord"),
+        details.get("yCoord"),
+        details.get("shooterId"),
+        details.get("goalieId"),
+        details.get("eventOwnerTeamId"),
+        play,
+    )
 
 
-def load_events_for_game(conn, game_key, game_id):
+def _event_changed_sql(target: str, source: str) -> str:
+    return (
+        f"({', '.join(f'{target}.{c}' for c in EVENT_VALUE_COLUMNS)}) IS DISTINCT FROM "
+        f"({', '.join(f'{source}.{c}' for c in EVENT_VALUE_COLUMNS)})"
+    )
+
+
+# Upsert on (season_key, game_key, event_index). Rows that didn't change
+# are not rewritten, so a re-run leaves no dead tuples behind.
+EVENT_UPSERT_CONFLICT = f"""
+    ON CONFLICT (season_key, game_key, event_index) DO UPDATE
+    SET {', '.join(f'{c} = EXCLUDED.{c}' for c in EVENT_VALUE_COLUMNS)}
+    WHERE {_event_changed_sql('event_play', 'EXCLUDED')}
+"""
+
+
+def load_events_for_game(conn, season_key, game_key, game_id):
     pbp = get_pbp(str(game_id))
 
     plays = pbp.get("plays", [])
@@ -36,10 +117,10 @@ def load_events_for_game(conn, game_key, game_id):
 
     with conn.cursor() as cur:
         for idx, play in enumerate(plays):
-            details = play.get("details", {})
-
-            cur.execute("""
-                INSERT INTO nhl_dw.event_play (
+            values = event_values(season_key, game_key, idx, play)
+            cur.execute(f"""
+                INSERT INTO nhl_dw.event_play AS event_play (
+                    season_key,
                     game_key,
                     event_index,
                     period,
@@ -52,61 +133,637 @@ def load_events_for_game(conn, game_key, game_id):
                     team_id,
                     raw_json
                 ) VALUES (
-                    %s,%s,%s,%s,%s,%s,
+                    %s,%s,%s,%s,%s,%s,%s,
                     %s,%s,
                     %s,%s,%s,
                     %s
-                );
-            """, (
-                game_key,
-                idx,
-                play.get("period"),
-                play.get("timeInPeriod"),
-                play.get("typeCode"),
-                play.get("typeDescKey"),
-                details.get("xCoord"),
-                details.get("yCoord"),
-                details.get("shooterId"),
-                details.get("goalieId"),
-                details.get("eventOwnerTeamId"),
-                play  # JSONB
-            ))
+                )
+                {EVENT_UPSERT_CONFLICT};
+            """, values[:-1] + (Json(play),))
 
+        # Plays that disappeared from the feed (e.g. a retracted event)
+        cur.execute("""
+            DELETE FROM nhl_dw.event_play
+            WHERE season_key = %s AND game_key = %s AND event_index >= %s;
+        """, (season_key, game_key, len(plays)))
 
     conn.commit()
 
 
-def load_season_events(conn):
-    # Get all games for the season
+# ---------------------------------------------------------------------------
+# BULK LOAD (COPY FROM STDIN)
+# ---------------------------------------------------------------------------
+
+def _copy_text(value) -> str:
+    """
+    Format one value for COPY ... FROM STDIN in PostgreSQL text format.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, separators=(",", ":"))
+    elif isinstance(value, bool):
+        value = "t" if value else "f"
+    else:
+        value = str(value)
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_event_rows(conn, rows, table: str = "nhl_dw.event_play") -> int:
+    """
+    Stream event rows (tuples in EVENT_COLUMNS order) into `table` with one
+    COPY. The JSONB raw_json column is sent as its JSON text.
+    Does not commit.
+    """
+    buf = io.StringIO()
+    count = 0
+    for row in rows:
+        buf.write("\t".join(_copy_text(v) for v in row))
+        buf.write("\n")
+        count += 1
+
+    if count == 0:
+        return 0
+
+    buf.seek(0)
+    with conn.cursor() as cur:
+        cur.copy_expert(
+            f"COPY {table} ({', '.join(EVENT_COLUMNS)}) FROM STDIN",
+            buf,
+        )
+    return count
+
+
+def merge_event_rows(conn, rows, replace_games: bool = True) -> int:
+    """
+    Idempotent bulk load of event rows.
+
+    The rows are COPYed into a temporary staging table and merged into
+    nhl_dw.event_play on (season_key, game_key, event_index): new events
+    are inserted, changed ones updated and identical ones left untouched. With
+    replace_games, events of the staged games that are no longer in the
+    feed are deleted, so after commit each game holds exactly the fetched
+    plays. Everything happens in the caller's transaction, so the swap is
+    atomic. Does not commit.
+    """
+    rows = list(rows)
+    columns = ", ".join(EVENT_COLUMNS)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS event_play_stage
+            ON COMMIT DELETE ROWS
+            AS SELECT {columns} FROM nhl_dw.event_play WITH NO DATA;
+        """)
+        cur.execute("TRUNCATE event_play_stage;")
+
+    count = copy_event_rows(conn, rows, table="event_play_stage")
+    if count == 0:
+        return 0
+
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            INSERT INTO nhl_dw.event_play AS event_play ({columns})
+            SELECT {columns} FROM event_play_stage
+            {EVENT_UPSERT_CONFLICT};
+        """)
+
+        if replace_games:
+            # season_key / game_key as literals so the planner prunes
+            # partitions up front.
+            season_keys = sorted({r[0] for r in rows})
+            game_keys = sorted({r[1] for r in rows})
+            cur.execute("""
+                DELETE FROM nhl_dw.event_play e
+                WHERE e.season_key = ANY(%s)
+                  AND e.game_key = ANY(%s)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM event_play_stage s
+                      WHERE s.season_key = e.season_key
+                        AND s.game_key = e.game_key
+                        AND s.event_index = e.event_index
+                  );
+            """, (season_keys, game_keys))
+    return count
+
+
+# ---------------------------------------------------------------------------
+# SEASON PARTITIONS
+# ---------------------------------------------------------------------------
+
+# season_keys whose event_play partition is known to exist
+_partitions_ready = set()
+
+
+def event_partition_name(season_id: str) -> str:
+    season_id = str(season_id)
+    if not season_id.isdigit():
+        raise ValueError(f"Unexpected season_id {season_id!r}")
+    return f"event_play_{season_id}"
+
+
+def _season_id_for_key(conn, season_key) -> str:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT season_id FROM nhl_dw.dim_season WHERE season_key = %s;",
+            (season_key,),
+        )
+        row = cur.fetchone()
+    if row is None:
+        raise ValueError(f"season_key {season_key} not found in nhl_dw.dim_season")
+    return row[0]
+
+
+def ensure_event_partition(conn, season_key) -> None:
+    """
+    Create the event_play partition for a season if it doesn't exist yet.
+    The parent's indexes (game_key, type_code, the unique key) are created
+    on the partition automatically.
+
+    Commits the creation, so that a later rollback of the caller's load
+    can't take the partition with it; call it before the transaction's
+    own writes.
+    """
+    if season_key in _partitions_ready:
+        return
+
+    name = event_partition_name(_season_id_for_key(conn, season_key))
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS nhl_dw.{name}
+            PARTITION OF nhl_dw.event_play
+            FOR VALUES IN ({int(season_key)});
+        """)
+    conn.commit()
+    _partitions_ready.add(season_key)
+
+
+# ---------------------------------------------------------------------------
+# SEASON LOADS
+# ---------------------------------------------------------------------------
+
+def fetch_event_rows(
+    season_key,
+    games,
+    hashes: PayloadHashes | None = None,
+    failed: Dict[int, str] | None = None,
+):
+    """
+    Fetch play-by-play for (game_key, game_id) pairs and return their event
+    rows. A game whose play-by-play can't be fetched is reported, left
+    out and, with `failed`, recorded there as game_id -> error. With
+    `hashes`, games whose play-by-play is unchanged since the last load
+    are left out too.
+    """
+    rows = []
+    for game_key, game_id in games:
+        pbp = _fetch_pbp_or_none(game_id, failed)
+        if pbp is None:
+            continue
+
+        if hashes is not None and not hashes.changed(game_id, pbp):
+            print(f"Game {game_id}: unchanged, skipped")
+            continue
+
+        plays = pbp.get("plays", [])
+        print(f"Game {game_id}: {len(plays)} events")
+        rows.extend(
+            event_values(season_key, game_key, idx, play)
+            for idx, play in enumerate(plays)
+        )
+    return rows
+
+
+def copy_events_for_games(
+    conn,
+    season_key,
+    games,
+    hashes: PayloadHashes | None = None,
+    failed: Dict[int, str] | None = None,
+) -> int:
+    """
+    Fetch play-by-play for a batch of (game_key, game_id) pairs of one
+    season and replace their events with a single COPY + merge and a
+    single commit. Loading the same games again leaves event_play
+    unchanged. Games that couldn't be fetched go into `failed` (see
+    fetch_event_rows).
+    """
+    ensure_event_partition(conn, season_key)
+    rows = fetch_event_rows(season_key, games, hashes, failed)
+
+    try:
+        count = merge_event_rows(conn, rows)
+        if hashes is not None:
+            hashes.batch.flush()
+    except Exception:
+        if hashes is not None:
+            hashes.batch.clear()
+        raise
+    conn.commit()
+    return count
+
+
+def get_season_games(conn, season_key):
+    """
+    All games of the season that have started; future games have no
+    play-by-play yet. Rows without a state fall back to the start time.
+    """
     with conn.cursor() as cur:
         cur.execute("""
             SELECT game_key, game_id
             FROM nhl_dw.fact_game
-            WHERE season_key = (
-                SELECT season_key FROM nhl_dw.dim_season WHERE season_id = %s
-            )
+            WHERE season_key = %s
+              AND (game_state = ANY(%s)
+                   OR (game_state IS NULL AND start_time_utc <= now()))
             ORDER BY game_id;
-        """, (SEASON_ID,))
-        games = cur.fetchall()
+        """, (season_key, sorted(STARTED_STATES)))
+        return cur.fetchall()
+
+
+def _fetch_pbp_or_none(game_id, failed: Dict[int, str] | None = None):
+    """
+    None when the play-by-play can't be fetched; the error goes into
+    `failed` (game_id -> error) when given.
+    """
+    try:
+        return get_pbp(str(game_id))
+    except Exception as e:
+        print(f"Error fetching game {game_id}: {e}")
+        if failed is not None:
+            failed[int(game_id)] = f"{type(e).__name__}: {e.__cause__ or e}"
+        return None
+
 
+def stream_events_for_games(
+    conn,
+    season_key,
+    games,
+    hashes: PayloadHashes | None = None,
+    batch_games: int = COPY_BATCH_GAMES,
+    workers: int = FETCH_WORKERS,
+    stop_on_error: bool = False,
+    policy: CommitPolicy | None = None,
+    failed: Dict[int, str] | None = None,
+) -> int:
+    """
+    Load events for (game_key, game_id) pairs of one season through a
+    fetch -> normalize -> write pipeline: play-by-play is fetched and
+    turned into rows by worker threads while this thread merges the
+    previous batch_games games (COPY + merge). Commits follow the policy
+    (default: CommitPolicy.from_config()) and happen at the end. A game
+    that can't be fetched or a transaction that fails is reported and the
+    rest continue, unless stop_on_error; with `failed`, the games that
+    weren't loaded are recorded there as game_id -> error. Returns the
+    number of events committed.
+    """
+    ensure_event_partition(conn, season_key)
+    policy = policy or CommitPolicy.from_config()
+
+    def normalize(game, pbp):
+        if pbp is None:
+            return None
+        return payload_hash(pbp), [
+            event_values(season_key, game[0], idx, play)
+            for idx, play in enumerate(pbp.get("plays", []))
+        ]
+
+    total = 0
+    rows, batch = [], []
+    # Merged since the last commit; lost together on a rollback
+    merged, uncommitted = 0, []
+
+    def flush(final: bool = False):
+        nonlocal total, rows, batch, merged, uncommitted
+        uncommitted += batch
+        try:
+            if batch:
+                count = merge_event_rows(conn, rows)
+                if hashes is not None:
+                    hashes.batch.flush()
+                merged += count
+                policy.add(rows=count, games=len(batch))
+                print(f"Copied {count} events from {len(batch)} games.")
+            if final or policy.due:
+                policy.commit(conn)
+                total += merged
+                merged, uncommitted = 0, []
+        except Exception as e:
+            print(f"Error loading games {uncommitted}: {e}")
+            if failed is not None:
+                failed.update((g, f"{type(e).__name__}: {e}") for g in uncommitted)
+            conn.rollback()
+            policy.reset()
+            merged, uncommitted = 0, []
+            if hashes is not None:
+                hashes.batch.clear()
+            if stop_on_error:
+                raise
+        rows, batch = [], []
+
+    fetched = run_pipeline(
+        games,
+        fetch=(lambda g: get_pbp(str(g[1]))) if stop_on_error else (lambda g: _fetch_pbp_or_none(g[1], failed)),
+        normalize=normalize,
+        fetch_workers=workers,
+    )
+    for (game_key, game_id), result in fetched:
+        if result is None:
+            continue
+        digest, game_rows = result
+        if hashes is not None and not hashes.changed(game_id, None, digest):
+            print(f"Game {game_id}: unchanged, skipped")
+            continue
+        print(f"Game {game_id}: {len(game_rows)} events")
+        rows.extend(game_rows)
+        batch.append(game_id)
+        if len(batch) >= batch_games:
+            flush()
+
+    flush(final=True)
+    return total
+
+
+def load_season_events(conn):
+    season_key = dim_cache.season_key(conn, SEASON_ID)
+    if season_key is None:
+        print(f"Season {SEASON_ID} not found in nhl_dw.dim_season")
+        return
+
+    games = get_season_games(conn, season_key)
     print(f"Found {len(games)} games for season {SEASON_ID}")
 
+    if USE_COPY:
+        hashes = PayloadHashes(conn, "play-by-play", "events", [g for _, g in games])
+        total = stream_events_for_games(conn, season_key, games, hashes)
+        print(f"Copied {total} events.")
+        print(f"Skipped {hashes.skipped}/{len(games)} games with unchanged play-by-play.")
+        return
+
+    ensure_event_partition(conn, season_key)
     for game_key, game_id in games:
         print(f"==== Loading events for game_id={game_id} ====")
         try:
-            load_events_for_game(conn, game_key, game_id)
+            load_events_for_game(conn, season_key, game_key, game_id)
         except Exception as e:
             print(f"Error loading game {game_id}: {e}")
             conn.rollback()
 
 
+def reload_season_events(conn, season_id: str = SEASON_ID):
+    """
+    Rebuild a whole season's events without a bulk DELETE.
+
+    The season is loaded into a fresh standalone table, which is then
+    swapped in within one transaction: the old partition is detached and
+    dropped, the new table attached in its place. Readers see either the
+    old or the new season, never a half-loaded one, and no dead tuples
+    are left behind. The CHECK constraint lets ATTACH skip its scan.
+
+    If any game's play-by-play can't be fetched, the staging table is
+    dropped and the old partition kept, so an API error never deletes a
+    game's events. Events that --tail or the incremental loader write
+    into the old partition while the reload runs are lost at the swap;
+    don't run them for the same season at the same time.
+    """
+    season_key = dim_cache.season_key(conn, season_id)
+    if season_key is None:
+        print(f"Season {season_id} not found in nhl_dw.dim_season")
+        return
+
+    name = event_partition_name(season_id)
+    staging = f"{name}_new"
+    ensure_event_partition(conn, season_key)
+
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS nhl_dw.{staging};")
+        cur.execute(f"""
+            CREATE TABLE nhl_dw.{staging}
+            (LIKE nhl_dw.event_play INCLUDING DEFAULTS);
+        """)
+        cur.execute(f"""
+            ALTER TABLE nhl_dw.{staging}
+            ADD CONSTRAINT {staging}_season_check CHECK (season_key = {int(season_key)});
+        """)
+    conn.commit()
+
+    games = get_season_games(conn, season_key)
+    print(f"Reloading {len(games)} games of season {season_id} into nhl_dw.{staging}")
+
+    hashes = PayloadHashes(conn, "play-by-play", "events", [g for _, g in games])
+    hashes.known.clear()    # full reload: record every game's hash again
+
+    total = 0
+    failed: Dict[int, str] = {}
+    for start in range(0, len(games), COPY_BATCH_GAMES):
+        batch = games[start:start + COPY_BATCH_GAMES]
+        rows = fetch_event_rows(season_key, batch, hashes, failed)
+        total += copy_event_rows(conn, rows, table=f"nhl_dw.{staging}")
+        conn.commit()
+
+    if failed:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE nhl_dw.{staging};")
+        conn.commit()
+        hashes.batch.clear()
+        print(
+            f"Season {season_id}: {len(failed)} games not fetched ({sorted(failed)}), "
+            f"kept the old events."
+        )
+        return
+
+    with conn.cursor() as cur:
+        cur.execute(f"ALTER TABLE nhl_dw.event_play DETACH PARTITION nhl_dw.{name};")
+        cur.execute(f"DROP TABLE nhl_dw.{name};")
+        cur.execute(f"""
+            ALTER TABLE nhl_dw.event_play
+            ATTACH PARTITION nhl_dw.{staging} FOR VALUES IN ({int(season_key)});
+        """)
+        cur.execute(f"ALTER TABLE nhl_dw.{staging} RENAME TO {name};")
+    hashes.batch.flush()
+    conn.commit()
+
+    print(f"Season {season_id}: swapped in {total} events.")
+
+
+# ---------------------------------------------------------------------------
+# LIVE TAILING
+# ---------------------------------------------------------------------------
+
+def get_todays_games(conn):
+    """
+    Games on the current NHL schedule day (and the previous one, whose late
+    games may still be running after midnight Eastern), as
+    (season_key, game_key, game_id, game_state). Games missing from
+    fact_game are reported and left out.
+    """
+    today = datetime.now(NHL_TIMEZONE).date()
+    states = {}
+    for d in (today - timedelta(days=1), today):
+        schedule = client.schedule.daily_schedule(date=d.isoformat())
+        for g in schedule.get("games", []):
+            states[int(g["id"])] = g.get("gameState")
+
+    if not states:
+        return []
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT game_id, season_key, game_key
+            FROM nhl_dw.fact_game
+            WHERE game_id = ANY(%s);
+        """, (list(states),))
+        keys = {game_id: (season_key, game_key) for game_id, season_key, game_key in cur.fetchall()}
+
+    for game_id in states.keys() - keys.keys():
+        print(f"Tail: game {game_id} not in nhl_dw.fact_game, skipped")
+
+    return [
+        (*keys[gid], gid, state)
+        for gid, state in states.items()
+        if gid in keys
+    ]
+
+
+def get_last_sort_orders(conn, season_keys, game_keys):
+    """
+    Highest stored sortOrder per game, so tailing continues where the
+    table currently ends (also after a restart).
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT game_key, max((raw_json->>'sortOrder')::int)
+            FROM nhl_dw.event_play
+            WHERE season_key = ANY(%s)
+              AND game_key = ANY(%s)
+            GROUP BY game_key;
+        """, (sorted(set(season_keys)), list(game_keys)))
+        return dict(cur.fetchall())
+
+
+def new_event_rows(season_key, game_key, plays, last_sort_order):
+    """
+    Rows for plays after last_sort_order (all plays if None). event_index
+    stays the play's position in the full play list, same as a full load.
+    """
+    rows = []
+    for idx, play in enumerate(plays):
+        sort_order = play.get("sortOrder")
+        if last_sort_order is not None and sort_order is not None and sort_order <= last_sort_order:
+            continue
+        rows.append(event_values(season_key, game_key, idx, play))
+    return rows
+
+
+def tail_live_games(conn, poll_interval: int = TAIL_POLL_INTERVAL, workers: int = TAIL_WORKERS):
+    """
+    Keep event_play current during game night.
+
+    Each poll fetches the play-by-play of every live game in parallel
+    (bypassing the payload cache), appends only plays newer than the last
+    stored sortOrder and commits once. A play is therefore queryable at
+    most one poll interval after the API publishes it. A game that went
+    final gets one last poll. A failed poll is logged and retried on the
+    next one. Stops when no game of the day is live or still to come.
+    """
+    last_sort = {}
+    states = {}
+
+    while True:
+        started = time.monotonic()
+
+        try:
+            games = get_todays_games(conn)
+            tail = [
+                (season_key, game_key, game_id, state)
+                for season_key, game_key, game_id, state in games
+                if state in LIVE_STATES
+                or (state in FINAL_STATES and states.get(game_key) in LIVE_STATES)
+            ]
+
+            unknown = [g for g in tail if g[1] not in last_sort]
+            if unknown:
+                stored = get_last_sort_orders(conn, [g[0] for g in unknown], [g[1] for g in unknown])
+                for _, game_key, _, _ in unknown:
+                    last_sort[game_key] = stored.get(game_key)
+        except Exception as e:
+            # A schedule or database hiccup: try again on the next poll
+            print(f"Tail: poll failed: {e}")
+            conn.rollback()
+            time.sleep(max(0.0, poll_interval - (time.monotonic() - started)))
+            continue
+
+        appended = 0
+        fetched = fetch_in_order(
+            tail,
+            lambda g: get_pbp(str(g[2]), use_cache=False),
+            workers=workers,
+        )
+        try:
+            for season_key in {g[0] for g in tail}:
+                ensure_event_partition(conn, season_key)
+            for (season_key, game_key, game_id, state), pbp in fetched:
+                rows = new_event_rows(season_key, game_key, pbp.get("plays", []), last_sort[game_key])
+                if not rows:
+                    continue
+                appended += merge_event_rows(conn, rows, replace_games=False)
+                sort_orders = [r[-1].get("sortOrder") for r in rows if r[-1].get("sortOrder") is not None]
+                if sort_orders:
+                    last_sort[game_key] = max(sort_orders)
+                print(f"Tail: game {game_id} ({state}) +{len(rows)} events")
+
+            with conn.cursor() as cur:
+                for _, game_key, _, state in games:
+                    if states.get(game_key) != state:
+                        cur.execute(
+                            "UPDATE nhl_dw.fact_game SET game_state = %s WHERE game_key = %s;",
+                            (state, game_key),
+                        )
+            conn.commit()
+        except Exception as e:
+            print(f"Tail: poll failed: {e}")
+            conn.rollback()
+            # The in-memory positions may be ahead of the table now
+            last_sort.clear()
+            _partitions_ready.clear()
+        else:
+            states = {game_key: state for _, game_key, _, state in games}
+
+        if appended:
+            print(f"Tail: appended {appended} events from {len(tail)} games")
+
+        if not any(s in LIVE_STATES or s in FUTURE_STATES for _, _, _, s in games):
+            print("Tail: no live or upcoming games left")
+            break
+
+        time.sleep(max(0.0, poll_interval - (time.monotonic() - started)))
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Load NHL play-by-play into nhl_dw.event_play")
+    parser.add_argument("--tail", action="store_true",
+                        help="tail the play-by-play of today's live games instead of loading the season")
+    parser.add_argument("--poll-interval", type=int, default=TAIL_POLL_INTERVAL,
+                        help="seconds between polls in --tail mode")
+    parser.add_argument("--reload-season", metavar="SEASON_ID",
+                        help="rebuild one season's partition from scratch, e.g. 20252026")
+    args = parser.parse_args()
+
     conn = get_conn()
     try:
-        load_season_events(conn)
+        if args.tail:
+            tail_live_games(conn, poll_interval=args.poll_interval)
+        elif args.reload_season:
+            reload_season_events(conn, args.reload_season)
+        else:
+            load_season_events(conn)
     finally:
-        conn.close()
-        print("Connection closed.")
+        put_conn(conn)
+        print(payload_cache.summary())
+        print(governor.summary())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+nhl_fact_elt.py
+
+ELT variant of the warehouse fact load.
+
+Extract + load: raw boxscore payloads are landed as-is in the JSONB
+staging table nhl_dw.stg_boxscore, in bulk and only for games whose
+payload changed. A game's payload hash is stored only once its facts
+are built, so a run whose transform failed stages and transforms the
+game again.
+
+Transform: set-based SQL (jsonb_to_recordset / jsonb_array_elements)
+builds
+
+  nhl_dw.fact_skater_game
+  nhl_dw.fact_goalie_game
+  nhl_dw.fact_team_game
+
+for any number of staged games in one statement per table. No per-player
+Python runs, and since the payloads stay in staging the facts can be
+rebuilt (e.g. after a transform fix) without touching the API:
+
+    python nhl_fact_elt.py                 # stage changed boxscores + transform them
+    python nhl_fact_elt.py --rebuild       # transform everything staged for the season
+"""
+
+import argparse
+from typing import Iterable
+
+from psycopg2.extras import Json
+
+from nhl_batch import BatchUpserter, flush_all
+from nhl_db import CommitPolicy, get_conn, put_conn
+from nhl_dimcache import dim_cache
+from nhl_fact_player_game import (
+    FETCH_WORKERS,
+    SEASON_ID,
+    UPSERT_BATCH_SIZE,
+    fetch_boxscore,
+    get_season_games,
+    payload_cache,
+)
+from nhl_load_state import PayloadHashes
+from nhl_parallel import fetch_in_order
+
+# Games per transform statement
+TRANSFORM_BATCH_GAMES = 2000
+
+
+# ---------------------------------------------------------------------------
+# STAGING
+# ---------------------------------------------------------------------------
+
+STG_BOXSCORE_UPSERT_SQL = """
+    INSERT INTO nhl_dw.stg_boxscore (game_id, payload)
+    VALUES %s
+    ON CONFLICT (game_id) DO UPDATE
+    SET payload   = EXCLUDED.payload,
+        loaded_at = now()
+    WHERE stg_boxscore.payload IS DISTINCT FROM EXCLUDED.payload
+    RETURNING (xmax = 0);
+"""
+
+
+def stage_boxscores(
+    conn,
+    game_ids: Iterable[int],
+    workers: int = FETCH_WORKERS,
+    batch_size: int = UPSERT_BATCH_SIZE,
+    policy: CommitPolicy | None = None,
+) -> tuple[list[int], PayloadHashes]:
+    """
+    Fetch boxscores concurrently and land the changed ones in
+    nhl_dw.stg_boxscore, committing as the policy (default:
+    CommitPolicy.from_config()) says. Returns the game_ids that were
+    (re)staged and their change detection; flush hashes.batch only after
+    the staged games are transformed.
+    """
+    game_ids = [int(g) for g in game_ids]
+    policy = policy or CommitPolicy.from_config()
+    staged = []
+    batch = BatchUpserter(conn, STG_BOXSCORE_UPSERT_SQL, key=lambda r: r[0], batch_size=batch_size)
+    hashes = PayloadHashes(conn, "boxscore", "stg_boxscore", game_ids, batch_size)
+
+    for game_id, boxscore in fetch_in_order(game_ids, fetch_boxscore, workers=workers):
+        if not hashes.changed(game_id, boxscore):
+            continue
+        batch.add((game_id, Json(boxscore)))
+        staged.append(game_id)
+        policy.add(games=1)
+        if batch.is_full or policy.due:
+            flush_all(conn, batch, policy=policy)
+
+    flush_all(conn, batch, policy=policy)
+    policy.commit(conn)
+    print(f"ELT: staged {len(staged)} boxscores, {hashes.skipped} unchanged.")
+    return staged, hashes
+
+
+# ---------------------------------------------------------------------------
+# TRANSFORMS
+# ---------------------------------------------------------------------------
+
+# One row per (staged game, side, player). The boxscore has listed
+# defensemen under both "defense" and "defensemen" over time.
+_PLAYERS_CTE = """
+    sides AS (
+        SELECT s.game_id, g.game_key, side.is_home,
+               CASE WHEN side.is_home THEN g.home_team_key ELSE g.away_team_key END AS team_key,
+               s.payload -> 'playerByGameStats' -> side.name AS block
+        FROM nhl_dw.stg_boxscore s
+        JOIN nhl_dw.fact_game g ON g.game_id = s.game_id
+        CROSS JOIN (VALUES ('homeTeam', true), ('awayTeam', false)) AS side(name, is_home)
+        WHERE s.game_id = ANY(%(game_ids)s)
+    )
+"""
+
+# "MM:SS" -> seconds
+TOI_SECONDS_SQL = """
+    CASE WHEN {col} ~ '^[0-9]+:[0-9]{{2}}$'
+         THEN split_part({col}, ':', 1)::int * 60 + split_part({col}, ':', 2)::int
+    END
+"""
+
+DIM_PLAYER_FROM_STAGE_SQL = f"""
+    WITH {_PLAYERS_CTE}
+    INSERT INTO nhl_dw.dim_player (player_id, full_name, primary_position, sweater_number)
+    SELECT DISTINCT ON (p."playerId")
+           p."playerId",
+           COALESCE(p.name ->> 'default', p."playerId"::text),
+           p."positionCode",
+           p."sweaterNumber"
+    FROM sides
+    CROSS JOIN LATERAL jsonb_to_recordset(
+        COALESCE(block -> 'forwards', '[]') || COALESCE(block -> 'defense', '[]')
+        || COALESCE(block -> 'defensemen', '[]') || COALESCE(block -> 'goalies', '[]')
+    ) AS p("playerId" int8, name jsonb, "positionCode" text, "sweaterNumber" int2)
+    ON CONFLICT (player_id) DO NOTHING
+    RETURNING 1;
+"""
+
+SKATER_FROM_STAGE_SQL = f"""
+    WITH {_PLAYERS_CTE}
+    INSERT INTO nhl_dw.fact_skater_game (
+        game_key, player_key, team_key, toi_seconds,
+        goals, assists, points, shots, hits, blocks,
+        plus_minus, penalty_minutes
+    )
+    SELECT DISTINCT ON (sides.game_key, dp.player_key)
+           sides.game_key, dp.player_key, sides.team_key,
+           {TOI_SECONDS_SQL.format(col='COALESCE(p.toi, p."timeOnIce")')},
+           p.goals, p.assists, p.points,
+           COALESCE(p.sog, p.shots), p.hits,
+           COALESCE(p."blockedShots", p.blocks),
+           p."plusMinus",
+           COALESCE(p.pim, p."penaltyMinutes")
+    FROM sides
+    CROSS JOIN LATERAL jsonb_to_recordset(
+        COALESCE(block -> 'forwards', '[]') || COALESCE(block -> 'defense', '[]')
+        || COALESCE(block -> 'defensemen', '[]')
+    ) AS p(
+        "playerId" int8, toi text, "timeOnIce" text,
+        goals int2, assists int2, points int2, sog int2, shots int2, hits int2,
+        "blockedShots" int2, blocks int2, "plusMinus" int2, pim int2, "penaltyMinutes" int2
+    )
+    JOIN nhl_dw.dim_player dp ON dp.player_id = p."playerId"
+    ON CONFLICT (game_key, player_key) DO UPDATE
+    SET team_key        = EXCLUDED.team_key,
+        toi_seconds     = EXCLUDED.toi_seconds,
+        goals           = EXCLUDED.goals,
+        assists         = EXCLUDED.assists,
+        points          = EXCLUDED.points,
+        shots           = EXCLUDED.shots,
+        hits            = EXCLUDED.hits,
+        blocks          = EXCLUDED.blocks,
+        plus_minus      = EXCLUDED.plus_minus,
+        penalty_minutes = EXCLUDED.penalty_minutes,
+        updated_at      = now()
+    WHERE (fact_skater_game.team_key, fact_skater_game.toi_seconds,
+           fact_skater_game.goals, fact_skater_game.assists,
+           fact_skater_game.points, fact_skater_game.shots,
+           fact_skater_game.hits, fact_skater_game.blocks,
+           fact_skater_game.plus_minus, fact_skater_game.penalty_minutes)
+          IS DISTINCT FROM
+          (EXCLUDED.team_key, EXCLUDED.toi_seconds, EXCLUDED.goals,
+           EXCLUDED.assists, EXCLUDED.points, EXCLUDED.shots, EXCLUDED.hits,
+           EXCLUDED.blocks, EXCLUDED.plus_minus, EXCLUDED.penalty_minutes)
+    RETURNING 1;
+"""
+
+# shutout: no goals against and the only goalie of the team with ice time
+GOALIE_FROM_STAGE_SQL = f"""
+    WITH {_PLAYERS_CTE},
+    goalies AS (
+        SELECT sides.game_key, sides.team_key, p.*,
+               {TOI_SECONDS_SQL.format(col='COALESCE(p.toi, p."timeOnIce")')} AS toi_seconds,
+               COALESCE(p.saves, NULLIF(split_part(p."saveShotsAgainst", '/', 1), '')::int2) AS n_saves,
+               COALESCE(p."shotsAgainst", NULLIF(split_part(p."saveShotsAgainst", '/', 2), '')::int2) AS n_shots
+        FROM sides
+        CROSS JOIN LATERAL jsonb_to_recordset(COALESCE(block -> 'goalies', '[]')) AS p(
+            "playerId" int8, toi text, "timeOnIce" text,
+            saves int2, "shotsAgainst" int2, "saveShotsAgainst" text,
+            "goalsAgainst" int2, "savePctg" numeric, "savePct" numeric
+        )
+    ),
+    played AS (
+        SELECT goalies.*,
+               count(*) FILTER (WHERE toi_seconds > 0)
+                   OVER (PARTITION BY game_key, team_key) AS n_played
+        FROM goalies
+    )
+    INSERT INTO nhl_dw.fact_goalie_game (
+        game_key, player_key, team_key, toi_seconds,
+        shots_against, saves, goals_against, save_pct, shutout
+    )
+    SELECT DISTINCT ON (played.game_key, dp.player_key)
+           played.game_key, dp.player_key, played.team_key, played.toi_seconds,
+           played.n_shots, played.n_saves, played."goalsAgainst",
+           round(COALESCE(played."savePctg", played."savePct",
+                          played.n_saves::numeric / NULLIF(played.n_shots, 0)), 3),
+           CASE WHEN played."goalsAgainst" IS NOT NULL AND played.toi_seconds IS NOT NULL
+                THEN played."goalsAgainst" = 0 AND played.toi_seconds > 0 AND played.n_played = 1
+           END
+    FROM played
+    JOIN nhl_dw.dim_player dp ON dp.player_id = played."playerId"
+    ON CONFLICT (game_key, player_key) DO UPDATE
+    SET team_key      = EXCLUDED.team_key,
+        toi_seconds   = EXCLUDED.toi_seconds,
+        shots_against = EXCLUDED.shots_against,
+        saves         = EXCLUDED.saves,
+        goals_against = EXCLUDED.goals_against,
+        save_pct      = EXCLUDED.save_pct,
+        shutout       = EXCLUDED.shutout,
+        updated_at    = now()
+    WHERE (fact_goalie_game.team_key, fact_goalie_game.toi_seconds,
+           fact_goalie_game.shots_against, fact_goalie_game.saves,
+           fact_goalie_game.goals_against, fact_goalie_game.save_pct,
+           fact_goalie_game.shutout)
+          IS DISTINCT FROM
+          (EXCLUDED.team_key, EXCLUDED.toi_seconds, EXCLUDED.shots_against,
+           EXCLUDED.saves, EXCLUDED.goals_against, EXCLUDED.save_pct,
+           EXCLUDED.shutout)
+    RETURNING 1;
+"""
+
+# Goals and shots come from the team block; the rest is summed over the
+# team's players. The boxscore doesn't carry power play opportunities.
+TEAM_FROM_STAGE_SQL = f"""
+    WITH {_PLAYERS_CTE},
+    players AS (
+        SELECT sides.game_key, sides.team_key, p.*
+        FROM sides
+        CROSS JOIN LATERAL jsonb_to_recordset(
+            COALESCE(block -> 'forwards', '[]') || COALESCE(block -> 'defense', '[]')
+            || COALESCE(block -> 'defensemen', '[]') || COALESCE(block -> 'goalies', '[]')
+        ) AS p(
+            hits int2, pim int2, "penaltyMinutes" int2, "powerPlayGoals" int2,
+            "faceoffWins" int2, "faceoffLosses" int2
+        )
+    ),
+    totals AS (
+        SELECT game_key, team_key,
+               sum(hits) AS hits,
+               sum(COALESCE(pim, "penaltyMinutes")) AS pim,
+               sum("powerPlayGoals") AS powerplay_goals,
+               sum("faceoffWins") AS fo_wins,
+               sum("faceoffLosses") AS fo_losses
+        FROM players
+        GROUP BY game_key, team_key
+    )
+    INSERT INTO nhl_dw.fact_team_game (
+        game_key, team_key, is_home, goals, shots, hits, pim,
+        powerplay_goals, powerplay_opps, faceoff_pct
+    )
+    SELECT sides.game_key, sides.team_key, sides.is_home,
+           (team ->> 'score')::int2,
+           (team ->> 'sog')::int2,
+           totals.hits, totals.pim, totals.powerplay_goals,
+           NULL,
+           round(100.0 * totals.fo_wins / NULLIF(totals.fo_wins + totals.fo_losses, 0), 2)
+    FROM sides
+    JOIN nhl_dw.stg_boxscore s ON s.game_id = sides.game_id
+    CROSS JOIN LATERAL (
+        SELECT s.payload -> CASE WHEN sides.is_home THEN 'homeTeam' ELSE 'awayTeam' END AS team
+    ) t
+    LEFT JOIN totals ON totals.game_key = sides.game_key AND totals.team_key = sides.team_key
+    ON CONFLICT (game_key, team_key) DO UPDATE
+    SET is_home         = EXCLUDED.is_home,
+        goals           = EXCLUDED.goals,
+        shots           = EXCLUDED.shots,
+        hits            = EXCLUDED.hits,
+        pim             = EXCLUDED.pim,
+        powerplay_goals = EXCLUDED.powerplay_goals,
+        powerplay_opps  = EXCLUDED.powerplay_opps,
+        faceoff_pct     = EXCLUDED.faceoff_pct,
+        updated_at      = now()
+    WHERE (fact_team_game.is_home, fact_team_game.goals,
+           fact_team_game.shots, fact_team_game.hits, fact_team_game.pim,
+           fact_team_game.powerplay_goals, fact_team_game.powerplay_opps,
+           fact_team_game.faceoff_pct)
+          IS DISTINCT FROM
+          (EXCLUDED.is_home, EXCLUDED.goals, EXCLUDED.shots, EXCLUDED.hits,
+           EXCLUDED.pim, EXCLUDED.powerplay_goals, EXCLUDED.powerplay_opps,
+           EXCLUDED.faceoff_pct)
+    RETURNING 1;
+"""
+
+
+def transform_games(
+    conn,
+    game_ids: Iterable[int],
+    batch_games: int = TRANSFORM_BATCH_GAMES,
+    policy: CommitPolicy | None = None,
+) -> None:
+    """
+    Build the fact tables for the given staged games, batch_games games
+    per statement, committing as the policy (default:
+    CommitPolicy.from_config()) says. Players missing from dim_player are
+    inserted from the staged payloads first.
+    """
+    game_ids = sorted({int(g) for g in game_ids})
+    policy = policy or CommitPolicy.from_config()
+    for start in range(0, len(game_ids), batch_games):
+        params = {"game_ids": game_ids[start:start + batch_games]}
+        counts = []
+        with conn.cursor() as cur:
+            for sql in (
+                DIM_PLAYER_FROM_STAGE_SQL,
+                SKATER_FROM_STAGE_SQL,
+                GOALIE_FROM_STAGE_SQL,
+                TEAM_FROM_STAGE_SQL,
+            ):
+                cur.execute(sql, params)
+                counts.append(cur.rowcount)
+        policy.add(rows=sum(counts), games=len(params["game_ids"]))
+        policy.maybe_commit(conn)
+
+        new_players, skaters, goalies, teams = counts
+        if new_players:
+            dim_cache.invalidate("player_key")
+        print(
+            f"ELT: {len(params['game_ids'])} games -> {skaters} skater, {goalies} goalie, "
+            f"{teams} team rows ({new_players} new players)"
+        )
+    policy.commit(conn)
+
+
+def staged_game_ids(conn, season_key: int) -> list[int]:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT s.game_id
+            FROM nhl_dw.stg_boxscore s
+            JOIN nhl_dw.fact_game g ON g.game_id = s.game_id
+            WHERE g.season_key = %s
+            ORDER BY s.game_id;
+        """, (season_key,))
+        return [r[0] for r in cur.fetchall()]
+
+
+# ---------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage raw boxscores and build the warehouse facts in SQL")
+    parser.add_argument("--season", default=SEASON_ID, help="season id, e.g. 20252026")
+    parser.add_argument("--workers", type=int, default=FETCH_WORKERS,
+                        help="concurrent boxscore fetches")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="skip the API and rebuild the facts of every staged game of the season")
+    args = parser.parse_args()
+
+    conn = get_conn()
+    try:
+        season_key = dim_cache.season_key(conn, args.season)
+        if season_key is None:
+            print(f"Season {args.season} not found in nhl_dw.dim_season")
+            return
+
+        if args.rebuild:
+            transform_games(conn, staged_game_ids(conn, season_key))
+        else:
+            games = get_season_games(conn, season_key)
+            game_ids, hashes = stage_boxscores(conn, [g for _, g in games], workers=args.workers)
+            transform_games(conn, game_ids)
+            flush_all(conn, hashes.batch)
+    finally:
+        put_conn(conn)
+        print(payload_cache.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+nhl_fact_player_game.py
+
+Populate the warehouse player facts from boxscores:
+
+  nhl_dw.fact_skater_game   one row per (game_key, player_key), skaters
+  nhl_dw.fact_goalie_game   one row per (game_key, player_key), goalies
+
+Each boxscore is read once; every player under playerByGameStats is
+routed to the skater or goalie fact by the group it is listed in.
+Surrogate keys come from the in-memory dimension cache. Players (and,
+for historic games, teams) missing from the dimensions are inserted in
+bulk before the facts that reference them.
+
+Boxscores are fetched concurrently and cached on disk; the fact rows are
+collected into batches and written with one multi-row upsert per table,
+so a season load is bound by the boxscore fetches. PlayerFactsSink plugs
+the same logic into the shared boxscore pass (nhl_boxscore.py).
+"""
+
+import argparse
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from nhl_http import NHLApiClient
+from psycopg2.extras import execute_values
+
+from nhl_batch import DEFAULT_BATCH_SIZE, BatchUpserter, flush_all
+from nhl_boxscore import BoxscoreSink, process_boxscores
+from nhl_cache import PayloadCache
+from nhl_db import get_conn, put_conn
+from nhl_dimcache import dim_cache
+from nhl_game_state import STARTED_STATES
+from nhl_governor import GovernedClient, governor
+
+# ---------------------------------------------------------------------------
+# CONFIG
+# ---------------------------------------------------------------------------
+
+SEASON_ID = "20252026"
+
+FETCH_WORKERS = 8
+UPSERT_BATCH_SIZE = DEFAULT_BATCH_SIZE
+
+
+# ---------------------------------------------------------------------------
+# NHL CLIENT
+# ---------------------------------------------------------------------------
+
+client = GovernedClient(NHLApiClient(pool_size=FETCH_WORKERS, timeout=30))
+payload_cache = PayloadCache()
+
+
+def fetch_boxscore(game_id: int) -> Dict[str, Any]:
+    return payload_cache.fetch(
+        "boxscore",
+        {"game_id": int(game_id)},
+        lambda: client.game_center.boxscore(game_id=str(game_id)),
+    )
+
+
+# ---------------------------------------------------------------------------
+# FIELD HELPERS
+# ---------------------------------------------------------------------------
+
+def _first(d: Dict[str, Any], *keys: str) -> Any:
+    """
+    First non-None value among keys. The boxscore feed has renamed a few
+    fields over time (toi / timeOnIce, sog / shots, ...).
+    """
+    for k in keys:
+        v = d.get(k)
+        if v is not None:
+            return v
+    return None
+
+
+def _name(value: Any) -> str | None:
+    """
+    Localized names come as {"default": "..."}.
+    """
+    if isinstance(value, dict):
+        return value.get("default")
+    return value
+
+
+def toi_seconds(toi: Any) -> int | None:
+    """
+    "MM:SS" (minutes may exceed 59) -> seconds.
+    """
+    if toi is None:
+        return None
+    if isinstance(toi, (int, float)):
+        return int(toi)
+    try:
+        minutes, seconds = str(toi).split(":")
+        return int(minutes) * 60 + int(seconds)
+    except ValueError:
+        return None
+
+
+def _saves_shots(goalie: Dict[str, Any]) -> Tuple[int | None, int | None]:
+    """
+    (saves, shots_against); newer feeds only carry "saves/shots" in
+    saveShotsAgainst.
+    """
+    saves = goalie.get("saves")
+    shots_against = goalie.get("shotsAgainst")
+    combined = goalie.get("saveShotsAgainst")
+    if (saves is None or shots_against is None) and isinstance(combined, str) and "/" in combined:
+        s, sa = combined.split("/", 1)
+        try:
+            saves = int(s) if saves is None else saves
+            shots_against = int(sa) if shots_against is None else shots_against
+        except ValueError:
+            pass
+    return saves, shots_against
+
+
+# ---------------------------------------------------------------------------
+# BOXSCORE -> FACT ROWS
+# ---------------------------------------------------------------------------
+
+SKATER_GROUPS = ("forwards", "defensemen", "defense")
+GOALIE_GROUPS = ("goalies",)
+
+
+def iter_team_players(team_block: Dict[str, Any]) -> Iterator[Tuple[bool, Dict[str, Any]]]:
+    """
+    Yield (is_goalie, player) for everyone in one team's playerByGameStats.
+    """
+    for group in SKATER_GROUPS:
+        for p in team_block.get(group) or []:
+            yield False, p
+    for group in GOALIE_GROUPS:
+        for p in team_block.get(group) or []:
+            yield True, p
+
+
+def skater_row(game_key: int, player_key: int, team_key: int, p: Dict[str, Any]) -> tuple:
+    return (
+        game_key,
+        player_key,
+        team_key,
+        toi_seconds(_first(p, "toi", "timeOnIce")),
+        p.get("goals"),
+        p.get("assists"),
+        p.get("points"),
+        _first(p, "sog", "shots"),
+        p.get("hits"),
+        _first(p, "blockedShots", "blocks"),
+        p.get("plusMinus"),
+        _first(p, "pim", "penaltyMinutes"),
+    )
+
+
+def goalie_row(
+    game_key: int,
+    player_key: int,
+    team_key: int,
+    p: Dict[str, Any],
+    only_goalie: bool,
+) -> tuple:
+    """
+    shutout: no goals against while being the only goalie of the team who
+    played, i.e. the whole game.
+    """
+    toi = toi_seconds(_first(p, "toi", "timeOnIce"))
+    saves, shots_against = _saves_shots(p)
+    goals_against = p.get("goalsAgainst")
+    save_pct = _first(p, "savePctg", "savePct", "savePercentage")
+    if save_pct is None and saves is not None and shots_against:
+        save_pct = saves / shots_against
+    if save_pct is not None:
+        save_pct = round(float(save_pct), 3)
+
+    shutout = None
+    if goals_against is not None and toi is not None:
+        shutout = goals_against == 0 and toi > 0 and only_goalie
+
+    return (
+        game_key,
+        player_key,
+        team_key,
+        toi,
+        shots_against,
+        saves,
+        goals_against,
+        save_pct,
+        shutout,
+    )
+
+
+# ---------------------------------------------------------------------------
+# DIMENSIONS
+# ---------------------------------------------------------------------------
+
+def ensure_teams(conn, teams: Iterable[Dict[str, Any]]) -> None:
+    """
+    Insert boxscore teams (homeTeam / awayTeam blocks) that aren't in
+    nhl_dw.dim_team yet, e.g. relocated franchises in historic seasons.
+    """
+    by_id = {int(t["id"]): t for t in teams if t and t.get("id") is not None}
+    missing = dim_cache.missing(conn, "team_key", by_id)
+    if not missing:
+        return
+
+    rows = []
+    for team_id in missing:
+        t = by_id[team_id]
+        place = _name(t.get("placeName"))
+        common = _name(t.get("commonName"))
+        name = _name(t.get("name")) or " ".join(x for x in (place, common) if x) or t.get("abbrev")
+        rows.append((team_id, name, t.get("abbrev"), common, place))
+
+    with conn.cursor() as cur:
+        result = execute_values(
+            cur,
+            """
+            INSERT INTO nhl_dw.dim_team (team_id, team_name, team_abbrev, team_short, city)
+            VALUES %s
+            ON CONFLICT (team_id) DO UPDATE SET team_id = EXCLUDED.team_id
+            RETURNING team_id, team_key;
+            """,
+            rows,
+            fetch=True,
+        )
+    for team_id, team_key in result:
+        dim_cache.put("team_key", team_id, team_key)
+    print(f"Facts: inserted {len(result)} teams into dim_team.")
+
+
+def ensure_players(conn, players: Iterable[Dict[str, Any]]) -> None:
+    """
+    Insert boxscore players that aren't in nhl_dw.dim_player yet with the
+    fields the boxscore carries; nhl_populate_dim_player.py fills in the
+    rest later.
+    """
+    by_id = {int(p["playerId"]): p for p in players}
+    missing = dim_cache.missing(conn, "player_key", by_id)
+    if not missing:
+        return
+
+    rows = []
+    for player_id in missing:
+        p = by_id[player_id]
+        first = _name(p.get("firstName"))
+        last = _name(p.get("lastName"))
+        full = _name(p.get("name")) or " ".join(x for x in (first, last) if x) or str(player_id)
+        rows.append((player_id, full, first, last, p.get("positionCode"), p.get("sweaterNumber")))
+
+    with conn.cursor() as cur:
+        result = execute_values(
+            cur,
+            """
+            INSERT INTO nhl_dw.dim_player (
+                player_id, full_name, first_name, last_name,
+                primary_position, sweater_number
+            )
+            VALUES %s
+            ON CONFLICT (player_id) DO UPDATE SET player_id = EXCLUDED.player_id
+            RETURNING player_id, player_key;
+            """,
+            rows,
+            fetch=True,
+        )
+    for player_id, player_key in result:
+        dim_cache.put("player_key", player_id, player_key)
+    print(f"Facts: inserted {len(result)} players into dim_player.")
+
+
+# ---------------------------------------------------------------------------
+# FACT WRITES
+# ---------------------------------------------------------------------------
+
+SKATER_UPSERT_SQL = """
+    INSERT INTO nhl_dw.fact_skater_game (
+        game_key, player_key, team_key, toi_seconds,
+        goals, assists, points, shots, hits, blocks,
+        plus_minus, penalty_minutes
+    )
+    VALUES %s
+    ON CONFLICT (game_key, player_key) DO UPDATE
+    SET team_key        = EXCLUDED.team_key,
+        toi_seconds     = EXCLUDED.toi_seconds,
+        goals           = EXCLUDED.goals,
+        assists         = EXCLUDED.assists,
+        points          = EXCLUDED.points,
+        shots           = EXCLUDED.shots,
+        hits            = EXCLUDED.hits,
+        blocks          = EXCLUDED.blocks,
+        plus_minus      = EXCLUDED.plus_minus,
+        penalty_minutes = EXCLUDED.penalty_minutes,
+        updated_at      = now()
+    WHERE (fact_skater_game.team_key, fact_skater_game.toi_seconds,
+           fact_skater_game.goals, fact_skater_game.assists,
+           fact_skater_game.points, fact_skater_game.shots,
+           fact_skater_game.hits, fact_skater_game.blocks,
+           fact_skater_game.plus_minus, fact_skater_game.penalty_minutes)
+          IS DISTINCT FROM
+          (EXCLUDED.team_key, EXCLUDED.toi_seconds, EXCLUDED.goals,
+           EXCLUDED.assists, EXCLUDED.points, EXCLUDED.shots, EXCLUDED.hits,
+           EXCLUDED.blocks, EXCLUDED.plus_minus, EXCLUDED.penalty_minutes)
+    RETURNING (xmax = 0);
+"""
+
+GOALIE_UPSERT_SQL = """
+    INSERT INTO nhl_dw.fact_goalie_game (
+        game_key, player_key, team_key, toi_seconds,
+        shots_against, saves, goals_against, save_pct, shutout
+    )
+    VALUES %s
+    ON CONFLICT (game_key, player_key) DO UPDATE
+    SET team_key      = EXCLUDED.team_key,
+        toi_seconds   = EXCLUDED.toi_seconds,
+        shots_against = EXCLUDED.shots_against,
+        saves         = EXCLUDED.saves,
+        goals_against = EXCLUDED.goals_against,
+        save_pct      = EXCLUDED.save_pct,
+        shutout       = EXCLUDED.shutout,
+        updated_at    = now()
+    WHERE (fact_goalie_game.team_key, fact_goalie_game.toi_seconds,
+           fact_goalie_game.shots_against, fact_goalie_game.saves,
+           fact_goalie_game.goals_against, fact_goalie_game.save_pct,
+           fact_goalie_game.shutout)
+          IS DISTINCT FROM
+          (EXCLUDED.team_key, EXCLUDED.toi_seconds, EXCLUDED.shots_against,
+           EXCLUDED.saves, EXCLUDED.goals_against, EXCLUDED.save_pct,
+           EXCLUDED.shutout)
+    RETURNING (xmax = 0);
+"""
+
+
+def new_fact_batches(conn, batch_size: int = UPSERT_BATCH_SIZE):
+    """
+    (skaters, goalies) batches keyed on (game_key, player_key).
+    """
+    skaters = BatchUpserter(conn, SKATER_UPSERT_SQL, key=lambda r: (r[0], r[1]), batch_size=batch_size)
+    goalies = BatchUpserter(conn, GOALIE_UPSERT_SQL, key=lambda r: (r[0], r[1]), batch_size=batch_size)
+    return skaters, goalies
+
+
+def add_facts_for_game(
+    conn,
+    skaters: BatchUpserter,
+    goalies: BatchUpserter,
+    game_key: int,
+    boxscore: Dict[str, Any],
+) -> None:
+    """
+    Route one boxscore's players into the skater and goalie batches.
+    Missing dimension rows are inserted first (not committed here; they
+    go in with the next flush).
+    """
+    pbs = boxscore.get("playerByGameStats") or {}
+    sides = [
+        (boxscore.get("homeTeam") or {}, pbs.get("homeTeam") or {}),
+        (boxscore.get("awayTeam") or {}, pbs.get("awayTeam") or {}),
+    ]
+
+    ensure_teams(conn, [team for team, _ in sides])
+    ensure_players(conn, [p for _, block in sides for _, p in iter_team_players(block)])
+
+    for team, block in sides:
+        team_key = dim_cache.team_key(conn, team["id"])
+        played = [
+            p for is_goalie, p in iter_team_players(block)
+            if is_goalie and (toi_seconds(_first(p, "toi", "timeOnIce")) or 0) > 0
+        ]
+
+        for is_goalie, p in iter_team_players(block):
+            player_key = dim_cache.player_key(conn, p["playerId"])
+            if is_goalie:
+                goalies.add(goalie_row(game_key, player_key, team_key, p, only_goalie=len(played) == 1))
+            else:
+                skaters.add(skater_row(game_key, player_key, team_key, p))
+
+
+def flush_fact_batches(conn, skaters: BatchUpserter, goalies: BatchUpserter, *extra: BatchUpserter):
+    n_skaters, n_goalies, *_ = flush_all(conn, skaters, goalies, *extra)
+    print(f"Facts: wrote {n_skaters} fact_skater_game and {n_goalies} fact_goalie_game rows.")
+
+
+# ---------------------------------------------------------------------------
+# SEASON LOAD
+# ---------------------------------------------------------------------------
+
+def get_season_games(conn, season_key: int):
+    """
+    (game_key, game_id) of the season's games that have started.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT game_key, game_id
+            FROM nhl_dw.fact_game
+            WHERE season_key = %s
+              AND (game_state = ANY(%s)
+                   OR (game_state IS NULL AND start_time_utc <= now()))
+            ORDER BY start_time_utc NULLS LAST, game_id;
+        """, (season_key, sorted(STARTED_STATES)))
+        return cur.fetchall()
+
+
+class PlayerFactsSink(BoxscoreSink):
+    """
+    Boxscore pass sink for fact_skater_game / fact_goalie_game. game_keys
+    maps game_id -> nhl_dw game_key; games without one are not accepted,
+    so their boxscore isn't marked as loaded.
+    """
+
+    stage = "player_facts"
+
+    def __init__(self, conn, game_keys: Dict[int, int], batch_size: int = UPSERT_BATCH_SIZE):
+        super().__init__(list(new_fact_batches(conn, batch_size)))
+        self.conn = conn
+        self.game_keys = game_keys
+
+    def accepts(self, game):
+        # Not in the warehouse yet: no hash, so the game is loaded once it is
+        return int(game[0]) in self.game_keys
+
+    def add(self, game, boxscore):
+        skaters, goalies = self.batches
+        add_facts_for_game(self.conn, skaters, goalies, self.game_keys[int(game[0])], boxscore)
+
+    def report(self, counts):
+        print(f"Facts: wrote {counts[0]} fact_skater_game and {counts[1]} fact_goalie_game rows.")
+
+    def rollback(self):
+        super().rollback()
+        # Keys put into the cache by the rolled back inserts are gone
+        dim_cache.invalidate("team_key", "player_key")
+
+
+def fact_game_keys(conn, game_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    game_id -> game_key for the games already in nhl_dw.fact_game.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT game_id, game_key FROM nhl_dw.fact_game WHERE game_id = ANY(%s)",
+            ([int(g) for g in game_ids],),
+        )
+        return dict(cur.fetchall())
+
+
+def load_facts_for_games(
+    conn,
+    games: Iterable[tuple],
+    workers: int = FETCH_WORKERS,
+    batch_size: int = UPSERT_BATCH_SIZE,
+) -> list[int]:
+    """
+    Load player facts for (game_key, game_id) pairs. Games whose boxscore
+    is unchanged since the last load are skipped. Returns the game_ids
+    whose boxscore could not be fetched.
+    """
+    game_keys = {int(game_id): game_key for game_key, game_id in games}
+    return process_boxscores(
+        conn,
+        [(game_id,) for game_id in game_keys],
+        [PlayerFactsSink(conn, game_keys, batch_size)],
+        fetch_boxscore,
+        workers=workers,
+        batch_size=batch_size,
+    )
+
+
+def load_season_facts(conn, season_id: str = SEASON_ID, workers: int = FETCH_WORKERS):
+    season_key = dim_cache.season_key(conn, season_id)
+    if season_key is None:
+        print(f"Season {season_id} not found in nhl_dw.dim_season")
+        return
+
+    games = get_season_games(conn, season_key)
+    print(f"Found {len(games)} started games for season {season_id}")
+    load_facts_for_games(conn, games, workers=workers)
+
+
+# ---------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Load fact_skater_game and fact_goalie_game from boxscores")
+    parser.add_argument("--season", default=SEASON_ID, help="season id, e.g. 20252026")
+    parser.add_argument("--workers", type=int, default=FETCH_WORKERS,
+                        help="concurrent boxscore fetches")
+    args = parser.parse_args()
+
+    conn = get_conn()
+    try:
+        load_season_facts(conn, args.season, workers=args.workers)
+    finally:
+        put_conn(conn)
+        print(payload_cache.summary())
+        print(governor.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+nhl_game_state.py
+
+Game state codes used by the NHL API (`gameState` in schedule, boxscore
+and play-by-play payloads) and small helpers to classify them.
+
+  FUT   - scheduled, not started
+  PRE   - pre-game (warmups)
+  LIVE  - in progress
+  CRIT  - in progress, final minutes
+  FINAL - finished, stats may still be corrected shortly after
+  OFF   - finished and official
+"""
+
+FUTURE_STATES = frozenset({"FUT", "PRE"})
+LIVE_STATES = frozenset({"LIVE", "CRIT"})
+FINAL_STATES = frozenset({"FINAL", "OFF"})
+# Finished games whose stats won't change any more
+OFFICIAL_STATES = frozenset({"OFF"})
+
+# Games that have at least started and therefore have boxscore / pbp data
+STARTED_STATES = LIVE_STATES | FINAL_STATES
+
+
+def is_final(state: str | None) -> bool:
+    return state in FINAL_STATES
+
+
+def is_official(state: str | None) -> bool:
+    return state in OFFICIAL_STATES
+
+
+def is_live(state: str | None) -> bool:
+    return state in LIVE_STATES
+
+
+def has_started(state: str | None) -> bool:
+    return state in STARTED_STATES
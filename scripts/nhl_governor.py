@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+nhl_governor.py
+
+Shared request governor for NHL API calls.
+
+Every call made through a GovernedClient goes through one process-wide
+RequestGovernor, which combines
+
+  - a token bucket: at most RATE requests / second on average, bursts of
+    up to BURST
+  - AIMD concurrency: the number of requests allowed in flight grows by
+    one for every `limit` healthy responses and is halved on throttling
+    (HTTP 429) or server trouble, never below 1 or above MAX_CONCURRENCY
+  - retries with jittered exponential backoff for throttling, 5xx,
+    timeouts and connection errors; Retry-After is honoured when the
+    error carries it. Other errors (e.g. 404) are raised immediately.
+
+When the retries run out, RetriesExhausted is raised with the last error
+as its cause; loaders catch it to skip the game and carry on.
+
+    client = GovernedClient(NHLApiClient(pool_size=FETCH_WORKERS, timeout=30))
+    client.game_center.boxscore(game_id="2025020001")
+    client.game_center.play_by_play(game_id="2025020001")
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Callable
+
+# ---------------------------------------------------------------------------
+# CONFIG
+# ---------------------------------------------------------------------------
+
+RATE = float(os.environ.get("NHL_API_RATE", "10"))                # requests / second
+BURST = int(os.environ.get("NHL_API_BURST", "20"))
+INITIAL_CONCURRENCY = int(os.environ.get("NHL_API_CONCURRENCY", "4"))
+MAX_CONCURRENCY = int(os.environ.get("NHL_API_MAX_CONCURRENCY", "16"))
+MAX_RETRIES = int(os.environ.get("NHL_API_MAX_RETRIES", "5"))
+BACKOFF_BASE = 0.5     # seconds, doubled per attempt
+BACKOFF_CAP = 30.0     # seconds
+
+
+class RetriesExhausted(Exception):
+    """
+    A call kept failing with retryable errors MAX_RETRIES times.
+    """
+
+
+# ---------------------------------------------------------------------------
+# ERROR CLASSIFICATION
+# ---------------------------------------------------------------------------
+
+THROTTLE = "throttle"
+RETRY = "retry"
+
+
+def _status_code(exc: BaseException) -> int | None:
+    for obj in (exc, getattr(exc, "response", None)):
+        code = getattr(obj, "status_code", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def classify(exc: BaseException) -> str | None:
+    """
+    THROTTLE for 429, RETRY for 5xx / timeouts / connection errors,
+    None for errors a retry won't fix. nhlpy, httpx and requests all name
+    their exception classes descriptively, so the class name is used
+    instead of importing each library's exception types.
+    """
+    code = _status_code(exc)
+    name = type(exc).__name__.lower()
+
+    if code == 429 or "ratelimit" in name or "toomanyrequests" in name:
+        return THROTTLE
+    if code is not None:
+        return RETRY if code >= 500 else None
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return RETRY
+    if any(s in name for s in ("timeout", "connect", "servererror", "remotedisconnected", "protocolerror")):
+        return RETRY
+    return None
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------------------------------------------------------------------
+# GOVERNOR
+# ---------------------------------------------------------------------------
+
+class TokenBucket:
+    def __init__(self, rate: float = RATE, burst: int = BURST):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Block until a token is available and take it.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RequestGovernor:
+    def __init__(
+        self,
+        rate: float = RATE,
+        burst: int = BURST,
+        initial_concurrency: int = INITIAL_CONCURRENCY,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_retries = max_retries
+        self.limit = float(min(max(initial_concurrency, 1), self.max_concurrency))
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+
+    # -- concurrency ------------------------------------------------------
+
+    def _enter(self) -> None:
+        with self._cond:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self._in_flight >= int(self.limit):
+                    self._cond.wait()
+                else:
+                    break
+            self._in_flight += 1
+
+    def _leave(self, outcome: str | None) -> None:
+        """
+        outcome: None for a healthy response, THROTTLE / RETRY for API
+        trouble, anything else for errors that say nothing about load.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if outcome is None:
+                # additive increase: +1 per `limit` healthy responses
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif outcome in (THROTTLE, RETRY):
+                # multiplicative decrease
+                self.limit = max(1.0, self.limit / 2)
+            self._cond.notify_all()
+
+    def _pause(self, seconds: float) -> None:
+        """
+        Hold back every caller, e.g. for a Retry-After.
+        """
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    # -- calls ------------------------------------------------------------
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Full jitter: uniform in [0, min(cap, base * 2^attempt)].
+        """
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self._enter()
+            outcome = None
+            try:
+                with self._cond:
+                    self.calls += 1
+                return fn(*args, **kwargs)
+            except Exception as e:
+                outcome = classify(e) or "error"
+                if outcome == "error":
+                    raise
+                last = e
+            finally:
+                self._leave(outcome)
+
+            delay = self.backoff(attempt)
+            if outcome == THROTTLE:
+                with self._cond:
+                    self.throttled += 1
+                delay = max(delay, _retry_after(last) or 0)
+                self._pause(delay)
+            if attempt < self.max_retries:
+                with self._cond:
+                    self.retries += 1
+                print(f"NHL API: {type(last).__name__} ({last}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+        with self._cond:
+            self.failures += 1
+        raise RetriesExhausted(f"{getattr(fn, '__qualname__', fn)} failed {self.max_retries + 1} times") from last
+
+    def summary(self) -> str:
+        return (
+            f"NHL API: {self.calls} calls, {self.retries} retries, {self.throttled} throttled, "
+            f"{self.failures} gave up, concurrency limit {self.limit:.1f}"
+        )
+
+
+governor = RequestGovernor()
+
+
+# ---------------------------------------------------------------------------
+# CLIENT PROXY
+# ---------------------------------------------------------------------------
+
+class GovernedClient:
+    """
+    Wraps an NHLApiClient or NHLClient (or any of its sub-objects) so that
+    every method call goes through the governor. Attribute access returns
+    wrapped sub-objects, so client.schedule.weekly_schedule(...) and
+    client.game_center.boxscore(...) are both governed.
+    """
+
+    def __init__(self, target: Any, gov: RequestGovernor | None = None):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_governor", gov or governor)
+
+    def __getattr__(self, name: str) -> Any:
+        value = getattr(self._target, name)
+        if isinstance(value, (str, bytes, int, float, bool, type(None))):
+            return value
+        if callable(value):
+            def governed(*args, **kwargs):
+                return self._governor.call(value, *args, **kwargs)
+            governed.__name__ = getattr(value, "__name__", name)
+            governed.__qualname__ = getattr(value, "__qualname__", name)
+            return governed
+        return GovernedClient(value, self._governor)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._target, name, value)
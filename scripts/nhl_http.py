@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+nhl_http.py
+
+Thin NHL API client for the loaders, a drop-in for the parts of
+nhlpy.NHLClient the scripts use:
+
+  client.schedule.daily_schedule(date=)
+  client.schedule.weekly_schedule(date=)
+  client.game_center.boxscore(game_id=)
+  client.game_center.play_by_play(game_id=)
+  client.teams.teams()
+  client.teams.team_roster(team_abbr=, season=)
+  client.stats.skater_stats_summary(start_season=, end_season=)
+  client.stats.goalie_stats_summary(start_season=, end_season=)
+
+Differences to NHLClient that matter for bulk loads:
+
+  - one httpx.Client per NHLApiClient with a keep-alive pool sized to
+    the number of fetch workers, so concurrent fetches reuse TCP / TLS
+    connections instead of reconnecting
+  - responses are decoded with orjson when it is installed (falls back
+    to the standard json module)
+  - no debug printing per request; enable the "nhl_http" logger at
+    DEBUG level to trace requests
+  - the stats summaries return every row (limit -1) instead of the
+    first page
+
+    from nhl_http import NHLApiClient
+    client = NHLApiClient(pool_size=FETCH_WORKERS)
+"""
+
+import json
+import logging
+from datetime import date as _date
+from typing import Any, Dict, List
+
+import httpx
+
+try:
+    import orjson
+except ImportError:  # optional, only faster
+    orjson = None
+
+WEB_API = "https://api-web.nhle.com/v1"
+STATS_API = "https://api.nhle.com/stats/rest/en"
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 30
+
+log = logging.getLogger("nhl_http")
+
+
+def _loads(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+class NHLApiClient:
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT):
+        self._http = httpx.Client(
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+            ),
+            headers={"Accept": "application/json", "Accept-Encoding": "gzip"},
+        )
+        self.schedule = _Schedule(self)
+        self.game_center = _GameCenter(self)
+        self.teams = _Teams(self)
+        self.stats = _Stats(self)
+
+    def get_json(self, url: str, params: Dict[str, Any] | None = None) -> Any:
+        """
+        GET url and decode the JSON body. HTTP errors raise
+        httpx.HTTPStatusError (its .response carries status and headers).
+        """
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("GET %s %s", url, params or "")
+        response = self._http.get(url, params=params)
+        response.raise_for_status()
+        return _loads(response.content)
+
+    def web(self, resource: str) -> Any:
+        return self.get_json(f"{WEB_API}/{resource}")
+
+    def close(self) -> None:
+        self._http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Schedule:
+    def __init__(self, api: NHLApiClient):
+        self._api = api
+
+    def weekly_schedule(self, date: str | None = None) -> Dict[str, Any]:
+        """
+        Raw /schedule/{date} payload: gameWeek (7 days), nextStartDate, ...
+        """
+        return self._api.web(f"schedule/{date or 'now'}")
+
+    def daily_schedule(self, date: str | None = None) -> Dict[str, Any]:
+        """
+        Games of one day, shaped like NHLClient.schedule.daily_schedule:
+        {"date", "games", "numberOfGames", "nextStartDate", "previousStartDate"}.
+        """
+        date = date or _date.today().isoformat()
+        payload = self.weekly_schedule(date)
+        games: List[Dict[str, Any]] = []
+        for day in payload.get("gameWeek", []):
+            if day.get("date") == date:
+                games = day.get("games", [])
+                break
+        return {
+            "date": date,
+            "games": games,
+            "numberOfGames": len(games),
+            "nextStartDate": payload.get("nextStartDate"),
+            "previousStartDate": payload.get("previousStartDate"),
+        }
+
+
+class _GameCenter:
+    def __init__(self, api: NHLApiClient):
+        self._api = api
+
+    def boxscore(self, game_id: str) -> Dict[str, Any]:
+        return self._api.web(f"gamecenter/{game_id}/boxscore")
+
+    def play_by_play(self, game_id: str) -> Dict[str, Any]:
+        return self._api.web(f"gamecenter/{game_id}/play-by-play")
+
+
+class _Teams:
+    def __init__(self, api: NHLApiClient):
+        self._api = api
+
+    def teams(self, date: str | None = None) -> List[Dict[str, Any]]:
+        """
+        Current teams from the standings, with the keys NHLClient uses:
+        name, common_name, abbr, logo, conference {name, abbr},
+        division {name, abbr}.
+        """
+        standings = self._api.web(f"standings/{date or 'now'}").get("standings", [])
+        return [
+            {
+                "name": (s.get("teamName") or {}).get("default"),
+                "common_name": (s.get("teamCommonName") or {}).get("default"),
+                "abbr": (s.get("teamAbbrev") or {}).get("default"),
+                "logo": s.get("teamLogo"),
+                "conference": {"name": s.get("conferenceName"), "abbr": s.get("conferenceAbbrev")},
+                "division": {"name": s.get("divisionName"), "abbr": s.get("divisionAbbrev")},
+            }
+            for s in standings
+        ]
+
+    def team_roster(self, team_abbr: str, season: str) -> Dict[str, Any]:
+        return self._api.web(f"roster/{team_abbr}/{season}")
+
+
+class _Stats:
+    def __init__(self, api: NHLApiClient):
+        self._api = api
+
+    def _summary(
+        self,
+        kind: str,
+        start_season: str,
+        end_season: str,
+        game_type_id: int,
+        start: int,
+        limit: int,
+        sort: str,
+    ) -> List[Dict[str, Any]]:
+        params = {
+            "isAggregate": "false",
+            "isGame": "false",
+            "sort": json.dumps([{"property": sort, "direction": "DESC"}]),
+            "start": start,
+            "limit": limit,
+            "factCayenneExp": "gamesPlayed>=1",
+            "cayenneExp": (
+                f"gameTypeId={game_type_id} and seasonId<={end_season} "
+                f"and seasonId>={start_season}"
+            ),
+        }
+        return self._api.get_json(f"{STATS_API}/{kind}/summary", params).get("data", [])
+
+    def skater_stats_summary(
+        self,
+        start_season: str,
+        end_season: str,
+        game_type_id: int = 2,
+        start: int = 0,
+        limit: int = -1,
+    ) -> List[Dict[str, Any]]:
+        return self._summary("skater", start_season, end_season, game_type_id, start, limit, "points")
+
+    def goalie_stats_summary(
+        self,
+        start_season: str,
+        end_season: str,
+        game_type_id: int = 2,
+        start: int = 0,
+        limit: int = -1,
+    ) -> List[Dict[str, Any]]:
+        return self._summary("goalie", start_season, end_season, game_type_id, start, limit, "wins")
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+nhl_jobs.py
+
+Database-backed work queue for per-game loads, so any number of worker
+processes on any number of machines can split a season between them
+with no coordination beyond Postgres.
+
+nhl_dw.etl_job holds one row per (game_id, stage):
+
+  pending  waiting to be claimed (not before run_after)
+  running  claimed by `worker` until lease_until
+  done     loaded
+  dead     failed max_attempts times; left for a human (--retry-dead)
+
+A worker claims a chunk of ready jobs of one stage and season with
+SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers never claim the
+same job and never wait on each other. The claim is committed right
+away and only leases the jobs: a worker that dies leaves them running
+until the lease expires, then another worker picks them up. A failed
+job goes back to pending with an exponential backoff, or to dead after
+max_attempts tries.
+
+Stages (both need the season's schedule in nhl_dw.fact_game, e.g. from
+nhl_backfill_seasons.py or the incremental loader):
+
+  events  nhl_dw.event_play from play-by-play (nhl_events)
+  facts   fact_skater_game + fact_goalie_game from boxscores
+          (nhl_fact_player_game)
+
+A job is marked done right after its data is committed. A worker that
+crashes in between only means the game is loaded again, which the
+stages' upserts and payload hashes make a no-op.
+
+    python nhl_jobs.py --enqueue 20232024 --enqueue 20242025
+    python nhl_jobs.py --processes 4            # on as many machines as you like
+    python nhl_jobs.py --status
+
+Every process runs its own API governor, so with several workers lower
+NHL_API_RATE (see nhl_governor) to keep the combined request rate sane.
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import time
+from typing import Dict, Iterable, List, NamedTuple, Sequence
+
+from nhl_db import CommitPolicy, get_conn, put_conn
+from nhl_dimcache import dim_cache
+from nhl_game_state import STARTED_STATES
+from nhl_load_state import PayloadHashes
+
+# ---------------------------------------------------------------------------
+# CONFIG
+# ---------------------------------------------------------------------------
+
+STAGES = ("events", "facts")
+
+DEFAULT_PROCESSES = 4
+CLAIM_SIZE = 25              # jobs per claim, all of one stage and season
+LEASE_SECONDS = 900          # must cover loading one claim
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_BASE = 30      # seconds, doubled per failed attempt
+RETRY_BACKOFF_CAP = 3600     # seconds
+IDLE_POLL_SECONDS = 10       # wait when nothing is ready but work remains
+
+# API fetches per worker process
+FETCH_WORKERS = 4
+
+
+class Job(NamedTuple):
+    job_id: int
+    game_id: int
+    stage: str
+    season_id: str
+    attempts: int
+
+
+# ---------------------------------------------------------------------------
+# QUEUE
+# ---------------------------------------------------------------------------
+
+_STARTED_GAME = """
+    (g.game_state = ANY(%(started)s)
+     OR (g.game_state IS NULL AND g.start_time_utc <= now()))
+"""
+
+ENQUEUE_SQL = f"""
+    INSERT INTO nhl_dw.etl_job (game_id, stage, season_id, max_attempts)
+    SELECT g.game_id, s.stage, d.season_id, %(max_attempts)s
+    FROM nhl_dw.fact_game g
+    JOIN nhl_dw.dim_season d ON d.season_key = g.season_key
+    CROSS JOIN unnest(%(stages)s::text[]) AS s(stage)
+    WHERE d.season_id = %(season_id)s
+      AND {_STARTED_GAME}
+    ON CONFLICT (game_id, stage) DO {{conflict}}
+    RETURNING 1;
+"""
+
+# Finished jobs are queued again only on request (--requeue)
+REQUEUE_CONFLICT = """UPDATE
+    SET status       = 'pending',
+        attempts     = 0,
+        max_attempts = EXCLUDED.max_attempts,
+        run_after    = now(),
+        lease_until  = NULL,
+        last_error   = NULL,
+        updated_at   = now()
+    WHERE etl_job.status IN ('done', 'dead')"""
+
+_READY = """
+    ((j.status = 'pending' AND j.run_after <= now())
+     OR (j.status = 'running' AND j.lease_until < now() AND j.attempts < j.max_attempts))
+"""
+
+# Expired leases of jobs that have no attempts left
+EXPIRE_SQL = """
+    UPDATE nhl_dw.etl_job
+    SET status      = 'dead',
+        last_error  = coalesce(last_error, 'lease expired'),
+        lease_until = NULL,
+        updated_at  = now()
+    WHERE job_id IN (
+        SELECT job_id
+        FROM nhl_dw.etl_job
+        WHERE status = 'running'
+          AND lease_until < now()
+          AND attempts >= max_attempts
+        FOR UPDATE SKIP LOCKED
+    );
+"""
+
+# The oldest ready job picks the stage and season, the claim takes up to
+# %(limit)s ready jobs of the same stage and season in game_id order.
+CLAIM_SQL = f"""
+    WITH head AS (
+        SELECT j.stage, j.season_id
+        FROM nhl_dw.etl_job j
+        WHERE j.stage = ANY(%(stages)s) AND {_READY}
+        ORDER BY j.run_after, j.job_id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ),
+    picked AS (
+        SELECT j.job_id
+        FROM nhl_dw.etl_job j
+        JOIN head ON head.stage = j.stage AND head.season_id = j.season_id
+        WHERE {_READY}
+        ORDER BY j.game_id
+        LIMIT %(limit)s
+        FOR UPDATE OF j SKIP LOCKED
+    )
+    UPDATE nhl_dw.etl_job j
+    SET status      = 'running',
+        attempts    = j.attempts + 1,
+        worker      = %(worker)s,
+        lease_until = now() + make_interval(secs => %(lease)s),
+        updated_at  = now()
+    FROM picked
+    WHERE j.job_id = picked.job_id
+    RETURNING j.job_id, j.game_id, j.stage, j.season_id, j.attempts;
+"""
+
+COMPLETE_SQL = """
+    UPDATE nhl_dw.etl_job
+    SET status      = 'done',
+        lease_until = NULL,
+        last_error  = NULL,
+        updated_at  = now()
+    WHERE job_id = ANY(%(job_ids)s)
+      AND worker = %(worker)s
+      AND status = 'running'
+    RETURNING job_id;
+"""
+
+FAIL_SQL = """
+    UPDATE nhl_dw.etl_job
+    SET status      = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'pending' END,
+        run_after   = now() + make_interval(
+                          secs => least(%(cap)s, %(base)s * 2 ^ greatest(attempts - 1, 0))),
+        lease_until = NULL,
+        last_error  = %(error)s,
+        updated_at  = now()
+    WHERE job_id = ANY(%(job_ids)s)
+      AND worker = %(worker)s
+      AND status = 'running'
+    RETURNING status;
+"""
+
+RETRY_DEAD_SQL = """
+    UPDATE nhl_dw.etl_job
+    SET status     = 'pending',
+        attempts   = 0,
+        run_after  = now(),
+        updated_at = now()
+    WHERE status = 'dead' AND stage = ANY(%(stages)s)
+    RETURNING 1;
+"""
+
+
+def enqueue_season(
+    conn,
+    season_id: str,
+    stages: Sequence[str] = STAGES,
+    requeue: bool = False,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> int:
+    """
+    Queue every started game of the season in nhl_dw.fact_game for the
+    given stages. Jobs that already exist are left alone, unless requeue:
+    then done and dead jobs become pending again. Returns the number of
+    jobs queued. Does not commit.
+    """
+    sql = ENQUEUE_SQL.format(conflict=REQUEUE_CONFLICT if requeue else "NOTHING")
+    with conn.cursor() as cur:
+        cur.execute(sql, {
+            "season_id": season_id,
+            "stages": list(stages),
+            "started": sorted(STARTED_STATES),
+            "max_attempts": max_attempts,
+        })
+        return cur.rowcount
+
+
+def retry_dead(conn, stages: Sequence[str] = STAGES) -> int:
+    """
+    Give dead jobs a fresh set of attempts. Does not commit.
+    """
+    with conn.cursor() as cur:
+        cur.execute(RETRY_DEAD_SQL, {"stages": list(stages)})
+        return cur.rowcount
+
+
+def claim_jobs(
+    conn,
+    worker: str,
+    stages: Sequence[str] = STAGES,
+    limit: int = CLAIM_SIZE,
+    lease_seconds: int = LEASE_SECONDS,
+) -> List[Job]:
+    """
+    Lease up to `limit` ready jobs of one stage and season and commit the
+    claim. Empty when nothing is ready.
+    """
+    with conn.cursor() as cur:
+        cur.execute(EXPIRE_SQL)
+        cur.execute(CLAIM_SQL, {
+            "stages": list(stages),
+            "limit": limit,
+            "worker": worker,
+            "lease": lease_seconds,
+        })
+        jobs = [Job(*r) for r in cur.fetchall()]
+    conn.commit()
+    return sorted(jobs, key=lambda j: j.game_id)
+
+
+def complete_jobs(conn, jobs: Iterable[Job], worker: str) -> int:
+    """
+    Mark jobs done. Jobs whose lease this worker lost in the meantime
+    (another worker owns them now) are left alone. Does not commit.
+    """
+    job_ids = [j.job_id for j in jobs]
+    if not job_ids:
+        return 0
+    with conn.cursor() as cur:
+        cur.execute(COMPLETE_SQL, {"job_ids": job_ids, "worker": worker})
+        done = cur.rowcount
+    if done < len(job_ids):
+        print(f"[{worker}] lost the lease of {len(job_ids) - done} jobs before finishing them")
+    return done
+
+
+def fail_jobs(conn, jobs: Iterable[Job], worker: str, error: str) -> int:
+    """
+    Send jobs back to pending with a backoff, or to dead when they are out
+    of attempts. Returns the number of jobs that went dead. Does not
+    commit.
+    """
+    job_ids = [j.job_id for j in jobs]
+    if not job_ids:
+        return 0
+    with conn.cursor() as cur:
+        cur.execute(FAIL_SQL, {
+            "job_ids": job_ids,
+            "worker": worker,
+            "error": error[:2000],
+            "base": RETRY_BACKOFF_BASE,
+            "cap": RETRY_BACKOFF_CAP,
+        })
+        return sum(1 for (status,) in cur.fetchall() if status == "dead")
+
+
+def remaining_jobs(conn, stages: Sequence[str] = STAGES) -> int:
+    """
+    Pending and running jobs, ready or not.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT count(*)
+            FROM nhl_dw.etl_job
+            WHERE status IN ('pending', 'running') AND stage = ANY(%s);
+            """,
+            (list(stages),),
+        )
+        (count,) = cur.fetchone()
+    conn.commit()
+    return count
+
+
+def print_status(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT season_id, stage, status, count(*)
+            FROM nhl_dw.etl_job
+            GROUP BY season_id, stage, status
+            ORDER BY season_id, stage, status;
+        """)
+        for season_id, stage, status, count in cur.fetchall():
+            print(f"{season_id} {stage:<7} {status:<8} {count}")
+
+        cur.execute("""
+            SELECT game_id, stage, attempts, last_error
+            FROM nhl_dw.etl_job
+            WHERE status = 'dead'
+            ORDER BY updated_at DESC
+            LIMIT 20;
+        """)
+        dead = cur.fetchall()
+    if dead:
+        print("\nDead jobs (latest 20):")
+        for game_id, stage, attempts, error in dead:
+            print(f"  {game_id} {stage} after {attempts} attempts: {error}")
+
+
+# ---------------------------------------------------------------------------
+# STAGE RUNNERS
+# ---------------------------------------------------------------------------
+#
+# runner(conn, season_id, game_ids, workers) loads the games and commits.
+# Returns {game_id: error} for games that failed on their own; raising
+# fails every game of the claim.
+
+def _game_keys(conn, game_ids: Sequence[int]) -> Dict[int, int]:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT game_id, game_key FROM nhl_dw.fact_game WHERE game_id = ANY(%s);",
+            (list(game_ids),),
+        )
+        return dict(cur.fetchall())
+
+
+def _missing(game_ids: Sequence[int], keys: Dict[int, int]) -> Dict[int, str]:
+    return {g: "not in nhl_dw.fact_game" for g in game_ids if g not in keys}
+
+
+def run_events(conn, season_id: str, game_ids: Sequence[int], workers: int) -> Dict[int, str]:
+    import nhl_events
+
+    season_key = dim_cache.season_key(conn, season_id)
+    if season_key is None:
+        raise ValueError(f"season {season_id} not in nhl_dw.dim_season")
+    keys = _game_keys(conn, game_ids)
+    games = [(keys[g], g) for g in game_ids if g in keys]
+
+    hashes = PayloadHashes(conn, "play-by-play", "events", [g for _, g in games])
+    # One transaction per claim. Games that can't be fetched are left out
+    # and reported on their own, so one bad game doesn't fail the claim.
+    failed: Dict[int, str] = {}
+    nhl_events.stream_events_for_games(
+        conn, season_key, games, hashes,
+        workers=workers, policy=CommitPolicy(), failed=failed,
+    )
+    failed.update(_missing(game_ids, keys))
+    return failed
+
+
+def run_facts(conn, season_id: str, game_ids: Sequence[int], workers: int) -> Dict[int, str]:
+    from nhl_fact_player_game import load_facts_for_games
+
+    keys = _game_keys(conn, game_ids)
+    skipped = load_facts_for_games(conn, [(keys[g], g) for g in game_ids if g in keys], workers=workers)
+    failed = _missing(game_ids, keys)
+    failed.update({g: "boxscore could not be fetched" for g in skipped})
+    return failed
+
+
+STAGE_RUNNERS = {
+    "events": run_events,
+    "facts": run_facts,
+}
+
+
+# ---------------------------------------------------------------------------
+# WORKER
+# ---------------------------------------------------------------------------
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_claim(conn, jobs: List[Job], worker: str, workers: int = FETCH_WORKERS) -> None:
+    stage, season_id = jobs[0].stage, jobs[0].season_id
+    label = f"[{worker}] {stage} {season_id}: {len(jobs)} games ({jobs[0].game_id}..{jobs[-1].game_id})"
+    try:
+        failed = STAGE_RUNNERS[stage](conn, season_id, [j.game_id for j in jobs], workers)
+    except Exception as e:
+        conn.rollback()
+        # Keys cached from the rolled back transaction may not exist
+        dim_cache.invalidate()
+        dead = fail_jobs(conn, jobs, worker, f"{type(e).__name__}: {e}")
+        conn.commit()
+        print(f"{label} failed ({dead} dead): {e}")
+        return
+
+    complete_jobs(conn, [j for j in jobs if j.game_id not in failed], worker)
+    dead = 0
+    for error in set(failed.values()):
+        dead += fail_jobs(conn, [j for j in jobs if failed.get(j.game_id) == error], worker, error)
+    conn.commit()
+    print(f"{label} done, {len(failed)} failed ({dead} dead)")
+
+
+def work(
+    stages: Sequence[str] = STAGES,
+    claim_size: int = CLAIM_SIZE,
+    lease_seconds: int = LEASE_SECONDS,
+    workers: int = FETCH_WORKERS,
+) -> None:
+    """
+    Claim and run jobs until no pending or running job is left.
+    """
+    worker = worker_name()
+    conn = get_conn()
+    try:
+        while True:
+            jobs = claim_jobs(conn, worker, stages, claim_size, lease_seconds)
+            if jobs:
+                run_claim(conn, jobs, worker, workers)
+                continue
+            # Others may still hold leases that can expire, or jobs may be
+            # waiting out their backoff.
+            if remaining_jobs(conn, stages) == 0:
+                print(f"[{worker}] queue empty, exiting")
+                return
+            time.sleep(IDLE_POLL_SECONDS)
+    finally:
+        put_conn(conn)
+
+
+def run_workers(processes: int = DEFAULT_PROCESSES, **kwargs) -> None:
+    """
+    `processes` worker processes on this machine, each with its own
+    connection and API client.
+    """
+    if processes <= 1:
+        work(**kwargs)
+        return
+
+    # spawn: no connections or API sessions inherited from the parent
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=work, kwargs=kwargs, name=f"nhl-jobs-{i}") for i in range(processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    failed = [p.name for p in procs if p.exitcode != 0]
+    if failed:
+        print(f"Worker processes exited with errors: {', '.join(failed)}")
+
+
+# ---------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue per-game loads in nhl_dw.etl_job and work them off")
+    parser.add_argument("--enqueue", action="append", metavar="SEASON_ID",
+                        help="queue the season's started games and exit (repeatable)")
+    parser.add_argument("--requeue", action="store_true",
+                        help="with --enqueue: queue done and dead jobs again")
+    parser.add_argument("--retry-dead", action="store_true",
+                        help="give dead jobs a fresh set of attempts and exit")
+    parser.add_argument("--status", action="store_true", help="print job counts and exit")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"comma separated subset of {','.join(STAGES)}")
+    parser.add_argument("--processes", type=int, default=DEFAULT_PROCESSES,
+                        help="worker processes on this machine")
+    parser.add_argument("--workers", type=int, default=FETCH_WORKERS,
+                        help="concurrent API fetches per process")
+    parser.add_argument("--claim-size", type=int, default=CLAIM_SIZE)
+    parser.add_argument("--lease", type=int, default=LEASE_SECONDS, help="lease in seconds")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    if args.enqueue or args.retry_dead or args.status:
+        conn = get_conn()
+        try:
+            for season_id in args.enqueue or []:
+                count = enqueue_season(conn, season_id, stages, requeue=args.requeue)
+                conn.commit()
+                print(f"[{season_id}] queued {count} jobs")
+            if args.retry_dead:
+                count = retry_dead(conn, stages)
+                conn.commit()
+                print(f"Retrying {count} dead jobs")
+            if args.status:
+                print_status(conn)
+        finally:
+            put_conn(conn)
+        return
+
+    run_workers(
+        args.processes,
+        stages=stages,
+        claim_size=args.claim_size,
+        lease_seconds=args.lease,
+        workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
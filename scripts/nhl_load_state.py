@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+nhl_load_state.py
+
+Persisted load state shared by the loaders.
+
+Watermarks (nhl_dw.etl_watermark): one timestamp per stage, meaning
+"everything up to here is loaded and final". Incremental runs only look
+at games after the watermark.
+
+Payload hashes (nhl_dw.etl_payload_hash): SHA-256 of the last payload a
+stage loaded for a game. If the freshly fetched payload hashes the same,
+the stage skips its database work for that game entirely.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, Tuple
+
+from nhl_batch import DEFAULT_BATCH_SIZE, BatchUpserter
+
+# ---------------------------------------------------------------------------
+# WATERMARKS
+# ---------------------------------------------------------------------------
+
+def get_watermark(conn, stage: str) -> datetime | None:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT watermark FROM nhl_dw.etl_watermark WHERE stage = %s",
+            (stage,),
+        )
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(conn, stage: str, watermark: datetime | None) -> None:
+    """
+    Store the watermark for a stage. Does not commit, so the caller can
+    commit it together with the data it covers.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO nhl_dw.etl_watermark (stage, watermark, updated_at)
+            VALUES (%s, %s, now())
+            ON CONFLICT (stage) DO UPDATE
+            SET watermark  = EXCLUDED.watermark,
+                updated_at = EXCLUDED.updated_at;
+            """,
+            (stage, watermark),
+        )
+
+
+def settled_watermark(
+    games: Iterable[Tuple[datetime, bool]],
+    current: datetime | None,
+) -> datetime | None:
+    """
+    Given (start_time, is_final) pairs of the games a run looked at, return
+    the new low watermark: the latest start time such that every game up
+    to and including it is final. Games at the same start time move
+    together, so a still-live game is never skipped by the next run.
+    """
+    games = list(games)
+    pending = [t for t, final in games if not final]
+    first_pending = min(pending) if pending else None
+
+    settled = [
+        t for t, final in games
+        if final and (first_pending is None or t < first_pending)
+    ]
+    if not settled:
+        return current
+    newest = max(settled)
+    return newest if current is None or newest > current else current
+
+
+# ---------------------------------------------------------------------------
+# PAYLOAD HASHES
+# ---------------------------------------------------------------------------
+
+PAYLOAD_HASH_UPSERT_SQL = """
+    INSERT INTO nhl_dw.etl_payload_hash (game_id, endpoint, stage, payload_hash)
+    VALUES %s
+    ON CONFLICT (game_id, endpoint, stage) DO UPDATE
+    SET payload_hash = EXCLUDED.payload_hash,
+        loaded_at    = now()
+    WHERE etl_payload_hash.payload_hash IS DISTINCT FROM EXCLUDED.payload_hash
+    RETURNING (xmax = 0);
+"""
+
+
+def payload_hash(payload: Any) -> str:
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def load_payload_hashes(
+    conn,
+    endpoint: str,
+    stage: str,
+    game_ids: Iterable[int] | None = None,
+) -> Dict[int, str]:
+    with conn.cursor() as cur:
+        if game_ids is None:
+            cur.execute(
+                """
+                SELECT game_id, payload_hash
+                FROM nhl_dw.etl_payload_hash
+                WHERE endpoint = %s AND stage = %s
+                """,
+                (endpoint, stage),
+            )
+        else:
+            cur.execute(
+                """
+                SELECT game_id, payload_hash
+                FROM nhl_dw.etl_payload_hash
+                WHERE endpoint = %s AND stage = %s AND game_id = ANY(%s)
+                """,
+                (endpoint, stage, [int(g) for g in game_ids]),
+            )
+        return dict(cur.fetchall())
+
+
+class PayloadHashes:
+    """
+    Change detection for one (endpoint, stage), e.g. ("boxscore",
+    "player_stats").
+
+        hashes = PayloadHashes(conn, "boxscore", "player_stats", game_ids)
+        for game_id, payload in fetched:
+            if not hashes.changed(game_id, payload):
+                continue
+            ... queue the game's rows ...
+        flush_all(conn, players, stats, hashes.batch)
+
+    New hashes are queued in hashes.batch; flush it in the same
+    transaction as the data so a hash is never stored for rows that
+    weren't written.
+    """
+
+    def __init__(
+        self,
+        conn,
+        endpoint: str,
+        stage: str,
+        game_ids: Iterable[int] | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        self.endpoint = endpoint
+        self.stage = stage
+        self.known = load_payload_hashes(conn, endpoint, stage, game_ids)
+        self.batch = BatchUpserter(
+            conn,
+            PAYLOAD_HASH_UPSERT_SQL,
+            key=lambda r: r[0],
+            batch_size=batch_size,
+        )
+        self.skipped = 0
+
+    def changed(self, game_id: int, payload: Any, digest: str | None = None) -> bool:
+        """
+        digest: payload_hash(payload) if the caller already computed it,
+        e.g. in a pipeline's normalize stage.
+        """
+        game_id = int(game_id)
+        h = digest if digest is not None else payload_hash(payload)
+        if self.known.get(game_id) == h:
+            self.skipped += 1
+            return False
+
+        self.known[game_id] = h
+        self.batch.add((game_id, self.endpoint, self.stage, h))
+        return True
+
+    def summary(self) -> str:
+        return f"{self.stage}: skipped {self.skipped} unchanged games"
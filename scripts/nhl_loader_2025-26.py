@@ -3,196 +3,379 @@
 nhl_loader_2025_26.py
 
 Lataa kauden 2025–26 datan (teams, games, players, player_game_stats)
-PostgreSQL-tietokantaan nhl-api-py -kirjastolla.
+PostgreSQL-tietokantaan NHL:n rajapinnasta (nhl_http.NHLApiClient).
 
 Ennen käyttöä:
-    pip install nhl-api-py psycopg2-binary
+    pip install httpx psycopg2-binary
+    pip install orjson          # valinnainen, nopeampi JSON-dekoodaus
 """
 
 from datetime import date, timedelta
 from typing import Dict, Any, Iterable
 
-from nhlpy import NHLClient
-import psycopg2
+from nhl_http import NHLApiClient
+from psycopg2.extras import execute_values
+
+from nhl_batch import BatchUpserter, flush_all, print_summaries
+from nhl_boxscore import BoxscoreSink, get_started_games, iter_game_players, process_boxscores
+from nhl_cache import PayloadCache
+from nhl_db import get_conn, put_conn
+from nhl_dimcache import dim_cache
+from nhl_governor import GovernedClient, governor
 
 
 # ---------------------------------------------------------------------------
 # KONFIGURAATIO
 # ---------------------------------------------------------------------------
 
-DB_HOST = "localhost"
-DB_PORT = 5432
-DB_NAME = "nhl_db"
-DB_USER = "nhl_user"
-DB_PASSWORD = "strongpassword"   # vaihda omiin tietoihin
-
 # Kausi 2025–26: päivämäärät ja season-koodi tietokantaan
 # Päivämäärät kannattaa päivittää vastaamaan oikeaa runkosarjan ikkunaa.
 SEASON_START_DATE = date(2025, 10, 8)
 SEASON_END_DATE   = date(2026, 4, 15)
 SEASON_CODE       = "20252026"   # tallennetaan games.season -kenttään
 
+# Boxscoret haetaan rinnakkain näin monella säikeellä; tietokantaan kirjoittaa
+# silti vain yksi säie. Arvolla 1 haku on täysin sarjallinen.
+FETCH_WORKERS = 8
 
-# ---------------------------------------------------------------------------
-# YHTEYS TIETOKANTAAN
-# ---------------------------------------------------------------------------
+# Pelaaja- ja tilastorivit kirjoitetaan monirivisinä upsertteina näin
+# suurissa erissä (rivejä / taulu / lause). Erä voi kattaa useita pelejä.
+UPSERT_BATCH_SIZE = 500
 
-def get_conn():
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-    )
+# "season": koko kauden aikataulu viikkohauilla ja yksi upsert-erä.
+# "daily":  vanha tapa, yksi daily_schedule-kutsu per päivä.
+SCHEDULE_MODE = "season"
 
 
 # ---------------------------------------------------------------------------
 # NHL API -CLIENT
 # ---------------------------------------------------------------------------
 
-client = NHLClient(
-    debug=True,
-    timeout=30,
-)
+client = GovernedClient(NHLApiClient(pool_size=FETCH_WORKERS, timeout=30))
+
+# Paikallinen välimuisti API-vastauksille: päättyneiden pelien boxscoret
+# ja aikataulut haetaan verkosta vain kerran.
+payload_cache = PayloadCache()
 
 
 # ---------------------------------------------------------------------------
 # TEAMS
 # ---------------------------------------------------------------------------
 
+TEAMS_UPSERT_SQL = """
+    INSERT INTO teams (name, abbreviation, city, conference, division)
+    VALUES %s
+    ON CONFLICT (abbreviation) DO UPDATE
+    SET name       = EXCLUDED.name,
+        city       = EXCLUDED.city,
+        conference = EXCLUDED.conference,
+        division   = EXCLUDED.division,
+        updated_at = now()
+    WHERE (teams.name, teams.city, teams.conference, teams.division)
+          IS DISTINCT FROM
+          (EXCLUDED.name, EXCLUDED.city, EXCLUDED.conference, EXCLUDED.division)
+    RETURNING abbreviation, team_id, (xmax = 0);
+"""
+
+
 def upsert_teams(conn):
     """
-    Hakee kaikki nykyiset joukkueet ja upserttaa teams-tauluun.
+    Hakee kaikki nykyiset joukkueet ja upserttaa teams-tauluun yhdellä
+    lauseella. Muuttumattomia rivejä ei kirjoiteta uudelleen.
     Odottaa skeemaa:
       teams(team_id IDENTITY PK, name, abbreviation UNIQUE, city, conference, division)
     """
     teams = client.teams.teams()
 
+    rows = []
+    for t in teams:
+        abbr = t["abbr"]
+        name = t["name"]
+        conference = t["conference"]["name"]
+        division = t["division"]["name"]
+        city = None  # halutessa voi täydentää, jos API palauttaa paikkakunnan
+        rows.append((name, abbr, city, conference, division))
+
     with conn.cursor() as cur:
-        for t in teams:
-            abbr = t["abbr"]
-            name = t["name"]
-            conference = t["conference"]["name"]
-            division = t["division"]["name"]
-            city = None  # halutessa voi täydentää, jos API palauttaa paikkakunnan
-
-            cur.execute(
-                """
-                INSERT INTO teams (name, abbreviation, city, conference, division)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (abbreviation) DO UPDATE
-                SET name       = EXCLUDED.name,
-                    city       = EXCLUDED.city,
-                    conference = EXCLUDED.conference,
-                    division   = EXCLUDED.division
-                RETURNING team_id;
-                """,
-                (name, abbr, city, conference, division),
-            )
-            team_id = cur.fetchone()[0]
-            print(f"Teams: {abbr} -> team_id={team_id}")
+        result = execute_values(cur, TEAMS_UPSERT_SQL, rows, page_size=max(len(rows), 1), fetch=True)
+
+    # Muuttumattomat joukkueet eivät palaudu; niiden team_id haetaan
+    # välimuistiin vasta tarvittaessa.
+    for abbr, team_id, _ in result:
+        dim_cache.put("team_abbr", abbr, team_id)
+        print(f"Teams: {abbr} -> team_id={team_id}")
 
     conn.commit()
-    print(f"Teams: tallennettu {len(teams)} joukkuetta.")
+    inserted = sum(1 for *_, is_insert in result if is_insert)
+    print(
+        f"Teams: {len(teams)} joukkuetta, {inserted} lisätty, "
+        f"{len(result) - inserted} päivitetty, {len(rows) - len(result)} ennallaan."
+    )
 
 
 def get_team_id_by_abbr(conn, abbr: str) -> int:
-    with conn.cursor() as cur:
-        cur.execute(
-            "SELECT team_id FROM teams WHERE abbreviation = %s",
-            (abbr,),
-        )
-        row = cur.fetchone()
-    if row is None:
-        raise ValueError(f"Team-ID puuttuu abbreviationille {abbr}")
-    return row[0]
+    """
+    Joukkueen team_id lyhenteen perusteella. Käyttää prosessin yhteistä
+    dimensiovälimuistia, joten kanta kysytään vain kerran.
+    """
+    return dim_cache.team_id_by_abbr(conn, abbr)
 
 
 # ---------------------------------------------------------------------------
 # GAMES
 # ---------------------------------------------------------------------------
 
-def upsert_games_for_date(conn, d: date):
+GAMES_UPSERT_SQL = """
+    INSERT INTO games (
+        game_id, season, game_type, game_date,
+        home_team_id, away_team_id, home_score, away_score, venue,
+        game_state
+    )
+    VALUES %s
+    ON CONFLICT (game_id) DO UPDATE
+    SET season       = EXCLUDED.season,
+        game_type    = EXCLUDED.game_type,
+        game_date    = EXCLUDED.game_date,
+        home_team_id = EXCLUDED.home_team_id,
+        away_team_id = EXCLUDED.away_team_id,
+        home_score   = EXCLUDED.home_score,
+        away_score   = EXCLUDED.away_score,
+        venue        = EXCLUDED.venue,
+        game_state   = EXCLUDED.game_state,
+        updated_at   = now()
+    WHERE (games.season, games.game_type, games.game_date,
+           games.home_team_id, games.away_team_id, games.home_score,
+           games.away_score, games.venue, games.game_state)
+          IS DISTINCT FROM
+          (EXCLUDED.season, EXCLUDED.game_type, EXCLUDED.game_date,
+           EXCLUDED.home_team_id, EXCLUDED.away_team_id,
+           EXCLUDED.home_score, EXCLUDED.away_score, EXCLUDED.venue,
+           EXCLUDED.game_state)
+    RETURNING (xmax = 0);
+"""
+
+
+def _schedule_game_id(g: Dict[str, Any]) -> int:
+    if g.get("id") is not None:
+        return int(g["id"])
+    link = g["gameCenterLink"]
+    return int(link.split("/")[-1])
+
+
+def game_row_from_schedule_game(conn, g: Dict[str, Any]) -> tuple:
     """
-    Hakee yhden päivän pelit ja upserttaa games-tauluun.
+    Aikataulun peli -> games-taulun rivi.
     Odottaa skeemaa:
       games(game_id PK, season TEXT, game_type INT, game_date TIMESTAMPTZ,
-            home_team_id FK, away_team_id FK, home_score, away_score, venue)
+            home_team_id FK, away_team_id FK, home_score, away_score, venue,
+            game_state TEXT)
+    """
+    home_team_id = get_team_id_by_abbr(conn, g["homeTeam"]["abbrev"])
+    away_team_id = get_team_id_by_abbr(conn, g["awayTeam"]["abbrev"])
+
+    game_id = _schedule_game_id(g)
+
+    game_date = g.get("startTimeUTC")
+    game_type = g.get("gameType")
+    home_score = g["homeTeam"].get("score")
+    away_score = g["awayTeam"].get("score")
+
+    # Kaikki nämä pelit kuuluvat kauteen 2025–26
+    season = SEASON_CODE
+    venue = None  # voidaan hakea tarkemmin boxscore/landing endpointista myöhemmin
+
+    # FUT / PRE / LIVE / CRIT / FINAL / OFF, ks. nhl_game_state
+    game_state = g.get("gameState")
+
+    return (
+        game_id,
+        season,
+        game_type,
+        game_date,
+        home_team_id,
+        away_team_id,
+        home_score,
+        away_score,
+        venue,
+        game_state,
+    )
+
+
+def upsert_games(conn, games: Iterable[Dict[str, Any]]) -> int:
+    """
+    Upserttaa annetut aikataulun pelit games-tauluun yhdellä monirivisellä
+    lauseella ja commitoi.
     """
-    schedule_payload = client.schedule.daily_schedule(date=d.isoformat())
+    games = list(games)
+    batch = BatchUpserter(
+        conn,
+        GAMES_UPSERT_SQL,
+        key=lambda r: r[0],
+        batch_size=max(len(games), 1),
+    )
+    for g in games:
+        batch.add(game_row_from_schedule_game(conn, g))
+    (count,) = flush_all(conn, batch)
+    print_summaries(batch)
+    return count
+
+
+def upsert_games_for_date(conn, d: date):
+    """
+    Hakee yhden päivän pelit ja upserttaa games-tauluun.
+    """
+    schedule_payload = payload_cache.fetch(
+        "daily_schedule",
+        {"date": d.isoformat()},
+        lambda: client.schedule.daily_schedule(date=d.isoformat()),
+    )
     games = schedule_payload.get("games", [])
     if not games:
         print(f"Games: ei pelejä päivälle {d.isoformat()}.")
         return
 
-    with conn.cursor() as cur:
-        for g in games:
-            home_abbr = g["homeTeam"]["abbrev"]
-            away_abbr = g["awayTeam"]["abbrev"]
-
-            home_team_id = get_team_id_by_abbr(conn, home_abbr)
-            away_team_id = get_team_id_by_abbr(conn, away_abbr)
-
-            link = g["gameCenterLink"]
-            game_id = int(link.split("/")[-1])
-
-            game_date = g.get("startTimeUTC")
-            game_type = g.get("gameType")
-            home_score = g["homeTeam"].get("score")
-            away_score = g["awayTeam"].get("score")
-
-            # Kaikki nämä pelit kuuluvat kauteen 2025–26
-            season = SEASON_CODE
-            venue = None  # voidaan hakea tarkemmin boxscore/landing endpointista myöhemmin
-
-            cur.execute(
-                """
-                INSERT INTO games (
-                    game_id, season, game_type, game_date,
-                    home_team_id, away_team_id, home_score, away_score, venue
-                )
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                ON CONFLICT (game_id) DO UPDATE
-                SET season       = EXCLUDED.season,
-                    game_type    = EXCLUDED.game_type,
-                    game_date    = EXCLUDED.game_date,
-                    home_team_id = EXCLUDED.home_team_id,
-                    away_team_id = EXCLUDED.away_team_id,
-                    home_score   = EXCLUDED.home_score,
-                    away_score   = EXCLUDED.away_score,
-                    venue        = EXCLUDED.venue;
-                """,
-                (
-                    game_id,
-                    season,
-                    game_type,
-                    game_date,
-                    home_team_id,
-                    away_team_id,
-                    home_score,
-                    away_score,
-                    venue,
-                ),
-            )
-
-            print(f"Games: {away_abbr} @ {home_abbr} ({game_id}) upsertattu.")
+    for g in games:
+        print(f"Games: {g['awayTeam']['abbrev']} @ {g['homeTeam']['abbrev']} ({_schedule_game_id(g)})")
 
-    conn.commit()
+    upsert_games(conn, games)
     print(f"Games: tallennettu {len(games)} ottelua päivältä {d.isoformat()}.")
 
 
+def fetch_season_schedule(start: date, end: date) -> list[Dict[str, Any]]:
+    """
+    Hakee kauden kaikki pelit viikkoaikatauluista (~27 kutsua koko kaudelle
+    ~190 päiväkohtaisen sijaan). Tyhjät jaksot ohitetaan API:n
+    nextStartDate-kentän avulla. Palauttaa pelit game_id:n mukaan
+    deduplikoituna ja aikajärjestyksessä.
+    """
+    games: Dict[int, Dict[str, Any]] = {}
+    calls = 0
+    d = start
+
+    while d <= end:
+        week_payload = payload_cache.fetch(
+            "weekly_schedule",
+            {"date": d.isoformat()},
+            lambda: client.schedule.weekly_schedule(date=d.isoformat()),
+        )
+        calls += 1
+
+        for day in week_payload.get("gameWeek", []):
+            day_date = date.fromisoformat(day["date"])
+            if start <= day_date <= end:
+                for g in day.get("games", []):
+                    games[_schedule_game_id(g)] = g
+
+        next_start = week_payload.get("nextStartDate")
+        next_date = date.fromisoformat(next_start) if next_start else None
+        if next_date is None or next_date <= d:
+            next_date = d + timedelta(days=7)
+        d = next_date
+
+    print(f"Schedule: {calls} aikataulukutsua, {len(games)} peliä.")
+    return sorted(games.values(), key=lambda g: (g.get("startTimeUTC") or "", _schedule_game_id(g)))
+
+
+def upsert_games_for_season(conn, start: date = SEASON_START_DATE, end: date = SEASON_END_DATE):
+    """
+    Hakee koko kauden aikataulun kerralla ja upserttaa kaikki pelit
+    games-tauluun yhdessä erässä.
+    """
+    games = fetch_season_schedule(start, end)
+    if not games:
+        print(f"Games: ei pelejä välillä {start.isoformat()} – {end.isoformat()}.")
+        return
+
+    upsert_games(conn, games)
+    print(f"Games: tallennettu {len(games)} ottelua kaudelle {SEASON_CODE}.")
+
+
 # ---------------------------------------------------------------------------
 # PLAYERS & PLAYER_GAME_STATS – BOXSCORISTA
 # ---------------------------------------------------------------------------
 
-def upsert_player_from_boxscore_player(
-    conn,
-    player: Dict[str, Any],
-    team_id: int,
-):
+PLAYERS_UPSERT_SQL = """
+    INSERT INTO players (
+        player_id, full_name, first_name, last_name,
+        shoots_catches, primary_position, sweater_number,
+        birth_date, current_team_id
+    )
+    VALUES %s
+    ON CONFLICT (player_id) DO UPDATE
+    SET full_name        = EXCLUDED.full_name,
+        first_name       = EXCLUDED.first_name,
+        last_name        = EXCLUDED.last_name,
+        shoots_catches   = EXCLUDED.shoots_catches,
+        primary_position = EXCLUDED.primary_position,
+        sweater_number   = EXCLUDED.sweater_number,
+        birth_date       = COALESCE(EXCLUDED.birth_date, players.birth_date),
+        current_team_id  = EXCLUDED.current_team_id,
+        updated_at       = now()
+    WHERE (players.full_name, players.first_name, players.last_name,
+           players.shoots_catches, players.primary_position,
+           players.sweater_number, players.birth_date,
+           players.current_team_id)
+          IS DISTINCT FROM
+          (EXCLUDED.full_name, EXCLUDED.first_name, EXCLUDED.last_name,
+           EXCLUDED.shoots_catches, EXCLUDED.primary_position,
+           EXCLUDED.sweater_number,
+           COALESCE(EXCLUDED.birth_date, players.birth_date),
+           EXCLUDED.current_team_id)
+    RETURNING (xmax = 0);
+"""
+
+PLAYER_GAME_STATS_UPSERT_SQL = """
+    INSERT INTO player_game_stats (
+        game_id, player_id, team_id,
+        position_code, time_on_ice,
+        goals, assists, points, shots, hits, blocks,
+        plus_minus, penalty_minutes,
+        faceoff_wins, faceoff_losses,
+        saves, shots_against, goals_against, save_pct
+    )
+    VALUES %s
+    ON CONFLICT (game_id, player_id) DO UPDATE
+    SET team_id         = EXCLUDED.team_id,
+        position_code   = EXCLUDED.position_code,
+        time_on_ice     = EXCLUDED.time_on_ice,
+        goals           = EXCLUDED.goals,
+        assists         = EXCLUDED.assists,
+        points          = EXCLUDED.points,
+        shots           = EXCLUDED.shots,
+        hits            = EXCLUDED.hits,
+        blocks          = EXCLUDED.blocks,
+        plus_minus      = EXCLUDED.plus_minus,
+        penalty_minutes = EXCLUDED.penalty_minutes,
+        faceoff_wins    = EXCLUDED.faceoff_wins,
+        faceoff_losses  = EXCLUDED.faceoff_losses,
+        saves           = EXCLUDED.saves,
+        shots_against   = EXCLUDED.shots_against,
+        goals_against   = EXCLUDED.goals_against,
+        save_pct        = EXCLUDED.save_pct,
+        updated_at      = now()
+    WHERE (player_game_stats.team_id, player_game_stats.position_code,
+           player_game_stats.time_on_ice, player_game_stats.goals,
+           player_game_stats.assists, player_game_stats.points,
+           player_game_stats.shots, player_game_stats.hits,
+           player_game_stats.blocks, player_game_stats.plus_minus,
+           player_game_stats.penalty_minutes,
+           player_game_stats.faceoff_wins, player_game_stats.faceoff_losses,
+           player_game_stats.saves, player_game_stats.shots_against,
+           player_game_stats.goals_against, player_game_stats.save_pct)
+          IS DISTINCT FROM
+          (EXCLUDED.team_id, EXCLUDED.position_code, EXCLUDED.time_on_ice,
+           EXCLUDED.goals, EXCLUDED.assists, EXCLUDED.points,
+           EXCLUDED.shots, EXCLUDED.hits, EXCLUDED.blocks,
+           EXCLUDED.plus_minus, EXCLUDED.penalty_minutes,
+           EXCLUDED.faceoff_wins, EXCLUDED.faceoff_losses, EXCLUDED.saves,
+           EXCLUDED.shots_against, EXCLUDED.goals_against, EXCLUDED.save_pct)
+    RETURNING (xmax = 0);
+"""
+
+
+def player_row_from_boxscore_player(player: Dict[str, Any], team_id: int) -> tuple:
     """
-    playerByGameStats-pelaaja -> players-taulu.
+    playerByGameStats-pelaaja -> players-taulun rivi.
     Odottaa skeemaa:
       players(player_id PK, full_name, first_name, last_name,
               shoots_catches, primary_position, sweater_number,
@@ -212,47 +395,36 @@ def upsert_player_from_boxscore_player(
     sweater_number = player.get("sweaterNumber")
     birth_date = player.get("birthDate")  # ei välttämättä mukana
 
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO players (
-                player_id, full_name, first_name, last_name,
-                shoots_catches, primary_position, sweater_number,
-                birth_date, current_team_id
-            )
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            ON CONFLICT (player_id) DO UPDATE
-            SET full_name        = EXCLUDED.full_name,
-                first_name       = EXCLUDED.first_name,
-                last_name        = EXCLUDED.last_name,
-                shoots_catches   = EXCLUDED.shoots_catches,
-                primary_position = EXCLUDED.primary_position,
-                sweater_number   = EXCLUDED.sweater_number,
-                birth_date       = COALESCE(EXCLUDED.birth_date, players.birth_date),
-                current_team_id  = EXCLUDED.current_team_id;
-            """,
-            (
-                player_id,
-                full_name,
-                first_name,
-                last_name,
-                shoots_catches,
-                position_code,
-                sweater_number,
-                birth_date,
-                team_id,
-            ),
-        )
+    return (
+        player_id,
+        full_name,
+        first_name,
+        last_name,
+        shoots_catches,
+        position_code,
+        sweater_number,
+        birth_date,
+        team_id,
+    )
 
 
-def upsert_player_game_stats_from_boxscore_player(
-    conn,
+def _merge_player_rows(old: tuple, new: tuple) -> tuple:
+    """
+    Sama pelaaja kahdesti samassa erässä: uudempi rivi voittaa, mutta
+    birth_date säilyy kuten COALESCE peräkkäisissä upserteissa.
+    """
+    if new[7] is None and old[7] is not None:
+        return new[:7] + (old[7],) + new[8:]
+    return new
+
+
+def player_game_stats_row_from_boxscore_player(
     game_id: int,
     team_id: int,
     player: Dict[str, Any],
-):
+) -> tuple:
     """
-    Pelaajan ottelukohtaiset tilastot -> player_game_stats.
+    Pelaajan ottelukohtaiset tilastot -> player_game_stats-rivi.
     Odottaa skeemaa, jossa on ainakin sarakkeet:
       game_id, player_id, team_id, position_code, time_on_ice,
       goals, assists, points, shots, hits, blocks,
@@ -281,122 +453,218 @@ def upsert_player_game_stats_from_boxscore_player(
     goals_against = player.get("goalsAgainst")
     save_pct = player.get("savePct") or player.get("savePercentage")
 
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO player_game_stats (
-                game_id, player_id, team_id,
-                position_code, time_on_ice,
-                goals, assists, points, shots, hits, blocks,
-                plus_minus, penalty_minutes,
-                faceoff_wins, faceoff_losses,
-                saves, shots_against, goals_against, save_pct
-            )
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            ON CONFLICT (game_id, player_id) DO UPDATE
-            SET team_id         = EXCLUDED.team_id,
-                position_code   = EXCLUDED.position_code,
-                time_on_ice     = EXCLUDED.time_on_ice,
-                goals           = EXCLUDED.goals,
-                assists         = EXCLUDED.assists,
-                points          = EXCLUDED.points,
-                shots           = EXCLUDED.shots,
-                hits            = EXCLUDED.hits,
-                blocks          = EXCLUDED.blocks,
-                plus_minus      = EXCLUDED.plus_minus,
-                penalty_minutes = EXCLUDED.penalty_minutes,
-                faceoff_wins    = EXCLUDED.faceoff_wins,
-                faceoff_losses  = EXCLUDED.faceoff_losses,
-                saves           = EXCLUDED.saves,
-                shots_against   = EXCLUDED.shots_against,
-                goals_against   = EXCLUDED.goals_against,
-                save_pct        = EXCLUDED.save_pct;
-            """,
-            (
-                game_id,
-                player_id,
-                team_id,
-                position_code,
-                toi,
-                goals,
-                assists,
-                points,
-                shots,
-                hits,
-                blocks,
-                plus_minus,
-                pim,
-                faceoff_wins,
-                faceoff_losses,
-                saves,
-                shots_against,
-                goals_against,
-                save_pct,
-            ),
+    return (
+        game_id,
+        player_id,
+        team_id,
+        position_code,
+        toi,
+        goals,
+        assists,
+        points,
+        shots,
+        hits,
+        blocks,
+        plus_minus,
+        pim,
+        faceoff_wins,
+        faceoff_losses,
+        saves,
+        shots_against,
+        goals_against,
+        save_pct,
+    )
+
+
+def new_player_batches(conn, batch_size: int = UPSERT_BATCH_SIZE):
+    """
+    Palauttaa (players, player_game_stats) -erät. Flushataan aina tässä
+    järjestyksessä, jotta pelaaja on olemassa ennen tilastoriviään.
+    """
+    players = BatchUpserter(
+        conn,
+        PLAYERS_UPSERT_SQL,
+        key=lambda r: r[0],
+        merge=_merge_player_rows,
+        batch_size=batch_size,
+    )
+    stats = BatchUpserter(
+        conn,
+        PLAYER_GAME_STATS_UPSERT_SQL,
+        key=lambda r: (r[0], r[1]),
+        batch_size=batch_size,
+    )
+    return players, stats
+
+
+def flush_player_batches(conn, players: BatchUpserter, stats: BatchUpserter, *extra: BatchUpserter):
+    """
+    Kirjoittaa pelaajat, tilastot ja mahdolliset lisäerät (esim.
+    payload-hashit) samassa transaktiossa.
+    """
+    n_players, n_stats, *_ = flush_all(conn, players, stats, *extra)
+    print(f"Player stats: kirjoitettu {n_players} players- ja {n_stats} player_game_stats-riviä.")
+
+
+def fetch_boxscore(game_id: int) -> Dict[str, Any]:
+    """
+    Hakee yhden pelin boxscoren (välimuistin kautta). Ei koske
+    tietokantaan, joten tätä voi kutsua useasta säikeestä yhtä aikaa.
+    """
+    return payload_cache.fetch(
+        "boxscore",
+        {"game_id": int(game_id)},
+        lambda: client.game_center.boxscore(game_id=str(game_id)),
+    )
+
+
+def write_player_stats_for_game(
+    players: BatchUpserter,
+    stats: BatchUpserter,
+    game_id: int,
+    home_team_id: int,
+    away_team_id: int,
+    boxscore: Dict[str, Any],
+):
+    """
+    Lisää valmiiksi haetun boxscoren pelaajat players- ja
+    player_game_stats-eriin. Kirjoitus kantaan tapahtuu flushissa.
+    """
+    add_player_stats_rows(
+        players,
+        stats,
+        game_id,
+        player_stats_rows_for_game(game_id, home_team_id, away_team_id, boxscore),
+    )
+
+
+def player_stats_rows_for_game(
+    game_id: int,
+    home_team_id: int,
+    away_team_id: int,
+    boxscore: Dict[str, Any],
+) -> list[tuple[tuple, tuple]]:
+    """
+    Boxscore -> [(players-rivi, player_game_stats-rivi), ...]. Ei koske
+    kantaan, joten ajetaan putken normalize-vaiheessa.
+    """
+    return [
+        (
+            player_row_from_boxscore_player(p, team_id),
+            player_game_stats_row_from_boxscore_player(game_id, team_id, p),
         )
+        for team_id, p in iter_game_players(boxscore, home_team_id, away_team_id)
+    ]
+
+
+def add_player_stats_rows(players: BatchUpserter, stats: BatchUpserter, game_id: int, rows):
+    for player_row, stats_row in rows:
+        players.add(player_row)
+        stats.add(stats_row)
+    print(f"Player stats: käsitelty peli {game_id}.")
+
+
+class PlayersSink(BoxscoreSink):
+    """
+    Boxscore-ajon kohde: pelkkä players-taulu (update_players2.py).
+    """
+
+    stage = "players"
+
+    def __init__(self, conn, batch_size: int = UPSERT_BATCH_SIZE):
+        players, _ = new_player_batches(conn, batch_size)
+        super().__init__([players])
+
+    def rows(self, game, boxscore):
+        return [
+            player_row_from_boxscore_player(p, team_id)
+            for team_id, p in iter_game_players(boxscore, game[1], game[2])
+        ]
+
+    def add(self, game, rows):
+        for row in rows:
+            self.batches[0].add(row)
 
+    def report(self, counts):
+        print(f"Players: kirjoitettu {counts[0]} players-riviä.")
 
-def _iter_boxscore_players(team_block: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+
+class PlayerStatsSink(BoxscoreSink):
     """
-    Palauttaa kaikki pelaajat annettujen ryhmien alta
-    (forwards, defensemen/defense, goalies).
+    Boxscore-ajon kohde: players + player_game_stats.
     """
-    if not team_block:
-        return []
 
-    groups = []
-    for key in ("forwards", "defensemen", "defense", "goalies"):
-        group = team_block.get(key)
-        if group:
-            groups.append(group)
+    stage = "player_stats"
+
+    def __init__(self, conn, batch_size: int = UPSERT_BATCH_SIZE):
+        super().__init__(list(new_player_batches(conn, batch_size)))
+
+    def rows(self, game, boxscore):
+        return player_stats_rows_for_game(game[0], game[1], game[2], boxscore)
+
+    def add(self, game, rows):
+        players, stats = self.batches
+        add_player_stats_rows(players, stats, game[0], rows)
 
-    for group in groups:
-        for player in group:
-            yield player
+    def report(self, counts):
+        print(f"Player stats: kirjoitettu {counts[0]} players- ja {counts[1]} player_game_stats-riviä.")
 
 
 def load_player_stats_for_game(conn, game_id: int, home_team_id: int, away_team_id: int):
     """
     Hakee boxscoren yhdelle pelille ja täyttää players + player_game_stats.
     """
-    boxscore = client.game_center.boxscore(game_id=str(game_id))
+    boxscore = fetch_boxscore(game_id)
+    players, stats = new_player_batches(conn)
+    write_player_stats_for_game(players, stats, game_id, home_team_id, away_team_id, boxscore)
+    flush_player_batches(conn, players, stats)
 
-    pbs = boxscore.get("playerByGameStats", {})
-    home_block = pbs.get("homeTeam", {})
-    away_block = pbs.get("awayTeam", {})
 
-    # Käsitellään kaikki kotijoukkueen pelaajat
-    for p in _iter_boxscore_players(home_block):
-        upsert_player_from_boxscore_player(conn, p, home_team_id)
-        upsert_player_game_stats_from_boxscore_player(conn, game_id, home_team_id, p)
+def load_player_stats_for_all_games(
+    conn,
+    workers: int = FETCH_WORKERS,
+    batch_size: int = UPSERT_BATCH_SIZE,
+):
+    """
+    Hakee boxscoret vain 2025–26 kauden peleille (season = SEASON_CODE),
+    jotka ovat jo alkaneet. Tulevien pelien tyhjiä boxscoreja ei haeta.
 
-    # Käsitellään kaikki vierasjoukkueen pelaajat
-    for p in _iter_boxscore_players(away_block):
-        upsert_player_from_boxscore_player(conn, p, away_team_id)
-        upsert_player_game_stats_from_boxscore_player(conn, game_id, away_team_id, p)
+    Boxscoret haetaan `workers` säikeellä rinnakkain, mutta ne kirjoitetaan
+    kantaan tässä säikeessä samassa järjestyksessä kuin sarjallisessa
+    ajossa, joten lopputulos on rivi riviltä sama.
 
-    conn.commit()
-    print(f"Player stats: ladattu peli {game_id}.")
+    Rivit kerätään useammankin pelin yli eriin ja kirjoitetaan yhdellä
+    monirivisellä upsertilla per taulu, kun erässä on `batch_size` riviä.
+    """
+    rows = get_started_games(conn, SEASON_CODE)
+    load_player_stats_for_games(conn, rows, workers=workers, batch_size=batch_size)
 
 
-def load_player_stats_for_all_games(conn):
-    """
-    Hakee boxscoret vain 2025–26 kauden peleille (season = SEASON_CODE).
+def load_player_stats_for_games(
+    conn,
+    rows: Iterable[tuple],
+    workers: int = FETCH_WORKERS,
+    batch_size: int = UPSERT_BATCH_SIZE,
+) -> list[int]:
     """
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT game_id, home_team_id, away_team_id
-            FROM games
-            WHERE season = %s
-            ORDER BY game_date NULLS LAST, game_id;
-            """,
-            (SEASON_CODE,),
-        )
-        rows = cur.fetchall()
+    Lataa players + player_game_stats annetuille (game_id, home_team_id,
+    away_team_id) -riveille. Käytetään sekä koko kauden että
+    inkrementaalisessa latauksessa.
+
+    Jos pelin boxscore on täsmälleen sama kuin edellisellä latauskerralla
+    (sama payload-hash), peli ohitetaan kokonaan eikä kantaan kirjoiteta.
 
-    for game_id, home_team_id, away_team_id in rows:
-        load_player_stats_for_game(conn, game_id, home_team_id, away_team_id)
+    Palauttaa pelit, joiden boxscorea ei saatu haettua (API ei vastannut
+    uusintayrityksistä huolimatta).
+    """
+    return process_boxscores(
+        conn,
+        rows,
+        [PlayerStatsSink(conn, batch_size)],
+        fetch_boxscore,
+        workers=workers,
+        batch_size=batch_size,
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -410,18 +678,22 @@ def main():
         upsert_teams(conn)
 
         print("=== Päivitetään ottelut koko kaudelle 2025–26 ===")
-        d = SEASON_START_DATE
-        while d <= SEASON_END_DATE:
-            print(f"-- Päivä {d.isoformat()} --")
-            upsert_games_for_date(conn, d)
-            d += timedelta(days=1)
+        if SCHEDULE_MODE == "season":
+            upsert_games_for_season(conn)
+        else:
+            d = SEASON_START_DATE
+            while d <= SEASON_END_DATE:
+                print(f"-- Päivä {d.isoformat()} --")
+                upsert_games_for_date(conn, d)
+                d += timedelta(days=1)
 
         print("=== Päivitetään pelaajat ja player_game_stats boxscoreista (vain 2025–26) ===")
         load_player_stats_for_all_games(conn)
 
     finally:
-        conn.close()
-        print("Yhteys tietokantaan suljettu.")
+        put_conn(conn)
+        print(payload_cache.summary())
+        print(governor.summary())
 
 
 if __name__ == "__main__":
@@ -1,364 +1,205 @@
 #!/usr/bin/env python3
 """
-nhl_populate_dim_player.py
-
-Populate nhl_dw.dim_player using:
-  1) team rosters (team_roster)
-  2) season stats (skater_stats_summary + goalie_stats_summary)
-
-Expected dim_player schema (minimum):
-
-  CREATE TABLE nhl_dw.dim_player (
-      player_key      BIGSERIAL PRIMARY KEY,
-      player_id       INTEGER UNIQUE,       -- natural NHL player id
-      full_name       TEXT,
-      first_name      TEXT,
-      last_name       TEXT,
-      birth_date      DATE,
-      shoots_catches  TEXT
-  );
+nhl_loader_2025_26_incremental.py
+
+Inkrementaalinen (esim. yöllinen) lataus kaudelle 2025–26.
+
+Toisin kuin nhl_loader_2025-26.py, tämä ei lataa koko kautta uudelleen.
+Jokaisella vaiheella on oma vesiraja taulussa nhl_dw.etl_watermark, ja
+ajo käsittelee vain vesirajan jälkeen muuttuneet pelit:
+
+  schedule    Aikataulu haetaan vain viime ajon päivästä (pieni
+              takaikkuna) muutaman päivän päähän, ei koko kautta.
+  boxscores   players + player_game_stats vain peleille, jotka alkoivat
+              vesirajan jälkeen. Vesiraja siirtyy viimeisimpään peliin,
+              jota ennen kaikki pelit ovat virallisia (OFF), joten kesken
+              jäänyt tai vielä korjattava (FINAL) peli haetaan uudelleen
+              seuraavalla ajolla.
+  events      event_play vesirajan jälkeen alkaneille peleille. Pelin
+              tapahtumat korvataan kokonaan, joten uusintalataus ei
+              tuota duplikaatteja.
+  dim_player  Ensimmäisellä ajolla täysi lataus (rosterit + tilastot),
+              sen jälkeen vain niiden joukkueiden rosterit, jotka
+              pelasivat tämän ajon peleissä.
+
+Yöllinen ajo koskee siis muutamaan kymmeneen peliin koko kauden sijaan.
 """
 
-from typing import Dict, Any, Iterable, Set, Tuple
-
-import psycopg2
-from nhlpy import NHLClient
-
-# ---------------------------------------------------------------------------
-# CONFIG
-# ---------------------------------------------------------------------------
-
-DB_HOST = "localhost"
-DB_PORT = 5432
-DB_NAME = "nhl_db"
-DB_USER = "nhl_user"
-DB_PASSWORD = "strongpassword"  # change to your own
-
-# Choose which season's players you want to cover (YYYYYYYY format)
-# Used for both rosters and stats.
-SEASON_ID = "20252026"  # e.g. 2025–26 season
-
-# Stats season range (can be widened later if you want multiple seasons)
-STATS_START_SEASON = SEASON_ID
-STATS_END_SEASON = SEASON_ID
-
-
-# ---------------------------------------------------------------------------
-# DB CONNECTION
-# ---------------------------------------------------------------------------
-
-def get_conn():
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-    )
-
-
-# ---------------------------------------------------------------------------
-# NHL CLIENT
-# ---------------------------------------------------------------------------
-
-client = NHLClient(
-    debug=True,
-    timeout=30,
+import importlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Set
+
+import nhl_events
+import nhl_populate_dim_player
+from nhl_db import get_conn, put_conn
+from nhl_dimcache import dim_cache
+from nhl_game_state import OFFICIAL_STATES, STARTED_STATES
+from nhl_load_state import (
+    PayloadHashes,
+    get_watermark,
+    set_watermark,
+    settled_watermark,
 )
 
+# Tiedostonimessä on väliviiva, joten tavallinen import ei käy.
+loader = importlib.import_module("nhl_loader_2025-26")
+
 
 # ---------------------------------------------------------------------------
-# COMMON NAME HELPERS
+# KONFIGURAATIO
 # ---------------------------------------------------------------------------
 
-def _extract_name_from_dict_or_str(name_obj: Any) -> str | None:
-    """
-    For roster payload:
-      - {'default': 'Nathan'}  (usual format)
-      - 'Nathan'
-      - None
-    """
-    if not name_obj:
-        return None
-    if isinstance(name_obj, dict):
-        return name_obj.get("default") or next(iter(name_obj.values()), None)
-    if isinstance(name_obj, str):
-        return name_obj
-    return None
+SEASON_CODE = loader.SEASON_CODE
 
+# Aikataulu haetaan välillä [vesiraja - LOOKBACK, tänään + LOOKAHEAD]
+SCHEDULE_LOOKBACK_DAYS = 2
+SCHEDULE_LOOKAHEAD_DAYS = 7
 
-def _split_full_name(full_name: str | None) -> Tuple[str | None, str | None]:
-    """
-    Naive split: first token = first_name, rest = last_name.
-    Good enough for ETL purposes.
-    """
-    if not full_name:
-        return None, None
-    parts = full_name.strip().split()
-    if len(parts) == 1:
-        return parts[0], None
-    return parts[0], " ".join(parts[1:])
+# Vesiraja ohittaa vain viralliset (OFF) pelit: FINAL-tilaisen pelin
+# tilastoja voidaan vielä korjata. Peli, jolla ei ole tallennettua tilaa,
+# katsotaan valmiiksi kun sen alusta on kulunut näin kauan.
+SETTLE_AFTER = "1 day"
 
 
 # ---------------------------------------------------------------------------
-# NORMALIZERS
+# VAIHEET
 # ---------------------------------------------------------------------------
 
-def normalize_roster_player(p: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Player dict from team_roster() -> normalized flat dict.
-
-    Example roster player:
-
-      {
-        "id": 8479414,
-        "firstName": {"default": "Nathan"},
-        "lastName": {"default": "Bastian"},
-        "sweaterNumber": 14,
-        "positionCode": "R",
-        "shootsCatches": "R",
-        "birthDate": "1997-12-06",
-        ...
-      }
-    """
-    player_id = int(p["id"])
+def update_schedule(conn) -> None:
+    watermark = get_watermark(conn, "schedule")
+    today = date.today()
 
-    first_name = _extract_name_from_dict_or_str(p.get("firstName"))
-    last_name = _extract_name_from_dict_or_str(p.get("lastName"))
+    start = loader.SEASON_START_DATE
+    if watermark is not None:
+        start = max(start, watermark.date() - timedelta(days=SCHEDULE_LOOKBACK_DAYS))
+    end = min(loader.SEASON_END_DATE, today + timedelta(days=SCHEDULE_LOOKAHEAD_DAYS))
 
-    if first_name or last_name:
-        full_name = f"{(first_name or '').strip()} {(last_name or '').strip()}".strip()
-    else:
-        full_name = None
+    if start > end:
+        print(f"[schedule] ei haettavaa ({start.isoformat()} > {end.isoformat()}).")
+        return
 
-    birth_date = p.get("birthDate")          # YYYY-MM-DD string or None
-    shoots_catches = p.get("shootsCatches")  # 'L', 'R', or None
+    print(f"[schedule] haetaan aikataulu {start.isoformat()} – {end.isoformat()}")
+    games = loader.fetch_season_schedule(start, end)
+    if games:
+        loader.upsert_games(conn, games)
 
-    return {
-        "player_id": player_id,
-        "first_name": first_name,
-        "last_name": last_name,
-        "full_name": full_name,
-        "birth_date": birth_date,
-        "shoots_catches": shoots_catches,
-    }
+    set_watermark(conn, "schedule", datetime.now(timezone.utc))
+    conn.commit()
+    print(f"[schedule] {len(games)} peliä upsertattu.")
 
 
-def normalize_stats_player(p: Dict[str, Any]) -> Dict[str, Any]:
+def update_boxscores(conn) -> Set[str]:
     """
-    Player dict from stats.skater_stats_summary / goalie_stats_summary.
-
-    Typical skater stats row contains (among others):
-      - playerId
-      - skaterFullName
-    Typical goalie stats row contains:
-      - playerId
-      - goalieFullName
-
-    Bio fields like birthDate and shootsCatches may or may not be present.
+    Palauttaa käsiteltyjen pelien joukkueiden lyhenteet dim_player-vaihetta
+    varten.
     """
-    raw_player_id = (
-        p.get("playerId")
-        or p.get("skaterId")
-        or p.get("goalieId")
-    )
-    if raw_player_id is None:
-        raise ValueError(f"stats player row missing playerId: {p}")
-
-    player_id = int(raw_player_id)
-
-    full_name = (
-        p.get("skaterFullName")
-        or p.get("goalieFullName")
-        or p.get("playerName")
-    )
-
-    first_name, last_name = _split_full_name(full_name)
-
-    birth_date = p.get("birthDate")          # may be missing
-    shoots_catches = p.get("shootsCatches")  # may be missing
-
-    return {
-        "player_id": player_id,
-        "first_name": first_name,
-        "last_name": last_name,
-        "full_name": full_name,
-        "birth_date": birth_date,
-        "shoots_catches": shoots_catches,
-    }
+    watermark = get_watermark(conn, "boxscores")
 
-
-# ---------------------------------------------------------------------------
-# UPSERT INTO dim_player (NORMALIZED)
-# ---------------------------------------------------------------------------
-
-def upsert_player_normalized(conn, p: Dict[str, Any]) -> None:
-    """
-    Upsert a single normalized player into nhl_dw.dim_player using natural player_id.
-
-    p must contain:
-      - player_id
-      - full_name
-      - first_name
-      - last_name
-      - birth_date (YYYY-MM-DD or None)
-      - shoots_catches
-    """
     with conn.cursor() as cur:
         cur.execute(
-            """
-            INSERT INTO nhl_dw.dim_player (
-                player_id,
-                full_name,
-                first_name,
-                last_name,
-                birth_date,
-                shoots_catches
-            )
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (player_id) DO UPDATE
-            SET full_name      = COALESCE(EXCLUDED.full_name, nhl_dw.dim_player.full_name),
-                first_name     = COALESCE(EXCLUDED.first_name, nhl_dw.dim_player.first_name),
-                last_name      = COALESCE(EXCLUDED.last_name, nhl_dw.dim_player.last_name),
-                birth_date     = COALESCE(EXCLUDED.birth_date, nhl_dw.dim_player.birth_date),
-                shoots_catches = COALESCE(EXCLUDED.shoots_catches, nhl_dw.dim_player.shoots_catches);
+            f"""
+            SELECT g.game_id, g.home_team_id, g.away_team_id, g.game_date,
+                   (g.game_state = ANY(%(final)s)
+                    OR (g.game_state IS NULL
+                        AND g.game_date < now() - interval '{SETTLE_AFTER}')) AS is_final,
+                   h.abbreviation, a.abbreviation
+            FROM games g
+            JOIN teams h ON h.team_id = g.home_team_id
+            JOIN teams a ON a.team_id = g.away_team_id
+            WHERE g.season = %(season)s
+              AND (g.game_state = ANY(%(started)s)
+                   OR (g.game_state IS NULL AND g.game_date <= now()))
+              AND (%(watermark)s::timestamptz IS NULL OR g.game_date > %(watermark)s)
+            ORDER BY g.game_date, g.game_id;
             """,
-            (
-                p["player_id"],
-                p["full_name"],
-                p["first_name"],
-                p["last_name"],
-                p["birth_date"],
-                p["shoots_catches"],
-            ),
+            {
+                "final": sorted(OFFICIAL_STATES),
+                "started": sorted(STARTED_STATES),
+                "season": SEASON_CODE,
+                "watermark": watermark,
+            },
         )
+        rows = cur.fetchall()
 
+    print(f"[boxscores] {len(rows)} peliä vesirajan {watermark} jälkeen.")
+    if not rows:
+        return set()
 
-def upsert_player_from_roster(conn, raw_player: Dict[str, Any]) -> None:
-    p = normalize_roster_player(raw_player)
-    upsert_player_normalized(conn, p)
-
+    failed = set(loader.load_player_stats_for_games(conn, [(r[0], r[1], r[2]) for r in rows]))
 
-def upsert_player_from_stats(conn, raw_player: Dict[str, Any]) -> None:
-    p = normalize_stats_player(raw_player)
-    upsert_player_normalized(conn, p)
+    # Hakematta jääneet pelit pitävät vesirajan paikallaan kuten kesken olevat
+    new_watermark = settled_watermark(
+        ((r[3], bool(r[4]) and r[0] not in failed) for r in rows),
+        watermark,
+    )
+    set_watermark(conn, "boxscores", new_watermark)
+    conn.commit()
+    print(f"[boxscores] uusi vesiraja {new_watermark}.")
 
+    return {r[5] for r in rows} | {r[6] for r in rows}
 
-# ---------------------------------------------------------------------------
-# ROSTER ITERATOR
-# ---------------------------------------------------------------------------
 
-def iter_roster_players(roster: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+def update_events(conn) -> None:
     """
-    Flatten roster['forwards'], roster['defensemen'], roster['goalies'] into
-    a single stream of player dicts.
+    event_play-rivit vesirajan jälkeen alkaneille peleille. Kesken olevat
+    pelit ladataan myös; ne korvautuvat seuraavalla ajolla.
     """
-    if not roster:
-        return []
-
-    groups = []
-    for key in ("forwards", "defensemen", "goalies"):
-        group = roster.get(key)
-        if group:
-            groups.append(group)
+    season_key = dim_cache.season_key(conn, SEASON_CODE)
+    if season_key is None:
+        print(f"[events] kautta {SEASON_CODE} ei löydy nhl_dw.dim_season-taulusta.")
+        return
 
-    for group in groups:
-        for player in group:
-            yield player
+    watermark = get_watermark(conn, "events")
 
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT game_key, game_id, start_time_utc,
+                   (game_state = ANY(%(final)s)
+                    OR (game_state IS NULL
+                        AND start_time_utc < now() - interval '{SETTLE_AFTER}')) AS is_final
+            FROM nhl_dw.fact_game
+            WHERE season_key = %(season_key)s
+              AND (game_state = ANY(%(started)s)
+                   OR (game_state IS NULL AND start_time_utc <= now()))
+              AND (%(watermark)s::timestamptz IS NULL OR start_time_utc > %(watermark)s)
+            ORDER BY start_time_utc, game_id;
+            """,
+            {
+                "final": sorted(OFFICIAL_STATES),
+                "started": sorted(STARTED_STATES),
+                "season_key": season_key,
+                "watermark": watermark,
+            },
+        )
+        rows = cur.fetchall()
 
-# ---------------------------------------------------------------------------
-# LOADERS
-# ---------------------------------------------------------------------------
-
-def load_players_from_rosters(conn) -> None:
-    """
-    For all current teams from client.teams.teams():
-      - call team_roster(team_abbr=..., season=SEASON_ID)
-      - upsert all players into dim_player
-    """
-    teams = client.teams.teams()
-    total_rows = 0
-    unique_ids: Set[int] = set()
-
-    for t in teams:
-        team_abbr = t["abbr"]
-        team_name = t["name"]
-
-        print(f"[ROSTER] {team_abbr} – fetching roster for season {SEASON_ID}...")
-        roster = client.teams.team_roster(team_abbr=team_abbr, season=SEASON_ID)
-
-        count_for_team = 0
-        for raw_player in iter_roster_players(roster):
-            upsert_player_from_roster(conn, raw_player)
-            total_rows += 1
-            count_for_team += 1
-            pid = int(raw_player["id"])
-            unique_ids.add(pid)
-
-        print(f"[ROSTER] {team_abbr} ({team_name}) – {count_for_team} players processed")
-
-    print(
-        f"[ROSTER] dim_player: processed {total_rows} roster rows, "
-        f"{len(unique_ids)} unique player_ids."
-    )
-
+    new_watermark = settled_watermark(((r[2], bool(r[3])) for r in rows), watermark)
+    games = [(game_key, game_id) for game_key, game_id, _, _ in rows]
+    print(f"[events] {len(games)} peliä vesirajan {watermark} jälkeen.")
 
-def load_players_from_stats(conn) -> None:
-    """
-    Use stats.skater_stats_summary + goalie_stats_summary to capture
-    ALL players with stats in the season range, even if not currently
-    on a roster.
-
-    This covers:
-      - Players traded mid-season
-      - Players sent down / not on current roster
-      - Short-term call-ups
-    """
-    print(f"[STATS] Fetching skater stats for seasons {STATS_START_SEASON}-{STATS_END_SEASON}...")
-    skater_stats = client.stats.skater_stats_summary(
-        start_season=STATS_START_SEASON,
-        end_season=STATS_END_SEASON,
-    )
+    hashes = PayloadHashes(conn, "play-by-play", "events", [g for _, g in games])
+    # Virhe keskeyttää vaiheen, jotta vesiraja ei ohita lataamattomia pelejä
+    count = nhl_events.stream_events_for_games(conn, season_key, games, hashes, stop_on_error=True)
+    print(f"[events] kopioitu {count} tapahtumaa.")
+    print(f"[events] ohitettiin {hashes.skipped} muuttumatonta peliä.")
 
-    skater_count = 0
-    skater_ids: Set[int] = set()
-    for row in skater_stats:
-        upsert_player_from_stats(conn, row)
-        raw_id = row.get("playerId") or row.get("skaterId")
-        if raw_id is not None:
-            skater_ids.add(int(raw_id))
-        skater_count += 1
-
-    print(f"[STATS] Skaters: processed {skater_count} rows, {len(skater_ids)} unique player_ids.")
-
-    print(f"[STATS] Fetching goalie stats for seasons {STATS_START_SEASON}-{STATS_END_SEASON}...")
-    goalie_stats = client.stats.goalie_stats_summary(
-        start_season=STATS_START_SEASON,
-        end_season=STATS_END_SEASON,
-    )
+    set_watermark(conn, "events", new_watermark)
+    conn.commit()
+    print(f"[events] uusi vesiraja {new_watermark}.")
 
-    goalie_count = 0
-    goalie_ids: Set[int] = set()
-    for row in goalie_stats:
-        upsert_player_from_stats(conn, row)
-        raw_id = row.get("playerId") or row.get("goalieId")
-        if raw_id is not None:
-            goalie_ids.add(int(raw_id))
-        goalie_count += 1
 
-    print(f"[STATS] Goalies: processed {goalie_count} rows, {len(goalie_ids)} unique player_ids.")
+def update_dim_player(conn, team_abbrs: Set[str]) -> None:
+    watermark = get_watermark(conn, "dim_player")
 
+    if watermark is None:
+        print("[dim_player] ei aiempaa latausta, ladataan kaikki pelaajat.")
+        nhl_populate_dim_player.load_all_players(conn)
+    else:
+        print(f"[dim_player] päivitetään rosterit {len(team_abbrs)} joukkueelle.")
+        nhl_populate_dim_player.load_players_from_rosters(conn, [SEASON_CODE], team_abbrs)
 
-def load_all_players(conn) -> None:
-    """
-    Full pipeline:
-      1) Load from rosters -> good bio fields for current players.
-      2) Load from stats -> ensures all players with stats in the season
-         range exist in dim_player, even if not on any current roster.
-    """
-    load_players_from_rosters(conn)
-    load_players_from_stats(conn)
+    set_watermark(conn, "dim_player", datetime.now(timezone.utc))
     conn.commit()
 
 
@@ -367,13 +208,22 @@ def load_all_players(conn) -> None:
 # ---------------------------------------------------------------------------
 
 def main():
-    print("=== Populating nhl_dw.dim_player from rosters + stats ===")
     conn = get_conn()
     try:
-        load_all_players(conn)
+        print("=== Inkrementaalinen lataus: aikataulu ===")
+        update_schedule(conn)
+
+        print("=== Inkrementaalinen lataus: boxscoret ===")
+        team_abbrs = update_boxscores(conn)
+
+        print("=== Inkrementaalinen lataus: tapahtumat ===")
+        update_events(conn)
+
+        print("=== Inkrementaalinen lataus: dim_player ===")
+        update_dim_player(conn, team_abbrs)
+
     finally:
-        conn.close()
-        print("DB connection closed.")
+        put_conn(conn)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+nhl_parallel.py
+
+Helpers for fetching NHL API payloads concurrently while keeping the
+database writes in a single thread.
+
+The NHL API calls are network bound, so a small thread pool is enough to
+keep several requests in flight. Results are yielded back in the same
+order as the input so that the writer sees exactly the same sequence as
+the serial loop would.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def fetch_in_order(
+    items: Iterable[T],
+    fetch: Callable[[T], Any],
+    workers: int = 8,
+    prefetch: int | None = None,
+) -> Iterator[Tuple[T, Any]]:
+    """
+    Yield (item, fetch(item)) pairs in input order.
+
+    With workers <= 1 this is a plain serial loop. Otherwise at most
+    `prefetch` fetches (default 2 * workers) are in flight at a time, so
+    memory stays bounded even for a full season of boxscores.
+
+    An exception raised by fetch(item) is re-raised when that item's turn
+    comes, exactly where the serial loop would have raised it.
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, fetch(item)
+        return
+
+    window = prefetch or workers * 2
+    pending: deque = deque()
+    it = iter(items)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in it:
+                pending.append((item, executor.submit(fetch, item)))
+                if len(pending) >= window:
+                    head, future = pending.popleft()
+                    yield head, future.result()
+
+            while pending:
+                head, future = pending.popleft()
+                yield head, future.result()
+        finally:
+            # Caller stopped early or a fetch failed: don't start new work.
+            for _, future in pending:
+                future.cancel()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+nhl_pipeline.py
+
+Staged producer/consumer pipeline for the loaders:
+
+    fetch (N threads) -> normalize (M threads) -> write (caller's thread)
+
+Stages are connected by bounded queues. At most `max_in_flight` items
+are between "picked up by a fetch worker" and "handed to the writer",
+so a slow database stalls the fetchers instead of piling payloads up in
+memory, and a slow API leaves the writer waiting on the next item
+instead of the other way round. While the writer flushes a batch, the
+fetchers keep fetching.
+
+The writer is the loop consuming the generator, so all database work
+stays in one thread and one connection:
+
+    for row, (digest, rows) in run_pipeline(
+        games,
+        fetch=lambda g: fetch_boxscore(g[0]),
+        normalize=lambda g, boxscore: (payload_hash(boxscore), rows_for(g, boxscore)),
+    ):
+        ... add rows to batches, flush when full ...
+
+Items come out in input order, so the writes are the same as in a
+serial loop. An exception from fetch or normalize is re-raised when that
+item's turn comes, like fetch_in_order does.
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, Tuple, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_NORMALIZE_WORKERS = 2
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def run_pipeline(
+    items: Iterable[T],
+    fetch: Callable[[T], Any],
+    normalize: Callable[[T, Any], Any] | None = None,
+    fetch_workers: int = DEFAULT_FETCH_WORKERS,
+    normalize_workers: int = DEFAULT_NORMALIZE_WORKERS,
+    max_in_flight: int | None = None,
+) -> Iterator[Tuple[T, Any]]:
+    """
+    Yield (item, normalize(item, fetch(item))) in input order; without
+    normalize, (item, fetch(item)).
+
+    max_in_flight (default 2 * (fetch_workers + normalize_workers)) bounds
+    the items held by the pipeline at any time, including those waiting
+    for an earlier item to be written.
+    """
+    fetch_workers = max(fetch_workers, 1)
+    normalize_workers = max(normalize_workers, 1) if normalize is not None else 0
+    max_in_flight = max(max_in_flight or 2 * (fetch_workers + normalize_workers), 1)
+
+    slots = threading.Semaphore(max_in_flight)
+    stop = threading.Event()
+
+    # Sized for max_in_flight items plus the end markers, so a put never blocks
+    to_fetch: queue.Queue = queue.Queue(maxsize=max_in_flight + fetch_workers)
+    to_normalize: queue.Queue = queue.Queue(maxsize=max_in_flight + normalize_workers)
+    to_write: queue.Queue = queue.Queue(maxsize=max_in_flight + 1)
+
+    feed_error: list[BaseException] = []
+    lock = threading.Lock()
+    running = {"fetch": fetch_workers, "normalize": normalize_workers}
+
+    def _stage_done(stage: str, downstream: queue.Queue, markers: int) -> None:
+        with lock:
+            running[stage] -= 1
+            last = running[stage] == 0
+        if last:
+            for _ in range(markers):
+                downstream.put(_DONE)
+
+    def feeder():
+        try:
+            for seq, item in enumerate(items):
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                to_fetch.put((seq, item, None))
+        except BaseException as e:
+            feed_error.append(e)
+        finally:
+            for _ in range(fetch_workers):
+                to_fetch.put(_DONE)
+
+    def fetcher():
+        out = to_normalize if normalize is not None else to_write
+        while True:
+            job = to_fetch.get()
+            if job is _DONE:
+                break
+            seq, item, _ = job
+            if stop.is_set():
+                result = None
+            else:
+                try:
+                    result = fetch(item)
+                except BaseException as e:
+                    result = _Failed(e)
+            out.put((seq, item, result))
+        _stage_done("fetch", out, normalize_workers if normalize is not None else 1)
+
+    def normalizer():
+        while True:
+            job = to_normalize.get()
+            if job is _DONE:
+                break
+            seq, item, payload = job
+            if not stop.is_set() and not isinstance(payload, _Failed):
+                try:
+                    payload = normalize(item, payload)
+                except BaseException as e:
+                    payload = _Failed(e)
+            to_write.put((seq, item, payload))
+        _stage_done("normalize", to_write, 1)
+
+    threads = [threading.Thread(target=feeder, name="pipeline-feed", daemon=True)]
+    threads += [
+        threading.Thread(target=fetcher, name=f"pipeline-fetch-{i}", daemon=True)
+        for i in range(fetch_workers)
+    ]
+    threads += [
+        threading.Thread(target=normalizer, name=f"pipeline-normalize-{i}", daemon=True)
+        for i in range(normalize_workers)
+    ]
+    for t in threads:
+        t.start()
+
+    # Reorder buffer: results that overtook an earlier item
+    ready: dict[int, Tuple[T, Any]] = {}
+    next_seq = 0
+    try:
+        while True:
+            job = to_write.get()
+            if job is _DONE:
+                break
+            seq, item, result = job
+            ready[seq] = (item, result)
+
+            while next_seq in ready:
+                item, result = ready.pop(next_seq)
+                next_seq += 1
+                if isinstance(result, _Failed):
+                    raise result.exc
+                yield item, result
+                # Freed only once the writer is done with the item
+                slots.release()
+
+        if feed_error:
+            raise feed_error[0]
+    finally:
+        # Writer stopped early or failed: no new work, let the threads drain.
+        stop.set()
@@ -19,21 +19,21 @@ Expected dim_player schema (minimum):
   );
 """
 
+import argparse
 from typing import Dict, Any, Iterable
 
-import psycopg2
-from nhlpy import NHLClient
+from nhl_http import NHLApiClient
+from psycopg2.extras import execute_values
+
+from nhl_db import CommitPolicy, get_conn, put_conn
+from nhl_dimcache import dim_cache
+from nhl_governor import GovernedClient
+from nhl_parallel import fetch_in_order
 
 # ---------------------------------------------------------------------------
 # CONFIG
 # ---------------------------------------------------------------------------
 
-DB_HOST = "localhost"
-DB_PORT = 5432
-DB_NAME = "nhl_db"
-DB_USER = "nhl_user"
-DB_PASSWORD = "strongpassword"  # change to your own
-
 # Choose which season's players you want to cover (YYYYYYYY format)
 # This will be used for BOTH rosters and stats summaries.
 SEASON_ID = "20252026"  # e.g. 2025–26 season
@@ -42,29 +42,18 @@ SEASON_ID = "20252026"  # e.g. 2025–26 season
 STATS_START_SEASON = SEASON_ID
 STATS_END_SEASON = SEASON_ID
 
+# Concurrent team_roster fetches (32 teams per season)
+ROSTER_WORKERS = 8
 
-# ---------------------------------------------------------------------------
-# DB CONNECTION
-# ---------------------------------------------------------------------------
-
-def get_conn():
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-    )
+# Players per upsert statement
+UPSERT_PAGE_SIZE = 1000
 
 
 # ---------------------------------------------------------------------------
 # NHL CLIENT
 # ---------------------------------------------------------------------------
 
-client = NHLClient(
-    debug=True,
-    timeout=30,
-)
+client = GovernedClient(NHLApiClient(pool_size=ROSTER_WORKERS, timeout=30))
 
 
 # ---------------------------------------------------------------------------
@@ -195,14 +184,74 @@ def normalize_stats_player(p: Dict[str, Any]) -> Dict[str, Any]:
 
 
 # ---------------------------------------------------------------------------
-# UPSERT INTO dim_player (NORMALIZED)
+# MERGE + UPSERT INTO dim_player (NORMALIZED)
 # ---------------------------------------------------------------------------
 
-def upsert_player_normalized(conn, p: Dict[str, Any]):
+PLAYER_FIELDS = ("full_name", "first_name", "last_name", "birth_date", "shoots_catches")
+
+PLAYERS_UPSERT_SQL = """
+    INSERT INTO nhl_dw.dim_player (
+        player_id,
+        full_name,
+        first_name,
+        last_name,
+        birth_date,
+        shoots_catches
+    )
+    VALUES %s
+    ON CONFLICT (player_id) DO UPDATE
+    SET full_name      = COALESCE(EXCLUDED.full_name, nhl_dw.dim_player.full_name),
+        first_name     = COALESCE(EXCLUDED.first_name, nhl_dw.dim_player.first_name),
+        last_name      = COALESCE(EXCLUDED.last_name, nhl_dw.dim_player.last_name),
+        birth_date     = COALESCE(EXCLUDED.birth_date, nhl_dw.dim_player.birth_date),
+        shoots_catches = COALESCE(EXCLUDED.shoots_catches, nhl_dw.dim_player.shoots_catches),
+        updated_at     = now()
+    WHERE (nhl_dw.dim_player.full_name, nhl_dw.dim_player.first_name,
+           nhl_dw.dim_player.last_name, nhl_dw.dim_player.birth_date,
+           nhl_dw.dim_player.shoots_catches)
+          IS DISTINCT FROM
+          (COALESCE(EXCLUDED.full_name, nhl_dw.dim_player.full_name),
+           COALESCE(EXCLUDED.first_name, nhl_dw.dim_player.first_name),
+           COALESCE(EXCLUDED.last_name, nhl_dw.dim_player.last_name),
+           COALESCE(EXCLUDED.birth_date, nhl_dw.dim_player.birth_date),
+           COALESCE(EXCLUDED.shoots_catches, nhl_dw.dim_player.shoots_catches))
+    RETURNING player_id, player_key, (xmax = 0);
+"""
+
+
+def merge_player(players: Dict[int, Dict[str, Any]], p: Dict[str, Any]) -> None:
     """
-    Upsert a single normalized player into nhl_dw.dim_player using natural player_id.
+    Merge a normalized player into players (player_id -> player). A later
+    non-null field wins over an earlier one, exactly like a sequence of
+    COALESCE upserts would leave the row: loading rosters first and stats
+    second keeps stats names but roster bio fields the stats lack.
+    """
+    old = players.get(p["player_id"])
+    if old is None:
+        players[p["player_id"]] = dict(p)
+        return
+    for field in PLAYER_FIELDS:
+        if p[field] is not None:
+            old[field] = p[field]
+
+
+def upsert_players_normalized(
+    conn,
+    players: Iterable[Dict[str, Any]],
+    policy: CommitPolicy | None = None,
+    page_size: int = UPSERT_PAGE_SIZE,
+) -> int:
+    """
+    Upsert normalized players into nhl_dw.dim_player, page_size players
+    per statement, keyed on the natural player_id. Existing non-null
+    fields are kept where the new value is null; players whose row
+    wouldn't change are not rewritten. Returns the number of inserted or
+    updated players.
+
+    Does not commit without a policy. With one, every page is added to it
+    and committed when the policy is due; the caller commits the rest.
 
-    p must contain:
+    Each player must contain:
       - player_id
       - full_name
       - first_name
@@ -210,34 +259,39 @@ def upsert_player_normalized(conn, p: Dict[str, Any]):
       - birth_date (YYYY-MM-DD or None)
       - shoots_catches
     """
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO nhl_dw.dim_player (
-                player_id,
-                full_name,
-                first_name,
-                last_name,
-                birth_date,
-                shoots_catches
-            )
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (player_id) DO UPDATE
-            SET full_name      = COALESCE(EXCLUDED.full_name, nhl_dw.dim_player.full_name),
-                first_name     = COALESCE(EXCLUDED.first_name, nhl_dw.dim_player.first_name),
-                last_name      = COALESCE(EXCLUDED.last_name, nhl_dw.dim_player.last_name),
-                birth_date     = COALESCE(EXCLUDED.birth_date, nhl_dw.dim_player.birth_date),
-                shoots_catches = COALESCE(EXCLUDED.shoots_catches, nhl_dw.dim_player.shoots_catches);
-            """,
-            (
-                p["player_id"],
-                p["full_name"],
-                p["first_name"],
-                p["last_name"],
-                p["birth_date"],
-                p["shoots_catches"],
-            ),
-        )
+    rows = [(p["player_id"], *(p[f] for f in PLAYER_FIELDS)) for p in players]
+    if not rows:
+        return 0
+
+    result = []
+    for start in range(0, len(rows), page_size):
+        page = rows[start:start + page_size]
+        with conn.cursor() as cur:
+            written = execute_values(cur, PLAYERS_UPSERT_SQL, page, page_size=len(page), fetch=True)
+
+        # Keep the process-wide player_id -> player_key cache in sync. Unchanged
+        # players aren't returned; their keys are looked up when first needed.
+        for player_id, player_key, _ in written:
+            dim_cache.put("player_key", player_id, player_key)
+        result.extend(written)
+
+        if policy is not None:
+            policy.add(rows=len(written))
+            policy.maybe_commit(conn)
+
+    inserted = sum(1 for *_, is_insert in result if is_insert)
+    print(
+        f"nhl_dw.dim_player: {inserted} inserted, {len(result) - inserted} updated, "
+        f"{len(rows) - len(result)} unchanged"
+    )
+    return len(result)
+
+
+def upsert_player_normalized(conn, p: Dict[str, Any]):
+    """
+    Upsert a single normalized player.
+    """
+    upsert_players_normalized(conn, [p])
 
 
 def upsert_player_from_roster(conn, raw_player: Dict[str, Any]):
@@ -277,40 +331,67 @@ def iter_roster_players(roster: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
 # LOADERS
 # ---------------------------------------------------------------------------
 
-def load_players_from_rosters(conn):
+def fetch_roster_or_skip(team_abbr: str, season: str) -> Dict[str, Any] | None:
     """
-    For all current teams from client.teams.teams():
-      - call team_roster(team_abbr=..., season=SEASON_ID)
-      - upsert all players into dim_player
+    None when the roster can't be fetched, e.g. a current team that didn't
+    exist yet in an older season (404) or an API that kept failing.
     """
-    teams = client.teams.teams()
-    total_rows = 0
-    unique_ids: set[int] = set()
+    try:
+        return client.teams.team_roster(team_abbr=team_abbr, season=season)
+    except Exception as e:
+        print(f"[ROSTER] {team_abbr} {season} – no roster: {e.__cause__ or e}")
+        return None
 
-    for t in teams:
-        team_abbr = t["abbr"]
-        team_name = t["name"]
 
-        print(f"[ROSTER] {team_abbr} – fetching roster for season {SEASON_ID}...")
-        roster = client.teams.team_roster(team_abbr=team_abbr, season=SEASON_ID)
+def collect_roster_players(
+    players: Dict[int, Dict[str, Any]],
+    seasons: Iterable[str] | None = None,
+    team_abbrs: Iterable[str] | None = None,
+    workers: int = ROSTER_WORKERS,
+) -> None:
+    """
+    Fetch team_roster(team_abbr=..., season=...) for every team and season
+    concurrently and merge all players into players (see merge_player).
+
+    seasons defaults to [SEASON_ID], team_abbrs to all current teams from
+    client.teams.teams(). Rosters are merged oldest season first, so the
+    newest roster's fields win.
+    """
+    seasons = sorted(seasons or [SEASON_ID])
+    if team_abbrs is None:
+        team_abbrs = [t["abbr"] for t in client.teams.teams()]
+    jobs = [(season, abbr) for season in seasons for abbr in sorted(team_abbrs)]
+    print(f"[ROSTER] fetching {len(jobs)} rosters ({len(seasons)} seasons) with {workers} workers...")
+
+    total_rows = 0
+    unique_ids: set[int] = set()
+    for (season, team_abbr), roster in fetch_in_order(
+        jobs, lambda job: fetch_roster_or_skip(job[1], job[0]), workers=workers
+    ):
+        if roster is None:
+            continue
 
         count_for_team = 0
         for raw_player in iter_roster_players(roster):
-            upsert_player_from_roster(conn, raw_player)
+            p = normalize_roster_player(raw_player)
+            merge_player(players, p)
             total_rows += 1
             count_for_team += 1
-            pid = int(raw_player["id"])
-            unique_ids.add(pid)
+            unique_ids.add(p["player_id"])
 
-        print(f"[ROSTER] {team_abbr} ({team_name}) – {count_for_team} players processed")
+        print(f"[ROSTER] {team_abbr} {season} – {count_for_team} players processed")
 
     print(
-        f"[ROSTER] dim_player: processed {total_rows} roster rows, "
+        f"[ROSTER] processed {total_rows} roster rows, "
         f"{len(unique_ids)} unique player_ids."
     )
 
 
-def load_players_from_stats(conn):
+def collect_stats_players(
+    players: Dict[int, Dict[str, Any]],
+    start_season: str = STATS_START_SEASON,
+    end_season: str = STATS_END_SEASON,
+) -> None:
     """
     Use stats.skater_stats_summary + goalie_stats_summary to capture
     ALL players with stats in the season range, even if not currently
@@ -321,49 +402,74 @@ def load_players_from_stats(conn):
       - Players sent down / not on current roster
       - Short-term call-ups
     """
-    print(f"[STATS] Fetching skater stats for seasons {STATS_START_SEASON}-{STATS_END_SEASON}...")
-    skater_stats = client.stats.skater_stats_summary(
-        start_season=STATS_START_SEASON,
-        end_season=STATS_END_SEASON,
-    )
-
-    skater_count = 0
-    skater_ids: set[int] = set()
-    for row in skater_stats:
-        upsert_player_from_stats(conn, row)
-        pid = int(row.get("playerId") or row.get("skaterId"))
-        skater_ids.add(pid)
-        skater_count += 1
-
-    print(f"[STATS] Skaters: processed {skater_count} rows, {len(skater_ids)} unique player_ids.")
-
-    print(f"[STATS] Fetching goalie stats for seasons {STATS_START_SEASON}-{STATS_END_SEASON}...")
-    goalie_stats = client.stats.goalie_stats_summary(
-        start_season=STATS_START_SEASON,
-        end_season=STATS_END_SEASON,
-    )
+    for kind, label, fetch in (
+        ("skater", "Skaters", client.stats.skater_stats_summary),
+        ("goalie", "Goalies", client.stats.goalie_stats_summary),
+    ):
+        print(f"[STATS] Fetching {kind} stats for seasons {start_season}-{end_season}...")
+        rows = fetch(start_season=start_season, end_season=end_season)
+
+        count = 0
+        ids: set[int] = set()
+        for row in rows:
+            p = normalize_stats_player(row)
+            merge_player(players, p)
+            ids.add(p["player_id"])
+            count += 1
+
+        print(f"[STATS] {label}: processed {count} rows, {len(ids)} unique player_ids.")
+
+
+def load_players_from_rosters(
+    conn,
+    seasons: Iterable[str] | None = None,
+    team_abbrs: Iterable[str] | None = None,
+    workers: int = ROSTER_WORKERS,
+):
+    """
+    Rosters only, one bulk upsert for all teams and seasons. Does not
+    commit.
+    """
+    players: Dict[int, Dict[str, Any]] = {}
+    collect_roster_players(players, seasons, team_abbrs, workers)
+    upsert_players_normalized(conn, players.values())
 
-    goalie_count = 0
-    goalie_ids: set[int] = set()
-    for row in goalie_stats:
-        upsert_player_from_stats(conn, row)
-        pid = int(row.get("playerId") or row.get("goalieId"))
-        goalie_ids.add(pid)
-        goalie_count += 1
 
-    print(f"[STATS] Goalies: processed {goalie_count} rows, {len(goalie_ids)} unique player_ids.")
+def load_players_from_stats(conn):
+    players: Dict[int, Dict[str, Any]] = {}
+    collect_stats_players(players)
+    upsert_players_normalized(conn, players.values())
 
 
-def load_all_players(conn):
+def load_all_players(
+    conn,
+    seasons: Iterable[str] | None = None,
+    workers: int = ROSTER_WORKERS,
+    policy: CommitPolicy | None = None,
+):
     """
     Full pipeline:
-      1) Load from rosters -> good bio fields for current players.
-      2) Load from stats -> ensures all players with stats in the season
-         range exist in dim_player, even if not on any current roster.
+      1) Rosters -> good bio fields for current players.
+      2) Stats -> ensures all players with stats in the season range
+         exist in dim_player, even if not on any current roster.
+
+    seasons: roster seasons, default [SEASON_ID]. When given, the stats
+    range covers them too (first to last season).
+
+    Both sources are merged in memory (stats over roster, field by field,
+    non-null wins) and written with bulk upserts, so each player is
+    written once. Commits follow the policy (default:
+    CommitPolicy.from_config()) instead of one transaction for everything.
     """
-    load_players_from_rosters(conn)
-    load_players_from_stats(conn)
-    conn.commit()
+    policy = policy or CommitPolicy.from_config()
+    players: Dict[int, Dict[str, Any]] = {}
+    collect_roster_players(players, seasons, workers=workers)
+    if seasons:
+        collect_stats_players(players, min(seasons), max(seasons))
+    else:
+        collect_stats_players(players)
+    upsert_players_normalized(conn, players.values(), policy)
+    policy.commit(conn)
 
 
 # ---------------------------------------------------------------------------
@@ -371,13 +477,19 @@ def load_all_players(conn):
 # ---------------------------------------------------------------------------
 
 def main():
+    parser = argparse.ArgumentParser(description="Populate nhl_dw.dim_player from rosters + stats")
+    parser.add_argument("--season", action="append", dest="seasons",
+                        help=f"roster season, e.g. 20242025; repeatable (default {SEASON_ID})")
+    parser.add_argument("--workers", type=int, default=ROSTER_WORKERS,
+                        help="concurrent roster fetches")
+    args = parser.parse_args()
+
     print("=== Populating nhl_dw.dim_player from rosters + stats ===")
     conn = get_conn()
     try:
-        load_all_players(conn)
+        load_all_players(conn, args.seasons, workers=args.workers)
     finally:
-        conn.close()
-        print("DB connection closed.")
+        put_conn(conn)
 
 
 if __name__ == "__main__":
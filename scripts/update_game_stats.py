@@ -14,64 +14,39 @@ Päivittää player_game_stats-taulun seuraavat kentät boxscore-datasta:
 Olettaa, että player_game_stats-rivit (game_id, player_id) on jo olemassa.
 """
 
-from typing import Dict, Any, Iterable
+from typing import Dict, Any
 
-import psycopg2
-from nhlpy import NHLClient
+from nhl_http import NHLApiClient
+
+from nhl_batch import BatchUpserter, flush_all
+from nhl_boxscore import BoxscoreSink, get_started_games, iter_boxscore_players, process_boxscores
+from nhl_cache import PayloadCache
+from nhl_db import get_conn, put_conn
+from nhl_governor import GovernedClient, governor
 
 
 # ---------------------------------------------------------
-# DB-KONFIGURAATIO
+# KONFIGURAATIO
 # ---------------------------------------------------------
 
-DB_HOST = "localhost"
-DB_PORT = 5432
-DB_NAME = "nhl_db"
-DB_USER = "nhl_user"
-DB_PASSWORD = "strongpassword"  # vaihda omaksesi
-
 SEASON_CODE = "20252026"        # kauden tunniste games.season-kentässä
 
+UPDATE_BATCH_SIZE = 500         # riviä / UPDATE-lause, erä voi kattaa useita pelejä
+FETCH_WORKERS = 8               # rinnakkaisia boxscore-hakuja
+
 
 # ---------------------------------------------------------
-# YHTEYS JA NHL-CLIENT
+# NHL-CLIENT
 # ---------------------------------------------------------
 
-def get_conn():
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-    )
-
-
-client = NHLClient(debug=False, timeout=30)
+client = GovernedClient(NHLApiClient(pool_size=FETCH_WORKERS, timeout=30))
+payload_cache = PayloadCache()
 
 
 # ---------------------------------------------------------
 # APURIT
 # ---------------------------------------------------------
 
-def _iter_boxscore_players(team_block: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
-    """
-    Kerää kaikki pelaajat playerByGameStats['homeTeam'/'awayTeam'] -blockista.
-    """
-    if not team_block:
-        return []
-
-    groups = []
-    for key in ("forwards", "defensemen", "defense", "goalies"):
-        grp = team_block.get(key)
-        if grp:
-            groups.append(grp)
-
-    for grp in groups:
-        for player in grp:
-            yield player
-
-
 def _extract_player_id(player: Dict[str, Any]) -> int:
     """
     Hakee playerId-kentän boxscore-pelaajasta.
@@ -83,99 +58,142 @@ def _extract_player_id(player: Dict[str, Any]) -> int:
     raise KeyError(f"Ei playerId/id-avainetta pelaajassa: {list(player.keys())}")
 
 
+# ---------------------------------------------------------
+# ERÄPÄIVITYS
+# ---------------------------------------------------------
+
+STAT_FIELDS_UPDATE_SQL = """
+    UPDATE player_game_stats AS s
+    SET time_on_ice     = v.time_on_ice,
+        shots           = v.shots,
+        penalty_minutes = v.penalty_minutes,
+        faceoff_wins    = v.faceoff_wins,
+        faceoff_losses  = v.faceoff_losses,
+        updated_at      = now()
+    FROM (VALUES %s) AS v(
+        game_id, player_id,
+        time_on_ice, shots, penalty_minutes, faceoff_wins, faceoff_losses
+    )
+    WHERE s.game_id = v.game_id
+      AND s.player_id = v.player_id
+      AND (s.time_on_ice, s.shots, s.penalty_minutes, s.faceoff_wins, s.faceoff_losses)
+          IS DISTINCT FROM
+          (v.time_on_ice, v.shots, v.penalty_minutes, v.faceoff_wins, v.faceoff_losses)
+    RETURNING 1;
+"""
+
+# VALUES-listan sarakkeilla ei ole tyyppiä, joten NULL-arvot pitää castata.
+STAT_FIELDS_TEMPLATE = "(%s::bigint, %s::bigint, %s::text, %s::int, %s::int, %s::int, %s::int)"
+
+
+def new_stat_fields_batch(conn, batch_size: int = UPDATE_BATCH_SIZE) -> BatchUpserter:
+    return BatchUpserter(
+        conn,
+        STAT_FIELDS_UPDATE_SQL,
+        key=lambda r: (r[0], r[1]),
+        template=STAT_FIELDS_TEMPLATE,
+        batch_size=batch_size,
+    )
+
+
+def stat_fields_row(game_id: int, player_id: int, p: Dict[str, Any]) -> tuple:
+    return (
+        game_id,
+        player_id,
+        p.get("timeOnIce"),
+        p.get("shots"),
+        p.get("penaltyMinutes"),
+        p.get("faceoffWins"),
+        p.get("faceoffLosses"),
+    )
+
+
+def flush_stat_fields(conn, batch: BatchUpserter, *extra: BatchUpserter) -> int:
+    updated_rows, *_ = flush_all(conn, batch, *extra)
+    print(f"[ERÄ] päivitetty {updated_rows} riviä player_game_stats-taulussa.")
+    return updated_rows
+
+
 # ---------------------------------------------------------
 # PÄIVITYS YHDELLE PELILLE
 # ---------------------------------------------------------
 
-def update_stats_for_game(conn, game_id: int):
+def fetch_boxscore(game_id: int) -> Dict[str, Any]:
+    return payload_cache.fetch(
+        "boxscore",
+        {"game_id": int(game_id)},
+        lambda: client.game_center.boxscore(game_id=str(game_id)),
+    )
+
+
+def stat_fields_rows_for_game(game_id: int, boxscore: Dict[str, Any]) -> list[tuple]:
     """
-    Hakee boxscoren yhdelle pelille ja päivittää
-    player_game_stats-taulun lisäkentät tälle pelille.
+    Pelin pelaajien player_game_stats-lisäkentät riveinä. Ei koske
+    kantaan, joten ajetaan putken normalize-vaiheessa.
     """
-    boxscore = client.game_center.boxscore(game_id=str(game_id))
     pbs = boxscore.get("playerByGameStats", {})
 
     home_block = pbs.get("homeTeam", {})
     away_block = pbs.get("awayTeam", {})
 
-    updated_rows = 0
-
-    with conn.cursor() as cur:
-        # Kotijoukkueen pelaajat
-        for p in _iter_boxscore_players(home_block):
+    rows = []
+    for side, block in (("kotijoukkueen", home_block), ("vierasjoukkueen", away_block)):
+        for p in iter_boxscore_players(block):
             try:
                 player_id = _extract_player_id(p)
             except KeyError as e:
-                print(f"[WARN] game {game_id}: ei playerId kotijoukkueen pelaajalla: {e}")
+                print(f"[WARN] game {game_id}: ei playerId {side} pelaajalla: {e}")
                 continue
 
-            time_on_ice     = p.get("timeOnIce")
-            shots           = p.get("shots")
-            penalty_minutes = p.get("penaltyMinutes")
-            faceoff_wins    = p.get("faceoffWins")
-            faceoff_losses  = p.get("faceoffLosses")
-
-            cur.execute(
-                """
-                UPDATE player_game_stats
-                SET time_on_ice      = %s,
-                    shots           = %s,
-                    penalty_minutes = %s,
-                    faceoff_wins    = %s,
-                    faceoff_losses  = %s
-                WHERE game_id = %s
-                  AND player_id = %s;
-                """,
-                (
-                    time_on_ice,
-                    shots,
-                    penalty_minutes,
-                    faceoff_wins,
-                    faceoff_losses,
-                    game_id,
-                    player_id,
-                ),
-            )
-            updated_rows += cur.rowcount
-
-        # Vierasjoukkueen pelaajat
-        for p in _iter_boxscore_players(away_block):
-            try:
-                player_id = _extract_player_id(p)
-            except KeyError as e:
-                print(f"[WARN] game {game_id}: ei playerId vierasjoukkueen pelaajalla: {e}")
-                continue
+            rows.append(stat_fields_row(game_id, player_id, p))
+
+    return rows
+
+
+def add_stats_for_game(batch: BatchUpserter, game_id: int, boxscore: Dict[str, Any]) -> int:
+    """
+    Lisää pelin pelaajien player_game_stats-lisäkentät päivityserään.
+    Palauttaa erään lisättyjen rivien määrän.
+    """
+    rows = stat_fields_rows_for_game(game_id, boxscore)
+    for row in rows:
+        batch.add(row)
+    return len(rows)
+
+
+class StatFieldsSink(BoxscoreSink):
+    """
+    Boxscore-ajon kohde: player_game_stats-lisäkentät. Päivittää vain
+    olemassa olevia rivejä, joten samassa ajossa PlayerStatsSinkin on
+    oltava ennen tätä.
+    """
+
+    stage = "stat_fields"
+
+    def __init__(self, conn, batch_size: int = UPDATE_BATCH_SIZE):
+        super().__init__([new_stat_fields_batch(conn, batch_size)])
+        self.updated = 0
+
+    def rows(self, game, boxscore):
+        return stat_fields_rows_for_game(game[0], boxscore)
+
+    def add(self, game, rows):
+        for row in rows:
+            self.batches[0].add(row)
+
+    def report(self, counts):
+        self.updated += counts[0]
+        print(f"[ERÄ] päivitetty {counts[0]} riviä player_game_stats-taulussa.")
+
 
-            time_on_ice     = p.get("timeOnIce")
-            shots           = p.get("shots")
-            penalty_minutes = p.get("penaltyMinutes")
-            faceoff_wins    = p.get("faceoffWins")
-            faceoff_losses  = p.get("faceoffLosses")
-
-            cur.execute(
-                """
-                UPDATE player_game_stats
-                SET time_on_ice      = %s,
-                    shots           = %s,
-                    penalty_minutes = %s,
-                    faceoff_wins    = %s,
-                    faceoff_losses  = %s
-                WHERE game_id = %s
-                  AND player_id = %s;
-                """,
-                (
-                    time_on_ice,
-                    shots,
-                    penalty_minutes,
-                    faceoff_wins,
-                    faceoff_losses,
-                    game_id,
-                    player_id,
-                ),
-            )
-            updated_rows += cur.rowcount
-
-    conn.commit()
+def update_stats_for_game(conn, game_id: int):
+    """
+    Hakee boxscoren yhdelle pelille ja päivittää
+    player_game_stats-taulun lisäkentät tälle pelille.
+    """
+    batch = new_stat_fields_batch(conn)
+    add_stats_for_game(batch, game_id, fetch_boxscore(game_id))
+    updated_rows = flush_stat_fields(conn, batch)
     print(f"[GAME] {game_id}: päivitetty {updated_rows} riviä player_game_stats-taulussa.")
 
 
@@ -183,30 +201,33 @@ def update_stats_for_game(conn, game_id: int):
 # KAIKKI PELIT KAUSELTA
 # ---------------------------------------------------------
 
-def update_all_games_for_season(conn, season_code: str):
+def update_all_games_for_season(
+    conn,
+    season_code: str,
+    batch_size: int = UPDATE_BATCH_SIZE,
+    workers: int = FETCH_WORKERS,
+):
     """
-    Lukee games-taulusta kaikki kauden pelit ja päivittää
+    Lukee games-taulusta kauden alkaneet pelit ja päivittää
     player_game_stats-lisäkentät jokaiselle pelille.
+
+    Päivitykset kerätään useamman pelin yli ja kirjoitetaan yhdellä
+    UPDATE ... FROM (VALUES ...) -lauseella, kun erässä on batch_size riviä.
+    Pelit, joiden boxscore ei ole muuttunut edellisestä ajosta, ohitetaan.
+
+    Boxscoret haetaan ja käsitellään nhl_boxscore.process_boxscoresilla:
+    `workers` säiettä hakee, rivit muodostetaan omassa vaiheessaan sillä
+    aikaa, kun tämä säie kirjoittaa edellistä erää.
     """
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT game_id
-            FROM games
-            WHERE season = %s
-            ORDER BY game_date NULLS LAST, game_id;
-            """,
-            (season_code,),
-        )
-        games = [row[0] for row in cur.fetchall()]
+    games = get_started_games(conn, season_code)
 
     print(f"Löytyi {len(games)} peliä kaudelta {season_code}.")
 
-    for idx, game_id in enumerate(games, start=1):
-        print(f"[{idx}/{len(games)}] Päivitetään peli {game_id}...")
-        update_stats_for_game(conn, game_id)
+    sink = StatFieldsSink(conn, batch_size)
+    process_boxscores(conn, games, [sink], fetch_boxscore, workers=workers, batch_size=batch_size)
+    total_updated = sink.updated
 
-    print("=== VALMIS: player_game_stats lisäkentät päivitetty kaikille peleille ===")
+    print(f"=== VALMIS: player_game_stats lisäkentät päivitetty kaikille peleille ({total_updated} riviä) ===")
 
 
 # ---------------------------------------------------------
@@ -218,8 +239,9 @@ def main():
     try:
         update_all_games_for_season(conn, SEASON_CODE)
     finally:
-        conn.close()
-        print("Tietokantayhteys suljettu.")
+        put_conn(conn)
+        print(payload_cache.summary())
+        print(governor.summary())
 
 
 if __name__ == "__main__":
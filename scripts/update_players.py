@@ -3,7 +3,8 @@
 update_players.py
 
 Päivittää PostgreSQL-tietokannan `players`-taulun NHL:n
-joukkue-rosterien perusteella käyttäen nhl-api-py:n team_roster-metodia.
+joukkue-rosterien perusteella käyttäen nhl_http.NHLApiClientin
+team_roster-metodia.
 
 Rakenne roster-pelaajalle (esimerkki):
 
@@ -19,44 +20,32 @@ Rakenne roster-pelaajalle (esimerkki):
 }
 """
 
+import argparse
 from typing import Dict, Any, Iterable
 
-import psycopg2
-from nhlpy import NHLClient
+from nhl_http import NHLApiClient
+
+from nhl_batch import BatchUpserter, flush_all, print_summaries
+from nhl_db import get_conn, put_conn
+from nhl_governor import GovernedClient, governor
+from nhl_parallel import fetch_in_order
 
 
 # ---------------------------------------------------------
-# DATABASE CONFIG
+# CONFIG
 # ---------------------------------------------------------
 
-DB_HOST = "localhost"
-DB_PORT = 5432
-DB_NAME = "nhl_db"
-DB_USER = "nhl_user"
-DB_PASSWORD = "strongpassword"  # muuta tarvittaessa
-
 SEASON_CODE = "20252026"        # esim. "20252026"
 
-
-# ---------------------------------------------------------
-# DB CONNECTION
-# ---------------------------------------------------------
-
-def get_conn():
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-    )
+ROSTER_WORKERS = 8              # rinnakkaisia roster-hakuja
+UPSERT_BATCH_SIZE = 2000        # riviä / upsert-lause
 
 
 # ---------------------------------------------------------
 # NHL CLIENT
 # ---------------------------------------------------------
 
-client = NHLClient(debug=False, timeout=30)
+client = GovernedClient(NHLApiClient(pool_size=ROSTER_WORKERS, timeout=30))
 
 
 # ---------------------------------------------------------
@@ -127,9 +116,46 @@ def extract_player_id(player: Dict[str, Any]) -> int:
     raise KeyError(f"Pelaaja-ID:tä ei löytynyt. Avaimet: {list(player.keys())}")
 
 
-def upsert_player(cur, player: Dict[str, Any], team_id: int) -> None:
+PLAYERS_UPSERT_SQL = """
+    INSERT INTO players (
+        player_id,
+        full_name,
+        first_name,
+        last_name,
+        shoots_catches,
+        primary_position,
+        sweater_number,
+        birth_date,
+        current_team_id
+    )
+    VALUES %s
+    ON CONFLICT (player_id) DO UPDATE
+    SET full_name        = EXCLUDED.full_name,
+        first_name       = EXCLUDED.first_name,
+        last_name        = EXCLUDED.last_name,
+        shoots_catches   = EXCLUDED.shoots_catches,
+        primary_position = EXCLUDED.primary_position,
+        sweater_number   = EXCLUDED.sweater_number,
+        birth_date       = COALESCE(EXCLUDED.birth_date, players.birth_date),
+        current_team_id  = EXCLUDED.current_team_id,
+        updated_at       = now()
+    WHERE (players.full_name, players.first_name, players.last_name,
+           players.shoots_catches, players.primary_position,
+           players.sweater_number, players.birth_date,
+           players.current_team_id)
+          IS DISTINCT FROM
+          (EXCLUDED.full_name, EXCLUDED.first_name, EXCLUDED.last_name,
+           EXCLUDED.shoots_catches, EXCLUDED.primary_position,
+           EXCLUDED.sweater_number,
+           COALESCE(EXCLUDED.birth_date, players.birth_date),
+           EXCLUDED.current_team_id)
+    RETURNING (xmax = 0);
+"""
+
+
+def player_row(player: Dict[str, Any], team_id: int) -> tuple:
     """
-    Yksittäinen roster-pelaaja -> INSERT/UPDATE players-tauluun.
+    Yksittäinen roster-pelaaja -> players-taulun rivi.
 
     Odotettu players-skeema:
       player_id (PK),
@@ -158,67 +184,79 @@ def upsert_player(cur, player: Dict[str, Any], team_id: int) -> None:
     sweater_number = player.get("sweaterNumber")
     birth_date = player.get("birthDate")  # 'YYYY-MM-DD' string, Postgres DATE osaa tämän
 
-    cur.execute(
-        """
-        INSERT INTO players (
-            player_id,
-            full_name,
-            first_name,
-            last_name,
-            shoots_catches,
-            primary_position,
-            sweater_number,
-            birth_date,
-            current_team_id
-        )
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (player_id) DO UPDATE
-        SET full_name        = EXCLUDED.full_name,
-            first_name       = EXCLUDED.first_name,
-            last_name        = EXCLUDED.last_name,
-            shoots_catches   = EXCLUDED.shoots_catches,
-            primary_position = EXCLUDED.primary_position,
-            sweater_number   = EXCLUDED.sweater_number,
-            birth_date       = COALESCE(EXCLUDED.birth_date, players.birth_date),
-            current_team_id  = EXCLUDED.current_team_id;
-        """,
-        (
-            player_id,
-            full_name,
-            first_name,
-            last_name,
-            shoots_catches,
-            position_code,
-            sweater_number,
-            birth_date,
-            team_id,
-        ),
+    return (
+        player_id,
+        full_name,
+        first_name,
+        last_name,
+        shoots_catches,
+        position_code,
+        sweater_number,
+        birth_date,
+        team_id,
     )
 
 
+def _merge_player_rows(old: tuple, new: tuple) -> tuple:
+    """
+    Sama pelaaja useammalla rosterilla: uudempi rivi voittaa, mutta
+    birth_date säilyy kuten COALESCE peräkkäisissä upserteissa.
+    """
+    if new[7] is None and old[7] is not None:
+        return new[:7] + (old[7],) + new[8:]
+    return new
+
+
+def fetch_roster(job: tuple[str, int, str]) -> Dict[str, Any] | None:
+    """
+    job = (season_code, team_id, abbr). Palauttaa None, jos haku
+    epäonnistui (esim. joukkuetta ei ollut vielä olemassa kaudella).
+    """
+    season_code, _, abbr = job
+    try:
+        return client.teams.team_roster(team_abbr=abbr, season=season_code)
+    except Exception as e:
+        print(f"[VIRHE] Roster-haku epäonnistui joukkueelle {abbr}, kausi {season_code}: {e}")
+        return None
+
+
 # ---------------------------------------------------------
 # MAIN LOGIC
 # ---------------------------------------------------------
 
-def update_players_from_rosters(conn, season_code: str) -> None:
+def update_players_from_rosters(
+    conn,
+    season_codes: str | Iterable[str],
+    workers: int = ROSTER_WORKERS,
+) -> None:
+    """
+    Hakee kaikkien joukkueiden rosterit annetuille kausille rinnakkain
+    (`workers` säiettä) ja kirjoittaa pelaajat monirivisinä upsertteina.
+    Kaudet käsitellään vanhimmasta uusimpaan, joten pelaajan
+    current_team_id tulee uusimmalta rosterilta.
+    """
+    if isinstance(season_codes, str):
+        season_codes = [season_codes]
     teams = get_all_team_abbreviations(conn)
+    jobs = [(season, team_id, abbr) for season in sorted(season_codes) for team_id, abbr in teams]
+    print(f"[ROSTER] Haetaan {len(jobs)} rosteria ({workers} rinnakkain)...")
+
+    batch = BatchUpserter(
+        conn,
+        PLAYERS_UPSERT_SQL,
+        key=lambda r: r[0],
+        merge=_merge_player_rows,
+        batch_size=UPSERT_BATCH_SIZE,
+    )
     total_players = 0
     debug_done = False
 
-    for team_id, abbr in teams:
-        print(f"[ROSTER] Haetaan joukkueelle {abbr}, kausi {season_code}...")
-
-        try:
-            roster = client.teams.team_roster(
-                team_abbr=abbr,
-                season=season_code,
-            )
-        except Exception as e:
-            print(f"[VIRHE] Roster-haku epäonnistui joukkueelle {abbr}: {e}")
+    for (season, team_id, abbr), roster in fetch_in_order(jobs, fetch_roster, workers=workers):
+        if roster is None:
             continue
 
         players = list(iter_roster_players(roster))
-        print(f"  -> löytyi {len(players)} pelaajaa")
+        print(f"[ROSTER] {abbr} {season}: löytyi {len(players)} pelaajaa")
 
         # Yksi debug-print ensimmäisestä pelaajasta, jos haluat tarkistaa rakenteen
         if players and not debug_done:
@@ -230,18 +268,18 @@ def update_players_from_rosters(conn, season_code: str) -> None:
             print("----\n")
             debug_done = True
 
-        with conn.cursor() as cur:
-            for p in players:
-                try:
-                    upsert_player(cur, p, team_id)
-                except KeyError as ke:
-                    print(f"[VAROITUS] Pelaaja skippattiin joukkueelta {abbr}: {ke}")
-                    continue
-
-        conn.commit()
+        for p in players:
+            try:
+                batch.add(player_row(p, team_id))
+            except KeyError as ke:
+                print(f"[VAROITUS] Pelaaja skippattiin joukkueelta {abbr}: {ke}")
+                continue
         total_players += len(players)
 
-    print(f"\n=== VALMIS: käsitelty yhteensä noin {total_players} roster-pelaajaa ===")
+    # Kaikki kaudet yhdellä kertaa: sama pelaaja kirjoitetaan vain kerran
+    written, = flush_all(conn, batch)
+    print_summaries(batch)
+    print(f"\n=== VALMIS: käsitelty yhteensä noin {total_players} roster-pelaajaa, kirjoitettu {written} riviä ===")
 
 
 # ---------------------------------------------------------
@@ -249,12 +287,19 @@ def update_players_from_rosters(conn, season_code: str) -> None:
 # ---------------------------------------------------------
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Päivittää players-taulun joukkueiden rostereista")
+    parser.add_argument("--season", action="append", dest="seasons",
+                        help=f"kausi, esim. 20242025; voi antaa useita (oletus {SEASON_CODE})")
+    parser.add_argument("--workers", type=int, default=ROSTER_WORKERS,
+                        help="rinnakkaisia roster-hakuja")
+    args = parser.parse_args()
+
     conn = get_conn()
     try:
-        update_players_from_rosters(conn, season_code=SEASON_CODE)
+        update_players_from_rosters(conn, args.seasons or [SEASON_CODE], workers=args.workers)
     finally:
-        conn.close()
-        print("Tietokantayhteys suljettu.")
+        put_conn(conn)
+        print(governor.summary())
 
 
 if __name__ == "__main__":